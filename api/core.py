@@ -2,12 +2,15 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 # SPDX-FileCopyrightText: 2020 grommunio GmbH
 
-from flask import Flask, jsonify, request, make_response
+from flask import Flask, g, jsonify, request, make_response
 from functools import wraps
 
 from orm import DB
 from services import Service
+from tools.compression import compress
 from tools.config import Config
+from tools.metrics import recordRequest, requestPhase
+from tools.profiler import Profiler
 
 from . import apiSpec
 
@@ -162,16 +165,23 @@ def secure(requireDB=False, requireAuth=True, authLevel="basic", service=None, v
         @wraps(func)
         def wrapper(*args, **kwargs):
             def call():
-                if service:
-                    with Service(service) as srv:
-                        ret = func(*args, srv, **kwargs)
-                else:
-                    ret = func(*args, **kwargs)
-                response = make_response(ret)
-                try:
-                    result = validator.validateResponse(request, response)
-                except AttributeError:
-                    result = None
+                with requestPhase("handler"):
+                    if service:
+                        with Service(service) as srv:
+                            ret = func(*args, srv, **kwargs)
+                    else:
+                        ret = func(*args, **kwargs)
+                with requestPhase("serialization"):
+                    response = make_response(ret)
+                if response.is_streamed:  # Validation would consume the stream
+                    return ret
+                if response.status_code == 304:  # Conditional responses are not part of the specification
+                    return ret
+                with requestPhase("responseValidation"):
+                    try:
+                        result = validator.validateResponse(request, response)
+                    except AttributeError:
+                        result = None
                 if result:
                     if Config["openapi"]["validateResponse"]:
                         API.logger.error("Response validation failed: "+str(result))
@@ -182,10 +192,14 @@ def secure(requireDB=False, requireAuth=True, authLevel="basic", service=None, v
 
             if requireAuth:
                 checkCSRF = False if Config["security"].get("disableCSRF") else validateCSRF
-                error = getSecurityContext(authLevel, checkCSRF)
+                with requestPhase("auth"):
+                    error = getSecurityContext(authLevel, checkCSRF)
                 if error is not None and requireAuth != "optional":
                     return jsonify(message="Access denied", error=error), 401
-            valid, message, errors = validateRequest(request)
+                if error is None:
+                    Profiler.startForced(request, g)
+            with requestPhase("validation"):
+                valid, message, errors = validateRequest(request)
             if not valid:
                 if Config["openapi"]["validateRequest"]:
                     API.logger.info("Request validation failed: {}".format(errors))
@@ -206,12 +220,46 @@ def secure(requireDB=False, requireAuth=True, authLevel="basic", service=None, v
     return inner
 
 
+@API.after_request
+def compressResponse(response):
+    """Compress the response if accepted by the client. Registered first to run after all other hooks."""
+    with requestPhase("compression"):
+        compress(request, response)
+    return response
+
+
 @API.after_request
 def noCache(response):
-    """Add no-cache headers to the response"""
+    """Add no-cache headers to the response.
+
+    Responses with an ETag may be stored by the client, but must be revalidated on each use.
+    """
     response.cache_control.no_cache = True
-    response.cache_control.no_store = True
-    response.cache_control.max_age = 1
+    if response.get_etag()[0] is None:
+        response.cache_control.no_store = True
+        response.cache_control.max_age = 1
+    else:
+        response.cache_control.private = True
+    return response
+
+
+@API.after_request
+def recordMetrics(response):
+    """Record request metrics"""
+    recordRequest(request, response)
+    return response
+
+
+@API.before_request
+def startProfiling():
+    """Start SQL profiling if enabled. Profiling requested via header is started after authentication."""
+    Profiler.start(request, g)
+
+
+@API.after_request
+def finishProfiling(response):
+    """Add profiling results to the response"""
+    Profiler.finish(request, response, g)
     return response
 
 
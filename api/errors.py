@@ -6,6 +6,7 @@ from api.core import API
 from flask import jsonify, request
 from services import ServiceDisabledError, ServiceUnavailableError
 from sqlalchemy.exc import DatabaseError
+from tools.passwords import HashingBusyError
 
 import traceback
 
@@ -27,6 +28,11 @@ def insufficient_permissions(error):
     return jsonify(message="Access denied: "+msg), 403
 
 
+@API.errorhandler(HashingBusyError)
+def hashing_busy(error):
+    return jsonify(message=error.args[0]), 503
+
+
 @API.errorhandler(ServiceDisabledError)
 def service_unavailable(error):
     return jsonify(message=error.args[0]), 503
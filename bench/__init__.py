@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+"""
+Benchmark and load-test suite.
+
+Runs the API in-process against a synthetic database and measures throughput
+and latency of frequently used endpoints. Not installed with the API.
+
+Usage: python3 -m bench --help
+"""
+
+import logging
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def _sqliteCompat():
+    """Render MySQL specific column types on SQLite."""
+    from sqlalchemy.dialects.mysql import ENUM, TINYINT
+    from sqlalchemy.ext.compiler import compiles
+
+    @compiles(TINYINT, "sqlite")
+    def compileTinyint(type_, compiler, **kwargs):
+        return "SMALLINT"
+
+    @compiles(ENUM, "sqlite")
+    def compileEnum(type_, compiler, **kwargs):
+        return "VARCHAR"
+
+
+def init(uri):
+    """Initialize API with database connection.
+
+    Must be called before any API module is imported.
+
+    Parameters
+    ----------
+    uri : str
+        SQLAlchemy database URI
+
+    Returns
+    -------
+    API : flask.Flask
+        The API application object
+    DB : orm.DBConn
+        Database connection
+    """
+    os.chdir(root)
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    logging.basicConfig(level=logging.ERROR)
+    from tools.config import Config
+    Config["options"]["disableDB"] = True  # Connection is created below instead of from configuration
+    Config["options"].setdefault("metrics", {})["enabled"] = False
+    import orm
+    if uri.startswith("sqlite"):
+        _sqliteCompat()
+    orm.DB = orm.DBConn(uri)
+    from . import stubs
+    stubs.register()
+    from api.core import API
+    import endpoints
+    for module in endpoints.__all__:
+        __import__("endpoints."+module)
+    return API, orm.DB
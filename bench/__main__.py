@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from argparse import ArgumentParser
+from collections import Counter
+from datetime import datetime
+
+from . import init, root, seed as seeding, stubs
+
+BaseRoute = "/api/v1"
+
+
+class Scenario:
+    """Benchmark scenario.
+
+    Each scenario maps to a single request, which is sent repeatedly.
+    `request` is called with a test client, a random number generator and the seed parameters and must return
+    the response.
+    """
+    scenarios = {}
+
+    def __init__(self, name, request, auth=True):
+        self.name = name
+        self.request = request
+        self.auth = auth
+        self.scenarios[name] = self
+
+    @classmethod
+    def get(cls, url, **kwargs):
+        def request(client, rng, ctx):
+            return client.get(BaseRoute+url.format(**{key: func(rng, ctx) for key, func in kwargs.items()}))
+        return request
+
+
+def _randomUser(rng, ctx):
+    ID = rng.randrange(2, ctx["users"]+1)
+    return seeding.userName(ID, (ID-1) % ctx["domains"]+1)
+
+
+def _login(client, rng, ctx):
+    return client.post(BaseRoute+"/login", data={"user": seeding.adminUser, "pass": seeding.password})
+
+
+usersBase = "/domains/1/users?limit=50&level="
+Scenario("users-level0", Scenario.get(usersBase+"0"))
+Scenario("users-level1", Scenario.get(usersBase+"1"))
+Scenario("users-level2", Scenario.get(usersBase+"2"))
+Scenario("users-match", Scenario.get(usersBase+"1&match={name}", name=lambda rng, ctx: rng.choice(seeding.lastNames)))
+Scenario("users-sort", Scenario.get(usersBase+"1&sort=username,{order}", order=lambda rng, ctx: rng.choice(("asc", "desc"))))
+Scenario("users-filterProp", Scenario.get(usersBase+"1&filterProp=departmentname:{dep}",
+                                          dep=lambda rng, ctx: rng.choice(seeding.departments)))
+Scenario("domains-level1", Scenario.get("/system/domains?limit=50&level=1"))
+Scenario("login", _login, auth=False)
+Scenario("profile", Scenario.get("/profile"))
+Scenario("syncPolicy", Scenario.get("/service/syncPolicy/{user}", user=_randomUser), auth=False)
+Scenario("tasq-tasks", Scenario.get("/tasq/tasks?limit=50&level={level}", level=lambda rng, ctx: rng.randrange(3)))
+
+
+class StatementCounter:
+    """Count SQL statements executed on an engine."""
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "after_cursor_execute", self._increment)
+
+    def _increment(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    index = (len(values)-1)*p/100
+    lower = int(index)
+    upper = min(lower+1, len(values)-1)
+    return values[lower]+(values[upper]-values[lower])*(index-lower)
+
+
+def run(API, scenario, requests, concurrency, warmup, ctx, counter, token, background=()):
+    """Run a single scenario.
+
+    Parameters
+    ----------
+    API : flask.Flask
+        Application to test
+    scenario : Scenario
+        Scenario to run
+    requests : int
+        Total number of measured requests
+    concurrency : int
+        Number of client threads
+    warmup : int
+        Number of unmeasured requests to send before measurement starts
+    ctx : dict
+        Seed parameters
+    counter : StatementCounter
+        SQL statement counter
+    token : str
+        JWT to authenticate with
+    background : Iterable of (Scenario, int), optional
+        Scenarios to run continuously with the given number of threads while measuring. The default is ().
+
+    Returns
+    -------
+    dict
+        Benchmark results
+    """
+    def client(auth):
+        c = API.test_client()
+        if auth:
+            c.set_cookie("grommunioAuthJwt", token)
+        return c
+
+    rng = random.Random(0)
+    warmClient = client(scenario.auth)
+    for _ in range(warmup):
+        scenario.request(warmClient, rng, ctx)
+    latencies, status = [], Counter()
+    lock = threading.Lock()
+    share = [requests//concurrency+(1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(index, count):
+        c, r = client(scenario.auth), random.Random(index+1)
+        local, codes = [], Counter()
+        for _ in range(count):
+            start = time.perf_counter()
+            response = scenario.request(c, r, ctx)
+            local.append(time.perf_counter()-start)
+            codes[response.status_code] += 1
+        with lock:
+            latencies.extend(local)
+            status.update(codes)
+
+    stop = threading.Event()
+    backgroundStatus = Counter()
+
+    def backgroundWorker(bgScenario, index):
+        c, r = client(bgScenario.auth), random.Random(-index-1)
+        codes = Counter()
+        while not stop.is_set():
+            codes[bgScenario.request(c, r, ctx).status_code] += 1
+        with lock:
+            backgroundStatus.update(codes)
+
+    bgThreads = [threading.Thread(target=backgroundWorker, args=(bgScenario, index))
+                 for bgScenario, count in background for index in range(count)]
+    for thread in bgThreads:
+        thread.start()
+    threads = [threading.Thread(target=worker, args=(index, count)) for index, count in enumerate(share)]
+    statements = counter.count
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter()-start
+    statements = counter.count-statements
+    stop.set()
+    for thread in bgThreads:
+        thread.join()
+    latencies.sort()
+    ms = lambda value: round(value*1000, 3) if value is not None else None  # noqa: E731
+    return {"requests": requests,
+            "concurrency": concurrency,
+            "errors": sum(count for code, count in status.items() if not 200 <= code < 300),
+            "status": {str(code): count for code, count in sorted(status.items())},
+            "duration": round(duration, 3),
+            "throughput": round(requests/duration, 2) if duration else None,
+            "latency": {"min": ms(latencies[0] if latencies else None),
+                        "mean": ms(sum(latencies)/len(latencies) if latencies else None),
+                        "p50": ms(percentile(latencies, 50)),
+                        "p90": ms(percentile(latencies, 90)),
+                        "p99": ms(percentile(latencies, 99)),
+                        "max": ms(latencies[-1] if latencies else None)},
+            "sqlPerRequest": round(statements/requests, 2) if requests else None,
+            "background": {"scenarios": {bgScenario.name: count for bgScenario, count in background},
+                           "status": {str(code): count for code, count in sorted(backgroundStatus.items())}}
+            if background else None}
+
+
+def _gitRevision():
+    try:
+        return subprocess.run(("git", "rev-parse", "--short", "HEAD"), cwd=root, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _log(message):
+    print(message, file=sys.stderr)
+
+
+def cmdRun(args):
+    database = None
+    if args.db is None:
+        database = tempfile.NamedTemporaryFile(prefix="grommunio-bench-", suffix=".db", delete=False).name
+        args.db = "sqlite:///"+database
+    stubs.latency = args.stub_latency/1000
+    try:
+        API, DB = init(args.db)
+        from tools.config import Config
+        if args.hash_workers is not None:
+            Config["security"]["passwordHashing"]["workers"] = args.hash_workers
+        from sqlalchemy import inspect
+        if inspect(DB.engine).has_table("users"):
+            if not args.reuse:
+                _log("Database already contains tables - use --reuse to run on existing data")
+                return 1
+            _log("Reusing existing data")
+        else:
+            seeding.seed(DB, args.orgs, args.domains, args.users, args.mlists, args.roles, args.tasks, progress=_log)
+        ctx = {"users": args.users, "domains": args.domains}
+        counter = StatementCounter(DB.engine)
+        response = _login(API.test_client(), None, ctx)
+        if response.status_code != 200:
+            _log("Login failed: "+response.get_data(True))
+            return 2
+        token = response.get_json()["grommunioAuthJwt"]
+        selected = args.scenario or list(Scenario.scenarios)
+        unknown = [name for name in selected if name not in Scenario.scenarios]
+        if unknown:
+            _log("Unknown scenario(s): "+", ".join(unknown))
+            return 1
+        background = []
+        for spec in args.background or ():
+            name, _, threads = spec.partition(":")
+            if name not in Scenario.scenarios:
+                _log("Unknown background scenario: "+name)
+                return 1
+            background.append((Scenario.scenarios[name], int(threads or 1)))
+        results, failed = {}, []
+        for name in selected:
+            _log("Running {}...".format(name))
+            results[name] = run(API, Scenario.scenarios[name], args.requests, args.concurrency, args.warmup, ctx, counter,
+                                 token, background)
+            _log("  {throughput} req/s, p50 {latency[p50]} ms, p99 {latency[p99]} ms, {sqlPerRequest} SQL/req, {errors} errors"
+                 .format(**results[name]))
+            if results[name]["errors"]:
+                failed.append(name)
+        report = {"meta": {"revision": _gitRevision(),
+                           "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                           "python": platform.python_version(),
+                           "database": DB.engine.dialect.name,
+                           "stubLatency": args.stub_latency,
+                           "hashWorkers": Config["security"]["passwordHashing"]["workers"],
+                           "seed": {key: getattr(args, key)
+                                    for key in ("orgs", "domains", "users", "mlists", "roles", "tasks")}},
+                  "results": results}
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(report, file, indent=2)
+            _log("Results written to "+args.output)
+        else:
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        if failed:
+            _log("Failed scenario(s): "+", ".join(failed))
+            return 3
+    finally:
+        if database is not None:
+            os.unlink(database)
+
+
+def cmdCompare(args):
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+
+    def change(old, new):
+        return "{:+.1f}%".format((new-old)/old*100) if old and new is not None else "-"
+
+    print("{:<20} {:>12} {:>9} {:>12} {:>9} {:>12} {:>9} {:>10}"
+          .format("scenario", "req/s", "", "p50 (ms)", "", "p99 (ms)", "", "SQL/req"))
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        print("{:<20} {:>12} {:>9} {:>12} {:>9} {:>12} {:>9} {:>10}"
+              .format(name, new["throughput"], change(old["throughput"], new["throughput"]),
+                      new["latency"]["p50"], change(old["latency"]["p50"], new["latency"]["p50"]),
+                      new["latency"]["p99"], change(old["latency"]["p99"], new["latency"]["p99"]),
+                      "{} ({})".format(new["sqlPerRequest"], old["sqlPerRequest"])))
+
+
+def main():
+    parser = ArgumentParser(prog="python3 -m bench", description="grommunio Admin API benchmark suite")
+    sub = parser.add_subparsers(dest="command", required=True)
+    runp = sub.add_parser("run", help="Seed database and run benchmarks")
+    runp.add_argument("--db", help="Database URI. If omitted, a temporary SQLite database is used.")
+    runp.add_argument("--reuse", action="store_true", help="Run on existing data instead of seeding the database")
+    runp.add_argument("--orgs", type=int, default=10, help="Number of organizations (default 10)")
+    runp.add_argument("--domains", type=int, default=100, help="Number of domains (default 100)")
+    runp.add_argument("--users", type=int, default=100000, help="Number of users (default 100000)")
+    runp.add_argument("--mlists", type=int, default=500, help="Number of mailing lists (default 500)")
+    runp.add_argument("--roles", type=int, default=20, help="Number of domain admin roles (default 20)")
+    runp.add_argument("--tasks", type=int, default=200, help="Number of TasQ tasks (default 200)")
+    runp.add_argument("--requests", "-n", type=int, default=200, help="Requests per scenario (default 200)")
+    runp.add_argument("--concurrency", "-c", type=int, default=4, help="Number of client threads (default 4)")
+    runp.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per scenario (default 10)")
+    runp.add_argument("--stub-latency", type=float, default=0, help="Simulated latency of stub services in ms (default 0)")
+    runp.add_argument("--scenario", "-s", action="append", help="Scenario to run, can be given multiple times. "
+                      "Available: "+", ".join(Scenario.scenarios))
+    runp.add_argument("--background", "-b", action="append", metavar="SCENARIO[:THREADS]",
+                      help="Scenario to run continuously during measurement, e.g. login:8. Can be given multiple times.")
+    runp.add_argument("--hash-workers", type=int, help="Override number of password hashing processes (0 = inline)")
+    runp.add_argument("--output", "-o", help="File to write results to. If omitted, results are printed.")
+    runp.set_defaults(func=cmdRun)
+    compp = sub.add_parser("compare", help="Compare two result files")
+    compp.add_argument("baseline", help="Results to compare against")
+    compp.add_argument("current", help="Current results")
+    compp.set_defaults(func=cmdCompare)
+    args = parser.parse_args()
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
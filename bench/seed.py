@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+"""
+Synthetic data for benchmarks.
+
+Tables are filled with bulk inserts, bypassing the ORM (and thereby exmdb), so
+that large data sets can be created in reasonable time.
+"""
+
+import json
+import random
+import time
+
+from datetime import date, datetime
+
+password = "bench"
+adminUser = "admin@domain1.bench"
+
+departments = ("Sales", "Marketing", "Engineering", "Support", "Finance", "Legal", "Operations", "Research")
+titles = ("Manager", "Engineer", "Assistant", "Consultant", "Director", "Analyst", "Technician")
+firstNames = ("Anna", "Ben", "Clara", "David", "Emma", "Felix", "Greta", "Hannes", "Ida", "Jonas", "Lena", "Max")
+lastNames = ("Bauer", "Fischer", "Huber", "Koch", "Maier", "Müller", "Schmid", "Wagner", "Weber", "Wolf")
+
+
+def _insert(conn, table, rows, batchSize=10000):
+    for start in range(0, len(rows), batchSize):
+        conn.execute(table.insert(), rows[start:start+batchSize])
+
+
+def domainName(domainID):
+    return "domain{}.bench".format(domainID)
+
+
+def userName(userID, domainID):
+    return "user{}@{}".format(userID, domainName(domainID))
+
+
+def seed(DB, orgs=10, domains=100, users=100000, mlists=500, roles=20, tasks=200, seed=0, progress=print):
+    """Create tables and fill them with synthetic data.
+
+    User IDs start at 1, with the system admin `adminUser` being the first user.
+    The remaining users are distributed evenly among the domains.
+
+    Parameters
+    ----------
+    DB : orm.DBConn
+        Database to fill. Must not contain any of the tables yet.
+    orgs : int, optional
+        Number of organizations. The default is 10.
+    domains : int, optional
+        Number of domains. The default is 100.
+    users : int, optional
+        Number of users, including mailing list users. The default is 100000.
+    mlists : int, optional
+        Number of mailing lists. The default is 500.
+    roles : int, optional
+        Number of domain admin roles. The default is 20.
+    tasks : int, optional
+        Number of TasQ tasks. The default is 200.
+    seed : int, optional
+        Random seed. The default is 0.
+    progress : callable, optional
+        Function called with progress messages. The default is print.
+    """
+    from orm.domains import Domains, Orgs
+    from orm.misc import TasQ
+    from orm.mlists import Associations, MLists
+    from orm.roles import AdminRoles, AdminRolePermissionRelation, AdminUserRoleRelation
+    from orm.users import Aliases, UserProperties, Users
+    from tools.constants import PropTags
+    from tools.rop import ntTime
+
+    try:
+        import legacycrypt as crypt
+    except ImportError:
+        import crypt
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    DB.Base.metadata.create_all(DB.engine)
+    hashed = crypt.crypt(password, crypt.mksalt(crypt.METHOD_SHA512))
+    policy = json.dumps({"maxattsize": 10485760, "devpwenabled": 1, "devpwexpiration": 90}, separators=(",", ":"))
+    created = str(int(ntTime(time.time())))
+    with DB.engine.begin() as conn:
+        _insert(conn, Orgs.__table__, [{"id": ID, "name": "org{}".format(ID)} for ID in range(1, orgs+1)])
+        _insert(conn, Domains.__table__,
+                [{"id": ID, "org_id": ID % orgs+1, "domainname": domainName(ID), "max_user": users,
+                  "homedir": "/var/lib/gromox/domain/{}".format(ID), "end_day": date(3333, 3, 3),
+                  "sync_policy": policy if ID % 10 == 0 else None}
+                 for ID in range(1, domains+1)])
+        progress("Created {} organizations and {} domains".format(orgs, domains))
+
+        userRows, propRows, aliasRows = [], [], []
+        for ID in range(1, users+1):
+            domainID = (ID-1) % domains+1
+            username = adminUser if ID == 1 else userName(ID, domainID)
+            userRows.append({"id": ID, "username": username, "password": hashed, "domain_id": domainID,
+                             "maildir": "/var/lib/gromox/user/{}/{}".format(domainID, ID), "address_status": 0,
+                             "privilege_bits": rng.getrandbits(12), "lang": "en_US",
+                             "sync_policy": policy if ID % 50 == 0 else None})
+            props = {PropTags.DISPLAYNAME: "{} {}".format(rng.choice(firstNames), rng.choice(lastNames)),
+                     PropTags.DEPARTMENTNAME: rng.choice(departments),
+                     PropTags.TITLE: rng.choice(titles),
+                     PropTags.COMPANYNAME: "Company {}".format(domainID),
+                     PropTags.CREATIONTIME: created,
+                     PropTags.DISPLAYTYPEEX: 0,
+                     PropTags.STORAGEQUOTALIMIT: rng.choice((1 << 20, 1 << 21, 1 << 22))}
+            propRows += [{"user_id": ID, "proptag": tag, "order_id": 1, "propval_str": str(value)}
+                         for tag, value in props.items()]
+            if ID % 5 == 0:
+                aliasRows.append({"aliasname": "alias{}@{}".format(ID, domainName(domainID)), "mainname": username})
+        _insert(conn, Users.__table__, userRows)
+        _insert(conn, UserProperties.__table__, propRows)
+        _insert(conn, Aliases.__table__, aliasRows)
+        progress("Created {} users with {} properties and {} aliases".format(users, len(propRows), len(aliasRows)))
+
+        # Mailing lists reuse the last users as list accounts
+        listUsers = userRows[-mlists:] if mlists else []
+        _insert(conn, MLists.__table__, [{"id": ID, "listname": user["username"], "domain_id": user["domain_id"],
+                                          "list_type": 0, "list_privilege": 0}
+                                         for ID, user in enumerate(listUsers, 1)])
+        _insert(conn, Associations.__table__, [{"list_id": ID, "username": member["username"]}
+                                               for ID in range(1, len(listUsers)+1)
+                                               for member in rng.sample(userRows, min(10, users))])
+
+        _insert(conn, AdminRoles.__table__, [{"id": 1, "name": "System Admin"}] +
+                [{"id": ID, "name": "Domain Admin {}".format(ID)} for ID in range(2, roles+2)])
+        _insert(conn, AdminRolePermissionRelation.__table__, [{"role_id": 1, "permission": "SystemAdmin"}] +
+                [{"role_id": ID, "permission": "DomainAdmin", "parameters": str(ID % domains+1)}
+                 for ID in range(2, roles+2)])
+        _insert(conn, AdminUserRoleRelation.__table__, [{"user_id": 1, "role_id": 1}] +
+                [{"user_id": rng.randrange(2, users+1), "role_id": ID} for ID in range(2, roles+2)])
+        progress("Created {} mailing lists and {} roles".format(len(listUsers), roles+1))
+
+        now = datetime.now()
+        _insert(conn, TasQ.__table__, [{"id": ID, "command": "ldapSync", "state": rng.randrange(4),
+                                        "created": now, "updated": now, "message": "", "params": "{}",
+                                        "access": None}
+                                       for ID in range(1, tasks+1)])
+    Domains.recountUsers()
+    Orgs.recountDomains()
+    DB.session.commit()
+    progress("Seeding finished after {:.1f} s".format(time.perf_counter()-start))
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+"""
+Stub services replacing exmdb, LDAP and redis during benchmarks.
+
+The stubs are registered with `ServiceHub.register` under the names of the
+real services, so endpoints use them transparently. Each call can be delayed
+by `latency` seconds to simulate the round trip to the real backend.
+Alternative implementations can be registered the same way before the first
+request is processed.
+"""
+
+import fnmatch
+import threading
+import time
+
+from services import ServiceHub
+from tools.constants import PropTags
+
+latency = 0
+
+
+def _delay():
+    if latency:
+        time.sleep(latency)
+
+
+class StubExmdb:
+    """Exmdb stub serving a fixed set of store properties."""
+    class TaggedPropval:
+        def __init__(self, tag, val):
+            self.tag = tag
+            self.val = val
+
+    class _Client:
+        storeProps = {PropTags.MESSAGESIZEEXTENDED: 1 << 26,
+                      PropTags.STORAGEQUOTALIMIT: 1 << 21,
+                      PropTags.PROHIBITRECEIVEQUOTA: 1 << 21,
+                      PropTags.PROHIBITSENDQUOTA: 1 << 21}
+
+        def getAllStoreProperties(self):
+            _delay()
+            return list(self.storeProps)
+
+        def getStoreProperties(self, cpid, tags):
+            _delay()
+            return [StubExmdb.TaggedPropval(tag, self.storeProps[tag]) for tag in tags if tag in self.storeProps]
+
+        def setStoreProperties(self, cpid, props):
+            _delay()
+            return []
+
+        def removeStoreProperties(self, tags):
+            _delay()
+
+        def unloadStore(self):
+            _delay()
+
+    ConnectionError = ExmdbError = type("StubExmdbError", (Exception,), {})
+
+    def client(self, homedir, isPrivate):
+        return self._Client()
+
+    def user(self, user):
+        return self._Client()
+
+    def domain(self, domain):
+        return self._Client()
+
+
+class StubLdap:
+    """LDAP stub accepting every password."""
+    def __init__(self, orgID=None):
+        pass
+
+    def authUser(self, ID, password):
+        _delay()
+
+    def getUserInfo(self, ID):
+        _delay()
+        return None
+
+    def searchUsers(self, *args, **kwargs):
+        _delay()
+        return []
+
+
+class StubRedis:
+    """In-memory replacement for the redis commands used by the API."""
+    class _Pipeline:
+        def __init__(self, redis):
+            self._redis = redis
+            self._calls = []
+
+        def __getattr__(self, attr):
+            method = getattr(self._redis, attr)
+            return lambda *args, **kwargs: self._calls.append((method, args, kwargs)) or self
+
+        def execute(self):
+            calls, self._calls = self._calls, []
+            return [method(*args, **kwargs) for method, args, kwargs in calls]
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        _delay()
+        return self._data.get(key)
+
+    def set(self, key, value, **kwargs):
+        _delay()
+        self._data[key] = value
+        return True
+
+    def getset(self, key, value):
+        _delay()
+        with self._lock:
+            previous, self._data[key] = self._data.get(key), value
+        return previous
+
+    def scan_iter(self, match=None, count=None):
+        _delay()
+        return iter([key for key in list(self._data) if match is None or fnmatch.fnmatchcase(key, match)])
+
+    def mget(self, keys):
+        _delay()
+        return [self._data.get(key) for key in keys]
+
+    def delete(self, *keys):
+        _delay()
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def expire(self, key, seconds):
+        _delay()
+        return key in self._data
+
+    def hget(self, key, field):
+        _delay()
+        return self._data.get(key, {}).get(field)
+
+    def hmget(self, key, fields):
+        _delay()
+        data = self._data.get(key, {})
+        return [data.get(field) for field in fields]
+
+    def hgetall(self, key):
+        _delay()
+        return dict(self._data.get(key, {}))
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        _delay()
+        with self._lock:
+            data = self._data.setdefault(key, {})
+            data.update(mapping or {})
+            if field is not None:
+                data[field] = value
+        return 1
+
+    def hdel(self, key, *fields):
+        _delay()
+        with self._lock:
+            data = self._data.get(key, {})
+            return sum(data.pop(field, None) is not None for field in fields)
+
+    def pipeline(self, transaction=True):
+        return self._Pipeline(self)
+
+
+def register():
+    """Register stub services, replacing the real implementations."""
+    ServiceHub.register("exmdb")(StubExmdb)
+    ServiceHub.register("ldap", argspec=((), (int,)))(StubLdap)
+    ServiceHub.register("redis")(StubRedis)
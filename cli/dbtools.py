@@ -57,18 +57,62 @@ def _passwdParserSetup(subp: ArgumentParser):
     subp.add_argument("user", nargs="?", action="store", type=str,
                       help="User to change the password of. If omitted, set password of system administrator.")
     subp.add_argument("--auto", "-a", action="store_true", help="Automatically generate password.")
+    subp.add_argument("--batch", "-b", metavar="FILE",
+                      help="Read 'username:password' lines from file ('-' for stdin) and set all passwords. "
+                           "With -a, lines contain only usernames and the generated passwords are printed.")
     subp.add_argument("--length", "-l", action="store", type=int, default=defaultPassLength,
                       help="Length of auto-generated password (default {})".format(defaultPassLength))
     subp.add_argument("--password", "-p", action="store", type=str,
                       help="New password. If neither -p nor -a are specified, the new password is set interactively.")
 
 
+def _readBatch(cli, args):
+    if args.batch == "-":
+        return [line for line in iter(cli.stdin.readline, "")]
+    with cli.open(args.batch) as file:
+        return file.readlines()
+
+
+def _setPasswordBatch(args):
+    cli = args._cli
+    from orm.users import DB, Users
+    entries = {}
+    for lineno, line in enumerate(_readBatch(cli, args), 1):
+        line = line.rstrip("\r\n")
+        if not line.strip() or line.startswith("#"):
+            continue
+        username, sep, password = line.partition(":")
+        if not args.auto and not sep:
+            cli.print(cli.col("Line {}: missing password".format(lineno), "red"))
+            return 3
+        entries[username.strip()] = mkPasswd(args.length) if args.auto else password
+    users = {user.username: user for user in Users.query.filter(Users.username.in_(entries))}
+    errors = 0
+    for username in entries:
+        if username not in users:
+            cli.print(cli.col("User '{}' not found.".format(username), "yellow"))
+            errors += 1
+        elif users[username].externID is not None:
+            cli.print(cli.col("Cannot change password of LDAP user '{}'".format(username), "yellow"))
+            errors += 1
+    update = [username for username in entries if username in users and users[username].externID is None]
+    Users.setPasswords([users[username] for username in update], [entries[username] for username in update])
+    DB.session.commit()
+    if args.auto:
+        for username in update:
+            cli.print("{}:{}".format(username, entries[username]))
+    cli.print("Updated {} password{}".format(len(update), "" if len(update) == 1 else "s"))
+    return 2 if errors else 0
+
+
 @Cli.command("passwd", _passwdParserSetup, help="User password management")
 def setUserPassword(args):
     cli = args._cli
     cli.require("DB")
     from orm.users import DB, Users
     import orm.roles
+    if args.batch is not None:
+        return _setPasswordBatch(args)
     if args.user is not None:
         from .common import userCandidates
         users = userCandidates(args.user).all()
@@ -143,6 +143,30 @@ def cliDomainPurge(args):
     cli.print("Done\nDomain removed.")
 
 
+def cliDomainRecount(args):
+    cli = args._cli
+    cli.require("DB")
+    from orm import DB
+    from orm.domains import Domains, Orgs, storedCounters
+    if not storedCounters:
+        cli.print(cli.col("Database schema does not contain stored user counters", "yellow"))
+        return 1
+    if args.domainspec:
+        from .common import domainCandidates
+        domains = domainCandidates(args.domainspec).with_entities(Domains.ID, Domains.orgID).all()
+        if len(domains) == 0:
+            cli.print(cli.col("No domains found.", "yellow"))
+            return 1
+        updated = Domains.recountUsers(*(domain.ID for domain in domains))
+        orgs = Orgs.recountDomains(*{domain.orgID for domain in domains if domain.orgID})
+    else:
+        updated = Domains.recountUsers()
+        orgs = Orgs.recountDomains()
+    DB.session.commit()
+    cli.print("Updated counters of {} domain{} and {} organization{}."
+              .format(updated, "" if updated == 1 else "s", orgs, "" if orgs == 1 else "s"))
+
+
 def cliDomainModify(args):
     cli = args._cli
     cli.require("DB")
@@ -256,6 +280,11 @@ def _setupCliDomain(subp: ArgumentParser):
     query.add_argument("--separator", help="Set column separator")
     query.add_argument("-s", "--sort", action="append", help="Sort by attribute, e.g. -s username,desc")
     query.add_argument("attributes", nargs="*", choices=AttrChoice(), help="Attributes to query", metavar="ATTRIBUTE")
+    recount = sub.add_parser("recount", help="Recompute user and domain counters",
+                             description="Recompute stored user counters of domains and domain counters of organizations")
+    recount.set_defaults(_handle=cliDomainRecount)
+    recount.add_argument("domainspec", nargs="?", help="Domain ID or prefix to match domainname against")\
+        .completer = _cliDomainDomainspecAutocomp
     recover = sub.add_parser("recover", help="Recover soft-deleted domain")
     recover.set_defaults(_handle=cliDomainDeleteRecover, delete=False)
     recover.add_argument("domainspec", help="Domain ID or prefix to match domainname against")\
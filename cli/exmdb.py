@@ -33,6 +33,12 @@ def _isPrivate(args):
     return "@" in args.target
 
 
+def _folderChanged(args, client):
+    if not _isPrivate(args):
+        from tools import foldercache
+        foldercache.invalidate(client.homedir)
+
+
 def cliExmdbFolderCreate(args):
     cli = args._cli
     cli.require("DB")
@@ -49,6 +55,7 @@ def cliExmdbFolderCreate(args):
         if folderID == 0:
             cli.print(cli.col("Folder creation failed", "red"))
             return 2
+        _folderChanged(args, client)
         folder = exmdb.Folder(client.getFolderProperties(0, folderID, client.defaultFolderProps))
         cli.print(_FolderNode(folder).print(cli))
 
@@ -84,6 +91,7 @@ def cliExmdbFolderDelete(args):
                     cli.print(cli.col("Could not delete folder 0x{:x}".format(gcToValue(fid)), "yellow"))
             except exmdb.ExmdbError:
                 cli.print(cli.col("Failed to delete folder 0x{:x}".format(gcToValue(fid)), "yellow"))
+        _folderChanged(args, client)
 
 
 def cliExmdbFolderFind(args):
@@ -167,6 +175,57 @@ def cliExmdbFolderPermissionsModify(args):
                for folder, perm in zip(folders, perms)]).print(cli)
 
 
+def _perm(x):
+    return _permsAll if x.lower() == "all" else _perms.get(x.lower()) or int(x, 0)
+
+
+def cliExmdbFolderPermissionsBatch(args):
+    cli = args._cli
+    cli.require("DB")
+    from .dbtools import _readBatch
+    from functools import reduce
+    from orm.users import Users
+    from services import Service
+    from tools.exmdb import setFolderPermissions
+    from tools.rop import makeEidEx, gcToValue
+    lines = []
+    for lineno, line in enumerate(_readBatch(cli, args), 1):
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        try:
+            if len(fields) < 2:
+                raise ValueError("missing members")
+            fids = [makeEidEx(1, int(fid, 0)) for fid in fields[0].split(",")]
+            perms = reduce(lambda x, y: x | y, (_perm(perm) for perm in fields[2:]), 0)
+        except ValueError as err:
+            cli.print(cli.col("Line {}: {}".format(lineno, err.args[0]), "red"))
+            return 3
+        lines.append((fids, fields[1].split(","), perms))
+    usernames = {member for _, members, _ in lines for member in members if member not in ("default", "anonymous")}
+    unknown = usernames-{user.username for user in Users.query.filter(Users.username.in_(usernames))
+                                                             .with_entities(Users.username)}
+    for username in sorted(unknown):
+        cli.print(cli.col("Target user '{}' does not exist".format(username), "yellow" if args.force else "red"))
+    if unknown and not args.force:
+        return 100
+    with Service("exmdb") as exmdb:
+        ret, client = _getClient(args, exmdb)
+        if ret:
+            return ret
+        entries = [(fids, members, perms or _permsAll,
+                    client.REMOVE if args.revoke or not perms else client.SET if args.set else client.ADD)
+                   for fids, members, perms in lines]
+        updated, errors = setFolderPermissions(exmdb, client, entries, args.recursive)
+    for fid, member, message in errors:
+        cli.print(cli.col("Folder 0x{:x}, {}: {}".format(gcToValue(fid), member, message), "yellow"))
+    if updated and not _isPrivate(args):
+        with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
+            redis.delete("grommunio-sync:sharedfolders-"+args.target)
+    cli.print("Applied {} permission assignment{}".format(updated, "" if updated == 1 else "s"))
+    return 2 if errors else 0
+
+
 # Where is the documentation for this.
 def cliExmdbFolderPermissionsShow(args):
     cli = args._cli
@@ -270,9 +329,6 @@ def _setupCliExmdb(subp: ArgumentParser):
     def xint(x):
         return int(x, 0)
 
-    def perm(x):
-        return _permsAll if x.lower() == "all" else _perms.get(x.lower()) or int(x, 0)
-
     subp.add_argument("target", help="User or domain name").completer = _cliTargetCompleter
     sub = subp.add_subparsers()
 
@@ -290,6 +346,15 @@ def _setupCliExmdb(subp: ArgumentParser):
     delete.add_argument("-a", "--all", action="store_true", help="Delete all matching folders")
     delete.add_argument("--clear", action="store_true", help="Empty folder before deleting")
     delete.add_argument("folderspec", help="ID or name of folder")
+    batch = foldersub.add_parser("batch", help="Modify permissions of multiple users on multiple folders")
+    batch.set_defaults(_handle=cliExmdbFolderPermissionsBatch)
+    batch.add_argument("batch", metavar="FILE", help="File containing lines in the form 'FOLDERS MEMBERS [PERMISSION ...]' "
+                                                     "(- for stdin)")
+    batch.add_argument("-f", "--force", action="store_true", help="Add permissions even if user does not exist")
+    batch.add_argument("-r", "--recursive", action="store_true", help="Apply to subfolders recursively")
+    batchMode = batch.add_mutually_exclusive_group()
+    batchMode.add_argument("--revoke", action="store_true", help="Revoke permissions instead of granting them")
+    batchMode.add_argument("--set", action="store_true", help="Replace permissions instead of adding them")
     find = foldersub.add_parser("find", help="Find folder by name")
     find.set_defaults(_handle=cliExmdbFolderFind)
     find.add_argument("-x", "--exact", action="store_true", help="Only report exact matches instead of substring matches")
@@ -299,7 +364,7 @@ def _setupCliExmdb(subp: ArgumentParser):
     grant.set_defaults(_handle=cliExmdbFolderPermissionsModify, revoke=False)
     grant.add_argument("ID", type=xint, help="Folder ID")
     grant.add_argument("username", help="E-Mail address of the user to grant permissions to").completer = _cliTargetCompleter
-    grant.add_argument("permission", nargs="+", type=perm, choices=PermChoices(), help="Permission name or value",
+    grant.add_argument("permission", nargs="+", type=_perm, choices=PermChoices(), help="Permission name or value",
                        metavar="permission")
     grant.add_argument("-f", "--force", action="store_true", help="Add permissions even if user does not exist")
     grant.add_argument("-r", "--recursive", action="store_true", help="Apply to subfolders recursively")
@@ -319,7 +384,7 @@ def _setupCliExmdb(subp: ArgumentParser):
     revoke.add_argument("ID", type=xint, help="Folder ID")
     revoke.add_argument("username", help="E-Mail address of the user to revoke permissions from")\
           .completer = _cliTargetCompleter
-    revoke.add_argument("permission", nargs="*", type=perm, choices=PermChoices(), help="Permission name or value",
+    revoke.add_argument("permission", nargs="*", type=_perm, choices=PermChoices(), help="Permission name or value",
                         metavar="permission")
     revoke.add_argument("-r", "--recursive", action="store_true", help="Apply to subfolders recursively")
     properties = foldersub.add_parser("properties")
@@ -33,20 +33,22 @@ def _statStr(cli, files, size):
 
 def cliFsDu(args):
     cli = args._cli
-    from tools.config import Config
+    from tools.diskusage import DiskUsage
+    partitions = DiskUsage.partitions if args.partition is None else (args.partition,)
+    scanner = DiskUsage(cacheFile="" if args.nocache else None, workers=args.jobs)
+    summary = scanner.scan(partitions, args.full)
     files = size = 0
-    if args.partition is None or args.partition == "domain":
-        prefix = Config["options"]["domainPrefix"]
-        f, s = _du(prefix)
-        files += f
-        size += s
-        cli.print(prefix+": "+_statStr(cli, f, s))
-    if args.partition is None or args.partition == "user":
-        prefix = Config["options"]["userPrefix"]
-        f, s = _du(prefix)
-        files += f
-        size += s
-        cli.print(prefix+": "+_statStr(cli, f, s))
+    for partition in partitions:
+        if partition not in summary:
+            cli.print(cli.col("Failed to scan {} partition".format(partition), "red"))
+            continue
+        stat = summary[partition]
+        files += stat["files"]
+        size += stat["size"]
+        cli.print(stat["path"]+": "+_statStr(cli, stat["files"], stat["size"]))
+        if args.list:
+            for path, (f, s) in sorted(stat["entries"].items(), key=lambda entry: entry[1][1], reverse=True):
+                cli.print("  "+path+": "+_statStr(cli, f, s))
     if args.partition == None:
         cli.print(_statStr(cli, files, size))
 
@@ -122,6 +124,10 @@ def _setupCliFsParser(subp: ArgumentParser):
     du = sub.add_parser("du", help="Show disk usage")
     du.set_defaults(_handle=cliFsDu)
     du.add_argument("partition", nargs="?", choices=("domain", "user"), help="Partition to calculate disk usage for")
+    du.add_argument("-f", "--full", action="store_true", help="Ignore cached results and rescan all directories")
+    du.add_argument("-j", "--jobs", type=int, help="Number of directories to scan in parallel")
+    du.add_argument("-l", "--list", action="store_true", help="Show usage of each domain or user directory")
+    du.add_argument("-n", "--nocache", action="store_true", help="Do not load or update the result cache")
 
 
 @Cli.command("fs", _setupCliFsParser, help="Filesystem operations")
@@ -332,11 +332,8 @@ def _downsyncSpecific(args, orgIDs, resCount):
 def cliLdapDownsync(args):
     cli = args._cli
     cli.require("DB")
-    from orm.users import Aliases, Users
     from services import Service, ServiceUnavailableError
     from tools.misc import GenericObject
-    Aliases.NTactive(False)
-    Users.NTactive(False)
     orgIDs = _getOrgIDs(args)
     resCount = GenericObject(success=0, failed=0)
     _downsyncSpecific(args, orgIDs, resCount)
@@ -347,8 +344,6 @@ def cliLdapDownsync(args):
                     _downsyncOrg(args, orgID, ldap, resCount)
             except ServiceUnavailableError:
                 cli.print(cli.col(f"Failed to synchronize organization #{orgID} - service unavailable"))
-    Aliases.NTactive(True)
-    Users.NTactive(True)
     cli.print(cli.col("{} synchronized, {} failed".format(resCount.success, resCount.failed), attrs=["dark"]))
     return 0 if not resCount.failed else ERR_PARTIAL
 
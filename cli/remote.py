@@ -7,12 +7,11 @@ from cli import Cli, ArgumentParser
 
 
 def _tryConnect(args, target):
-    import requests
     cli = args._cli
     if args.verbose >= 1:
         cli.print("Trying '{}'...".format(target), end="")
     try:
-        response = requests.get(target+"/api/v1/status", **args._cparm)
+        response = args._session.get(target+"/api/v1/status")
         if response.status_code != 200:
             if args.verbose >= 1:
                 cli.print()
@@ -69,7 +68,6 @@ def _login(target, host, args):
         if args.verbose >= 1:
             cli.print(*argv, **kwargs)
 
-    import requests
     import urllib
     cli = args._cli
     user = args.user or "admin"
@@ -79,7 +77,7 @@ def _login(target, host, args):
         try:
             token = mkJWT({"usr": user})
             csrf = mkCSRF(token)
-            code, response = _remoteExec(None, target, token, "version", cparm=args._cparm, csrf=csrf)
+            code, response = _remoteExec(None, args._session, target, token, "version", csrf=csrf)
             if code == 200:
                 debugout(cli.col("success.", "green"))
                 return True, (token, csrf)
@@ -89,8 +87,7 @@ def _login(target, host, args):
     try:
         passwd = args.passwd or cli.input("Password: ", secret=True)
         data = urllib.parse.urlencode({"user": user, "pass": passwd})
-        response = requests.post(target+"login", data, headers={"Content-Type": "application/x-www-form-urlencoded"},
-                                 **args._cparm)
+        response = args._session.post(target+"login", data, headers={"Content-Type": "application/x-www-form-urlencoded"})
         data = response.json() or {}
         if response.status_code != 200:
             return False, "{}{}".format(data.get("message", "Login failed"), ": "+data["error"] if "error" in data else "")
@@ -98,7 +95,7 @@ def _login(target, host, args):
             return False, "Login failed: invalid response"
         token = data["grommunioAuthJwt"]
         csrf = data.get("csrf", "")
-        code, response = _remoteExec(None, target, token, "version", cparm=args._cparm, csrf=csrf)
+        code, response = _remoteExec(None, args._session, target, token, "version", csrf=csrf)
         if code is None:
             return False, response
         if code == 404:
@@ -114,29 +111,126 @@ def _login(target, host, args):
         return False, "Login failed ({})".format(type(err).__name__)
 
 
+def _cacheFile():
+    import os
+    runtimeDir = os.environ.get("XDG_RUNTIME_DIR")
+    return os.path.join(runtimeDir, "grommunio-admin", "remote.json") if runtimeDir else None
+
+
+def _cacheKey(args):
+    return "{}@{}".format(args.user or "admin", args.host or "localhost")
+
+
+def _tokenExpiry(token):
+    import base64
+    import json
+    try:
+        payload = token.split(".")[1]
+        return int(json.loads(base64.urlsafe_b64decode(payload+"="*(-len(payload) % 4)))["exp"])
+    except Exception:
+        return None
+
+
+def _readCache():
+    import json
+    import time
+    try:
+        with open(_cacheFile(), encoding="utf-8") as file:
+            cache = json.load(file)
+    except (OSError, TypeError, ValueError):
+        return {}
+    now = time.time()
+    return {key: entry for key, entry in cache.items() if isinstance(entry, dict) and entry.get("expires", 0)-60 > now}
+
+
+def _writeCache(cache):
+    import json
+    import os
+    path = _cacheFile()
+    if path is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp = "{}.{}".format(path, os.getpid())
+        with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as file:
+            json.dump(cache, file)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _cachedConnection(args):
+    """Get cached endpoint and credentials.
+
+    Returns
+    -------
+    tuple
+        (target, host, proto, token, csrf) or None if no valid entry exists
+    """
+    if args.no_cache or args.password:
+        return None
+    entry = _readCache().get(_cacheKey(args))
+    if entry is None:
+        return None
+    return entry["target"], entry["host"], entry["proto"], entry["token"], entry["csrf"]
+
+
+def _storeConnection(args, target, host, proto, token, csrf):
+    if args.no_cache:
+        return
+    cache = _readCache()
+    cache.pop(_cacheKey(args), None)
+    expires = _tokenExpiry(token)
+    if expires is not None:
+        cache[_cacheKey(args)] = {"target": target, "host": host, "proto": proto, "token": token, "csrf": csrf,
+                                  "expires": expires}
+    _writeCache(cache)
+
+
+def _connect(args):
+    """Detect endpoint and log in.
+
+    Returns
+    -------
+    tuple
+        (success, (target, host, proto, token, csrf) or error message, error code)
+    """
+    success, result = _getConnection(args)
+    if not success:
+        return False, result, 1
+    target, host, proto = result
+    success, result = _login(target, host, args)
+    if not success:
+        return False, result, 2
+    token, csrf = result
+    _storeConnection(args, target, host, proto, token, csrf)
+    return True, (target, host, proto, token, csrf), 0
+
+
 def _getPath(root, path):
     for part in path.split("."):
         root = root.get(part, {})
     return root if isinstance(root, str) else None
 
 
-def _remoteExec(cli, target, token, command, mode="exec", redirectFs=False, cparm={}, csrf=""):
-    import requests
+def _remoteExec(cli, session, target, token, command, mode="exec", redirectFs=False, csrf=""):
     try:
         colored = cli.colored if cli is not None else False
         data = {"command": command, "mode": mode, "color": colored, "fs": {} if redirectFs else None}
         headers = {"Content-Type": "application/json", "X-Csrf-Token": csrf}
-        response = requests.post(target+"system/cli", json=data, cookies={"grommunioAuthJwt": token}, headers=headers, **cparm)
+        response = session.post(target+"system/cli", json=data, cookies={"grommunioAuthJwt": token}, headers=headers)
         return response.status_code, response.json()
     except Exception as err:
         return None, "Remote execution failed ({})".format(type(err).__name__)
 
 
 class RemoteCompleter:
-    def __init__(self, cli, target, token):
+    def __init__(self, cli, session, target, token, csrf=""):
         self.cli = cli
+        self.session = session
         self.target = target
         self.token = token
+        self.csrf = csrf
         self.cached = None
         self.completions = ()
 
@@ -159,7 +253,7 @@ class RemoteCompleter:
             Completion according to state or None if completions are exhausted
         """
         if text != self.cached:
-            code, data = _remoteExec(self.cli, self.target, self.token, text, mode="complete")
+            code, data = _remoteExec(self.cli, self.session, self.target, self.token, text, mode="complete", csrf=self.csrf)
             self.completions = () if code != 200 or data is None or "completions" not in data else data["completions"]
             self.cached = text
         return None if state >= len(self.completions) else self.completions[state]
@@ -168,16 +262,17 @@ class RemoteCompleter:
 class RemoteCli(Cli):
     actionMap = {"discard": "d", "local": "s", "print": "V", "remote": "r"}
 
-    def __init__(self, parent, target, token, host, redirectFs, autoSave, cparm, csrf=""):
+    def __init__(self, parent, session, target, token, host, redirectFs, autoSave, csrf="", relogin=None):
         super().__init__("remote", fs=parent.fs, stdin=parent.stdin, stdout=parent.stdout, host=host, color=parent.colored)
-        self.completer = RemoteCompleter(self, target, token)
+        self.completer = RemoteCompleter(self, session, target, token, csrf)
+        self.__session = session
         self.__target = target
         self.__token = token
         self.__csrf = csrf
         self.__parent = parent
-        self.__cparm = cparm
         self.__redirectFs = redirectFs
         self.__autoSave = autoSave
+        self.__relogin = relogin
 
     def _receiveFiles(self, fs):
         if fs is None:
@@ -239,8 +334,17 @@ class RemoteCli(Cli):
                         self.print(self.col("Failed to write file: "+" - ".join(str(arg) for arg in err.args), "yellow"))
 
     def _execute(self, command):
-        code, data = _remoteExec(self, self.__target, self.__token, command, redirectFs=self.__redirectFs, cparm=self.__cparm,
+        code, data = _remoteExec(self, self.__session, self.__target, self.__token, command, redirectFs=self.__redirectFs,
                                  csrf=self.__csrf)
+        if code == 401 and self.__relogin is not None:
+            relogin, self.__relogin = self.__relogin, None
+            success, result = relogin()
+            if not success:
+                self.print(self.col(result, "red"))
+                return 101
+            self.__token, self.__csrf = result
+            self.completer.token, self.completer.csrf = result
+            return self._execute(command)
         if code is None:
             self.print(self.col(data, "red"))
             return 100
@@ -294,36 +398,74 @@ def _cliRemoteSetupParser(subp: ArgumentParser):
     subp.add_argument("passwd", nargs="?", help="User password (default is to prompt)")
     subp.add_argument("--auto-save", choices=("local", "remote", "discard", "print"),
                       help="Automatically perform selected action when receiving files, instead of prompting")
-    subp.add_argument("-c", "--command", help="Run command and exit (instead of starting shell)")
+    mode = subp.add_mutually_exclusive_group()
+    mode.add_argument("-c", "--command", help="Run command and exit (instead of starting shell)")
+    mode.add_argument("-f", "--file", metavar="FILE",
+                      help="Run commands from file ('-' for stdin), one per line, and exit (instead of starting shell)")
+    subp.add_argument("-k", "--keep-going", action="store_true", help="Continue with the next command from file on failure")
+    subp.add_argument("--no-cache", action="store_true", help="Do not use or store cached endpoint and login")
     subp.add_argument("--no-verify", action="store_true", help="Skip certificate verification")
     subp.add_argument("-p", "--password", action="store_true", help="Prompt for password even when connecting to localhost")
     subp.add_argument("--redirect-fs", action="store_true", help="Emulate CLI initiated read/write operations")
     subp.add_argument("-v", "--verbose", default=0, action="count", help="Print more information")
 
 
+def _runFile(args, remoteCli):
+    cli = args._cli
+    if args.file == "-":
+        lines = iter(cli.stdin.readline, "")
+    else:
+        with cli.open(args.file) as file:
+            lines = file.readlines()
+    result = 0
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if args.verbose >= 1:
+            cli.print(cli.col("{}: {}".format(lineno, line), attrs=["bold"]))
+        code = remoteCli.execute(line)
+        if code:
+            cli.print(cli.col("Line {}: command failed with code {}".format(lineno, code), "yellow"))
+            result = code
+            if not args.keep_going:
+                break
+    return result
+
+
 @Cli.command("connect", _cliRemoteSetupParser, help="Connect to a remote shell")
 def cliRemote(args):
+    import requests
     cli = args._cli
-    args._cparm = {}
+    args._session = requests.Session()
     if args.no_verify:
         import urllib3
         import warnings
         warnings.filterwarnings("ignore", "", urllib3.exceptions.InsecureRequestWarning, "", 0)
-        args._cparm["verify"] = False
-    success, result = _getConnection(args)
-    if not success:
-        cli.print(cli.col(result, "red"))
-        return 1
-    target, host, proto = result
-    if proto == "http://":
-        cli.print(cli.col("Using insecure HTTP connection", "yellow"))
-    success, result = _login(target, host, args)
-    if not success:
-        cli.print(cli.col(result, "red"))
-        return 2
-    token, csrf = result
+        args._session.verify = False
+
+    def relogin():
+        success, result, _ = _connect(args)
+        return success, result[3:] if success else result
 
-    remoteCli = RemoteCli(cli, target, token, host, args.redirect_fs, args.auto_save, args._cparm, csrf)
-    if args.command:
-        return remoteCli.execute(args.command)
-    return remoteCli.shell()
+    with args._session:
+        cached = _cachedConnection(args)
+        if cached is not None:
+            if args.verbose >= 1:
+                cli.print("Using cached login for '{}'".format(cached[0]))
+            target, host, proto, token, csrf = cached
+        else:
+            success, result, code = _connect(args)
+            if not success:
+                cli.print(cli.col(result, "red"))
+                return code
+            target, host, proto, token, csrf = result
+        if proto == "http://":
+            cli.print(cli.col("Using insecure HTTP connection", "yellow"))
+        remoteCli = RemoteCli(cli, args._session, target, token, host, args.redirect_fs, args.auto_save, csrf,
+                              relogin if cached is not None else None)
+        if args.command:
+            return remoteCli.execute(args.command)
+        if args.file:
+            return _runFile(args, remoteCli)
+        return remoteCli.shell()
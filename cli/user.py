@@ -6,7 +6,7 @@ from . import Cli, InvalidUseError
 from .common import proptagCompleter, Table
 
 from argparse import ArgumentParser
-from tools.deviceutils import retrieve_lastconnecttime
+from tools.deviceutils import retrieve_lastconnecttimes
 
 _statusMap = {0: "active", 1: "suspended", 3: "deleted", 4: "shared", 5: "contact"}
 _statusColor = {0: "green", 1: "yellow", 3: "red", 4: "cyan", 5: "blue"}
@@ -395,8 +395,11 @@ def _cliUserDevicesGetDevices(args, user):
     for device, status in wipeStatus.items():
         syncStates[device] = {"wipeStatus": status}
     with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
-        for device, state in syncStates.items():
-            state["lastconnecttime"] = retrieve_lastconnecttime(redis, user.username, device, state.get("lastupdatetime"))
+        lastconnect = retrieve_lastconnecttimes(redis, ((user.username, device) for device in syncStates),
+                                                {(user.username, device): state.get("lastupdatetime")
+                                                 for device, state in syncStates.items()})
+    for device, state in syncStates.items():
+        state["lastconnecttime"] = lastconnect[(user.username, device)]
     return syncStates
 
 
@@ -4,16 +4,135 @@
 
 __all__ = ["domain", "system", "defaults", "misc", "service", "tasq"]
 
-from flask import request, jsonify
-from orm import DB
+from flask import request, jsonify, make_response
+from orm import DB, TableVersions
 from services import ServiceUnavailableError
+from tools.config import Config
 from tools.DataModel import MissingRequiredAttributeError, InvalidAttributeError, MismatchROError
 from tools.misc import damerau_levenshtein_distance as dldist
+import hashlib
 import re
 
+from sqlalchemy import inspect
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.sql.expression import TableClause
+from sqlalchemy.sql.util import find_tables
 
 matchStringRe = re.compile(r"([\w\-]*)")
+_etagTableCache = {}
+
+
+def _etagTables(Model):
+    """Collect names of all tables the representation of a model can depend on.
+
+    Includes tables of all (transitively) related models, tables referenced by
+    column properties and hybrid property expressions and the admin role tables,
+    as permissions determine which objects are visible.
+
+    Returns None if the dependencies cannot be determined, e.g. because a hybrid
+    property has no SQL expression.
+    """
+    if Model not in _etagTableCache:
+        from orm.roles import AdminRoles, AdminRolePermissionRelation, AdminUserRoleRelation
+        tables = {AdminRoles.__tablename__, AdminRolePermissionRelation.__tablename__, AdminUserRoleRelation.__tablename__}
+        seen, mappers = set(), [inspect(Model)]
+        while mappers:
+            mapper = mappers.pop()
+            if mapper in seen:
+                continue
+            seen.add(mapper)
+            tables.update(table.name for table in mapper.tables)
+            for prop in mapper.column_attrs:
+                tables.update(table.name for expr in prop.columns
+                              for table in find_tables(expr, include_selects=True, check_columns=True)
+                              if isinstance(table, TableClause))
+            for name, attr in mapper.all_orm_descriptors.items():
+                if isinstance(attr, hybrid_property):
+                    try:
+                        expr = getattr(mapper.class_, name).__clause_element__()
+                    except Exception:
+                        _etagTableCache[Model] = None
+                        return None
+                    tables.update(table.name for table in find_tables(expr, include_selects=True, check_columns=True)
+                                  if isinstance(table, TableClause))
+            for rel in mapper.relationships:
+                if rel.secondary is not None:
+                    tables.add(rel.secondary.name)
+                mappers.append(rel.mapper)
+        _etagTableCache[Model] = sorted(tables)
+    return _etagTableCache[Model]
+
+
+def requestETag(Model, verbosity):
+    """Compute ETag of the current GET request.
+
+    The ETag is derived from the request URL, the authenticated user and the change
+    tokens of all tables the response depends on (see `TableVersions`).
+    Change tokens must be retrieved before the data is queried, so that concurrent
+    modifications can only cause unnecessary retransmissions.
+
+    Parameters
+    ----------
+    Model : SQLAlchemy model with DataModel extension
+        Model the response is generated from
+    verbosity : int
+        Requested verbosity level. Only models declaring a `_trackedLevel` get ETags,
+        levels above it contain data from other sources and are not tagged.
+
+    Returns
+    -------
+    str
+        ETag of the response or None if conditional requests are not possible
+    """
+    from api import backendVersion
+    if not Config["options"].get("etags", True) or verbosity > getattr(Model, "_trackedLevel", -1):
+        return None
+    tables = _etagTables(Model)
+    tokens = TableVersions.get(*tables) if tables is not None else None
+    if tokens is None:
+        return None
+    auth = getattr(request, "auth", {}).get("claims", {}).get("usr", "")
+    return hashlib.sha1("\0".join([backendVersion, auth, request.full_path]+tokens).encode()).hexdigest()
+
+
+def notModified(etag):
+    """Check whether the client already has the current representation.
+
+    Parameters
+    ----------
+    etag : str
+        ETag of the current representation, as returned by `requestETag`
+
+    Returns
+    -------
+    bool
+        True if the `If-None-Match` header contains the ETag, False otherwise
+    """
+    return etag is not None and request.if_none_match.contains_weak(etag)
+
+
+def taggedResponse(data, etag, code=200):
+    """Create JSON response with optional ETag.
+
+    Parameters
+    ----------
+    data : Any
+        JSON serializable response data, or None for an empty response
+    etag : str
+        ETag to attach or None
+    code : int, optional
+        HTTP status code. The default is 200.
+
+    Returns
+    -------
+    Response
+        Flask response
+    """
+    response = make_response("", code) if data is None else make_response(jsonify(data), code)
+    if etag is not None:
+        response.set_etag(etag)
+    return response
 
 
 def defaultListQuery(Model, filters=(), order=None, result="response", automatch=True, autofilter=True, autosort=True,
@@ -63,6 +182,9 @@ def defaultListQuery(Model, filters=(), order=None, result="response", automatch
     if len(offset) == 0:
         offset = None
     verbosity = int(request.args.get("level", 1))
+    etag = requestETag(Model, verbosity) if result == "response" else None
+    if notModified(etag):
+        return taggedResponse(None, etag, 304)
     query = (Model.optimized_query(verbosity) if query is None else Model.optimize_query(query, verbosity)).filter(*filters)
     if autosort:
         query = Model.autosort(query, request.args.getlist("sort"))
@@ -91,7 +213,7 @@ def defaultListQuery(Model, filters=(), order=None, result="response", automatch
     resp = dict(data=data)
     if include_count:
         resp[include_count] = count
-    return jsonify(resp)
+    return taggedResponse(resp, etag)
 
 
 def defaultDetailQuery(Model, ID, errName, filters=()):
@@ -114,13 +236,16 @@ def defaultDetailQuery(Model, ID, errName, filters=()):
     Response
         Flask response containing the object data or an error message.
     """
-    verbosity = request.args.get("level", 2)
+    verbosity = int(request.args.get("level", 2))
+    etag = requestETag(Model, verbosity)
+    if notModified(etag):
+        return taggedResponse(None, etag, 304)
     query = Model.query.filter(Model.ID == ID, *filters)
     query = Model.optimize_query(query, verbosity)
     obj = query.first()
     if obj is None:
         return jsonify(message=errName+" not found"), 404
-    return jsonify(obj.todict(verbosity))
+    return taggedResponse(obj.todict(verbosity), etag)
 
 
 def defaultPatch(Model, ID, errName, obj=None, filters=(), result="response"):
@@ -370,6 +495,9 @@ def userQuery(domainID=None):
 
     Users._init()
     verbosity = int(request.args.get("level", 1))
+    etag = requestETag(Users, verbosity)
+    if notModified(etag):
+        return taggedResponse(None, etag, 304)
     filters = (Users.domainID == domainID,) if domainID is not None else ()
     filters += (Users.ID > 0,)
     query, limit, offset, _ = defaultListHandler(Users, filters=filters, result="query", include_count=None, automatch=False)
@@ -423,4 +551,4 @@ def userQuery(domainID=None):
         properties = UserProperties.query.filter(UserProperties.userID.in_(usermap.keys()), UserProperties.tag.in_(tags)).all()
         for prop in properties:
             usermap[prop.userID]["properties"][prop.name] = prop.val
-    return jsonify(count=count, data=data)
+    return taggedResponse(dict(count=count, data=data), etag)
@@ -10,7 +10,9 @@ from flask import request, jsonify
 
 from services import Service
 
+from tools import foldercache
 from tools.constants import PropTags, PropTypes, ExchangeErrors, PublicFIDs
+from tools.exmdb import setFolderPermissions
 from tools.permissions import DomainAdminPermission, DomainAdminROPermission
 from tools.rop import nxTime, makeEidEx
 from tools.tasq import TasQServer
@@ -27,11 +29,15 @@ def folderToDict(folder):
             "syncMobile": folder.syncToMobile}
 
 
+def syncToMobileTag(client):
+    propID = client.namedPropIDs([("PSETID_GROMOX", "synctomobile")])[0]
+    return (propID << 16) | PropTypes.BYTE if propID else 0
+
+
 def setPublicFolderMobileSync(exmdb, client, domainname, folderId, value):
-    synctomobile = client.resolveNamedProperties(True, [exmdb.PropertyName(exmdb.GUID.PSETID_GROMOX, "synctomobile")])[0]
-    synctomobile = (synctomobile << 16) | PropTypes.BYTE
+    synctomobile = syncToMobileTag(client)
     if not synctomobile:
-        return
+        return []
     problems = client.setFolderProperties(0, folderId, [exmdb.TaggedPropval(synctomobile, value)])
     with Service("redis") as redis:
         redis.delete("grommunio-sync:sharedfolders-"+domainname)
@@ -49,22 +55,25 @@ def getPublicFoldersList(domainID):
     limit = int(request.args.get("limit", 50))
     offset = int(request.args.get("offset", 0))
     parent = int(request.args.get("parentID", makeEidEx(1, PublicFIDs.IPMSUBTREE)))
-    with Service("exmdb") as exmdb:
-        if "match" in request.args:
-            fuzzyLevel = exmdb.Restriction.FL_SUBSTRING | exmdb.Restriction.FL_IGNORECASE
-            match = request.args["match"]
-            restriction = exmdb.Restriction.OR([
-                exmdb.Restriction.CONTENT(fuzzyLevel, 0, exmdb.TaggedPropval(PropTags.DISPLAYNAME, match)),
-                exmdb.Restriction.CONTENT(fuzzyLevel, 0, exmdb.TaggedPropval(PropTags.COMMENT, match))])
-        else:
-            restriction = exmdb.Restriction.NULL()
-        client = exmdb.domain(domain)
-        synctomobile = client.resolveNamedProperties(True, [exmdb.PropertyName(exmdb.GUID.PSETID_GROMOX, "synctomobile")])[0]
-        synctomobile = (synctomobile << 16) | PropTypes.BYTE
-        response = exmdb.FolderList(client.listFolders(parent, limit=limit, offset=offset, restriction=restriction,
-                                                       proptags=client.defaultFolderProps+[synctomobile]), synctomobile)
-    folders = [folderToDict(entry) for entry in response.folders]
-    return jsonify(data=folders)
+    match = request.args.get("match")
+
+    def load():
+        with Service("exmdb") as exmdb:
+            if match is not None:
+                fuzzyLevel = exmdb.Restriction.FL_SUBSTRING | exmdb.Restriction.FL_IGNORECASE
+                restriction = exmdb.Restriction.OR([
+                    exmdb.Restriction.CONTENT(fuzzyLevel, 0, exmdb.TaggedPropval(PropTags.DISPLAYNAME, match)),
+                    exmdb.Restriction.CONTENT(fuzzyLevel, 0, exmdb.TaggedPropval(PropTags.COMMENT, match))])
+            else:
+                restriction = exmdb.Restriction.NULL()
+            client = exmdb.domain(domain)
+            synctomobile = syncToMobileTag(client)
+            response = exmdb.FolderList(client.listFolders(parent, limit=limit, offset=offset, restriction=restriction,
+                                                           proptags=client.defaultFolderProps+[synctomobile]), synctomobile)
+        return [folderToDict(entry) for entry in response.folders]
+
+    key = "list:{}:{}:{}:{}".format(parent, limit, offset, match if match is not None else "")
+    return jsonify(data=foldercache.cached(domain.homedir, key, load))
 
 
 @API.route(api.BaseRoute+"/domains/<int:domainID>/folders/tree", methods=["GET"])
@@ -77,19 +86,24 @@ def getFolderTree(domainID):
         return jsonify(message="Domain not found"), 404
     parentID = int(request.args.get("folderID", makeEidEx(1, PublicFIDs.IPMSUBTREE)))
     tags = (PropTags.FOLDERID, PropTags.PARENTFOLDERID, PropTags.DISPLAYNAME, PropTags.CONTAINERCLASS)
-    with Service("exmdb") as exmdb:
-        client = exmdb.domain(domain)
-        parent = exmdb.Folder(client.getFolderProperties(0, parentID, tags))
-        folders = exmdb.FolderList(client.listFolders(parentID, True, tags))
-    idmap = {folder.folderId: {"folderid": str(folder.folderId), "name": folder.displayName, "container": folder.container}
-             for folder in folders.folders}
-    idmap[parentID] = {"folderid": str(parent.folderId), "name": parent.displayName}
-    for folder in folders.folders:
-        parentFolder = idmap[folder.parentId]
-        if "children" not in parentFolder:
-            parentFolder["children"] = []
-        parentFolder["children"].append(idmap[folder.folderId])
-    return jsonify(idmap[parentID])
+
+    def load():
+        with Service("exmdb") as exmdb:
+            client = exmdb.domain(domain)
+            parent = exmdb.Folder(client.getFolderProperties(0, parentID, tags))
+            folders = exmdb.FolderList(client.listFolders(parentID, True, tags))
+        idmap = {folder.folderId: {"folderid": str(folder.folderId), "name": folder.displayName,
+                                   "container": folder.container}
+                 for folder in folders.folders}
+        idmap[parentID] = {"folderid": str(parent.folderId), "name": parent.displayName}
+        for folder in folders.folders:
+            parentFolder = idmap[folder.parentId]
+            if "children" not in parentFolder:
+                parentFolder["children"] = []
+            parentFolder["children"].append(idmap[folder.folderId])
+        return idmap[parentID]
+
+    return jsonify(foldercache.cached(domain.homedir, "tree:{}".format(parentID), load))
 
 
 @API.route(api.BaseRoute+"/domains/<int:domainID>/folders", methods=["POST"])
@@ -109,6 +123,7 @@ def createPublicFolder(domainID):
             return jsonify(message="Folder creation failed"), 500
         if "syncMobile" in data:
             setPublicFolderMobileSync(exmdb, client, domain.domainname, folderId, data["syncMobile"])
+    foldercache.invalidate(domain.homedir)
     return jsonify(folderid=str(folderId),
                    displayname=data["displayname"],
                    comment=data["comment"],
@@ -125,13 +140,15 @@ def getPublicFolder(domainID, folderID):
     domain = Domains.query.filter(Domains.ID == domainID).first()
     if domain is None:
         return jsonify(message="Domain not found"), 404
-    with Service("exmdb") as exmdb:
-        client = exmdb.domain(domain)
-        synctomobile = client.resolveNamedProperties(True, [exmdb.PropertyName(exmdb.GUID.PSETID_GROMOX, "synctomobile")])[0]
-        synctomobile = (synctomobile << 16) | PropTypes.BYTE
-        response = exmdb.Folder(client.getFolderProperties(0, folderID, client.defaultFolderProps+[synctomobile]),
-                                synctomobile)
-    return jsonify(folderToDict(response))
+
+    def load():
+        with Service("exmdb") as exmdb:
+            client = exmdb.domain(domain)
+            synctomobile = syncToMobileTag(client)
+            return folderToDict(exmdb.Folder(client.getFolderProperties(0, folderID, client.defaultFolderProps+[synctomobile]),
+                                             synctomobile))
+
+    return jsonify(foldercache.cached(domain.homedir, "folder:{}".format(folderID), load))
 
 
 @API.route(api.BaseRoute+"/domains/<int:domainID>/folders/<int:folderID>", methods=["PATCH"])
@@ -152,6 +169,7 @@ def updatePublicFolder(domainID, folderID):
         problems = client.setFolderProperties(0, folderID, proptags)
         if "syncMobile" in data:
             problems += setPublicFolderMobileSync(exmdb, client, domain.domainname, folderID, data["syncMobile"])
+        foldercache.invalidate(domain.homedir)
         if len(problems):
             errors = ["{} ({})".format(PropTags.lookup(problem.proptag, hex(problem.proptag)).lower(),
                                        ExchangeErrors.lookup(problem.err, hex(problem.err))) for problem in problems]
@@ -170,6 +188,7 @@ def deletePublicFolder(domainID, folderID):
         return jsonify(message="Domain not found"), 404
     task = TasQServer.mktask.deleteFolder(domain.homedir, folderID, False, request.args.get("clear") == "true",
                                           DomainAdminROPermission(domainID), domain.homeserver)
+    foldercache.invalidate(domain.homedir)
     timeout = float(request.args.get("timeout", 1))
     if timeout > 0:
         TasQServer.wait(task.ID, timeout)
@@ -180,6 +199,34 @@ def deletePublicFolder(domainID, folderID):
     return jsonify(message="Folder deletion failed: "+task.message), 500
 
 
+@API.route(api.BaseRoute+"/domains/<int:domainID>/folders/owners", methods=["PUT"])
+@secure(requireDB=True)
+def setPublicFolderOwners(domainID):
+    checkPermissions(DomainAdminPermission(domainID))
+    from orm.domains import Domains
+    data = request.get_json(silent=True)
+    if data is None or "entries" not in data:
+        return jsonify(message="Missing required parameter 'entries'"), 400
+    if any(not isinstance(member, str) for entry in data["entries"] for member in entry["members"]):
+        return jsonify(message="Members must be specified by username"), 400
+    domain = Domains.query.filter(Domains.ID == domainID).first()
+    if domain is None:
+        return jsonify(message="Domain not found"), 404
+    with Service("exmdb") as exmdb:
+        client = exmdb.domain(domain)
+        modes = {"add": client.ADD, "set": client.SET, "remove": client.REMOVE}
+        entries = [([int(folderID) for folderID in entry["folders"]], entry["members"],
+                     entry.get("permissions", 0xFFFFFFFF if entry.get("mode") == "remove" else client.ownerRights),
+                     modes[entry.get("mode", "add")])
+                   for entry in data["entries"]]
+        updated, errors = setFolderPermissions(exmdb, client, entries, data.get("recursive", False))
+    if updated:
+        with Service("redis") as redis:
+            redis.delete("grommunio-sync:sharedfolders-"+domain.domainname)
+    return jsonify(updated=updated, errors=[{"folderID": str(folderID), "member": member, "message": message}
+                                            for folderID, member, message in errors])
+
+
 @API.route(api.BaseRoute+"/domains/<int:domainID>/folders/<int:folderID>/owners", methods=["GET"])
 @secure(requireDB=True)
 def getPublicFolderOwnerList(domainID, folderID):
@@ -7,6 +7,7 @@ import api
 from api.core import API, secure
 from api.security import checkPermissions
 from base64 import b64decode
+from collections import Counter, OrderedDict
 from datetime import datetime
 from flask import request, jsonify
 from sqlalchemy.exc import IntegrityError
@@ -18,16 +19,18 @@ from services import Service
 from tools import formats
 from tools.config import Config
 from tools.constants import PropTags, PropTypes, ExchangeErrors, PrivateFIDs, Permissions
-from tools.misc import loadPSO, GenericObject
+from tools.misc import scanPSO, GenericObject
 from tools.permissions import SystemAdminPermission, DomainAdminPermission, DomainAdminROPermission, ResetPasswdPermission
 from tools.rop import nxTime, makeEidEx
 from tools.storage import setDirectoryOwner, setDirectoryPermission
-from tools.deviceutils import retrieve_lastconnecttime
+from tools.deviceutils import retrieve_lastconnecttimes
 
 import configparser
+import hashlib
 import json
 import os
 import shutil
+import threading
 import time
 
 from orm import DB
@@ -145,6 +148,45 @@ def setUserPassword(domainID, userID):
     return jsonify(message="Success")
 
 
+@API.route(api.BaseRoute+"/domains/<int:domainID>/users/passwords", methods=["PUT"])
+@secure(requireDB=True, authLevel="user")
+def setUserPasswords(domainID):
+    checkPermissions(DomainAdminPermission(domainID))
+    from orm.users import Users
+    data = request.get_json(silent=True)
+    if data is None or not isinstance(data.get("passwords"), list):
+        return jsonify(message="Incomplete data"), 400
+    if not all(isinstance(entry, dict) for entry in data["passwords"]):
+        return jsonify(message="Password entries must be objects"), 400
+    errors, entries = [], []
+    for index, entry in enumerate(data["passwords"]):
+        ID = entry.get("ID")
+        if not isinstance(ID, int) or isinstance(ID, bool):
+            errors.append({"index": index, "message": "Missing or invalid user ID"})
+        elif not isinstance(entry.get("new"), str):
+            errors.append({"index": index, "ID": ID, "message": "Missing or invalid password"})
+        else:
+            entries.append((index, ID, entry["new"]))
+    counts = Counter(ID for _, ID, _ in entries)
+    users = {user.ID: user for user in Users.query.filter(Users.ID.in_(counts), Users.domainID == domainID)} if counts else {}
+    update = []
+    for index, ID, password in entries:
+        if counts[ID] > 1:
+            errors.append({"index": index, "ID": ID, "message": "Duplicate user ID"})
+        elif ID not in users:
+            errors.append({"index": index, "ID": ID, "message": "User not found"})
+        elif ID == request.auth["user"].ID:
+            errors.append({"index": index, "ID": ID, "message": "Cannot reset own password, use '/passwd' endpoint instead"})
+        elif users[ID].externID is not None:
+            errors.append({"index": index, "ID": ID, "message": "Cannot modify LDAP imported user"})
+        else:
+            update.append((users[ID], password))
+    errors.sort(key=lambda error: error["index"])
+    Users.setPasswords([user for user, _ in update], [password for _, password in update])
+    DB.session.commit()
+    return jsonify(updated=len(update), errors=errors)
+
+
 @API.route(api.BaseRoute+"/domains/<int:domainID>/users/<int:userID>/roles", methods=["PATCH"])
 @secure(requireDB=True)
 def updateUserRoles(domainID, userID):
@@ -251,11 +293,31 @@ def setUserStoreProps(domainID, userID):
         return jsonify(message="Great success!" if len(errors) == 0 else "Some tags could not be set", errors=errors)
 
 
+_syncProps = ("deviceid", "devicetype", "useragent", "deviceuser", "firstsynctime", "lastupdatetime", "asversion")
+_syncSummaries = OrderedDict()
+_syncSummariesLock = threading.Lock()
+
+
+def _syncStateSkip(username):
+    """Create `scanPSO` skip function passing over all device data not needed for the summary."""
+    route = ("StateObject", 1, "devices", username, "ASDevice", 1)
+    depth = len(route)
+
+    def skip(path):
+        if len(path) <= depth:
+            return path[-1] != route[len(path)-1]
+        if path[depth] == "contentdata":
+            return len(path) > depth+2  # Only the keys of the folder entries are evaluated
+        return path[depth] not in _syncProps
+    return skip
+
+
 def decodeSyncState(data, username):
     data = b64decode(data)
     if len(data) >= 2 and data[1] == ord(":"):
         API.logger.warning("Loading PHP serialize objects is deprecated")
-        return loadPSO(data, decode_strings=True)["StateObject"][1]["devices"][username]["ASDevice"][1]
+        data = scanPSO(data, _syncStateSkip(username), decode_strings=True)
+        return data["StateObject"][1]["devices"][username]["ASDevice"][1]
     elif len(data) >= 1 and data[0] == ord("{"):
         data = json.loads(data)["data"]
         if "devices" in data:
@@ -264,11 +326,50 @@ def decodeSyncState(data, username):
     return None
 
 
+def syncStateSummary(state, username):
+    """Get summary of a device sync state.
+
+    Decoded summaries are cached per process, keyed by a digest of the raw
+    state, so unchanged states are only decoded once.
+
+    Parameters
+    ----------
+    state : str
+        Base64 encoded sync state
+    username : str
+        Name of the user owning the device
+
+    Returns
+    -------
+    dict
+        Device summary or None if the state format is unknown
+    """
+    digest = hashlib.blake2b(state if isinstance(state, bytes) else state.encode(), digest_size=16).digest()
+    key = (username, digest)
+    with _syncSummariesLock:
+        if key in _syncSummaries:
+            _syncSummaries.move_to_end(key)
+            summary = _syncSummaries[key]
+            return dict(summary) if summary is not None else None
+    stateobj = decodeSyncState(state, username)
+    summary = None
+    if stateobj is not None:
+        summary = {prop: stateobj[prop] for prop in _syncProps}
+        summary["foldersSyncable"] = len(stateobj["contentdata"])
+        summary["foldersSynced"] = len([folder for folder in stateobj["contentdata"].values() if "1" in folder])
+    cacheSize = Config["sync"].get("stateCacheSize", 1024)
+    if cacheSize > 0:
+        with _syncSummariesLock:
+            _syncSummaries[key] = summary
+            while len(_syncSummaries) > cacheSize:
+                _syncSummaries.popitem(last=False)
+    return dict(summary) if summary is not None else None
+
+
 @API.route(api.BaseRoute+"/domains/<int:domainID>/users/<int:userID>/sync", methods=["GET"])
 @secure(requireDB=True)
 def getUserSyncData(domainID, userID):
     checkPermissions(DomainAdminROPermission(domainID))
-    props = ("deviceid", "devicetype", "useragent", "deviceuser", "firstsynctime", "lastupdatetime", "asversion")
     from orm.users import DB, Users, UserDevices
     user = Users.query.filter(Users.ID == userID, Users.domainID == domainID).first()
     if user is None:
@@ -281,12 +382,9 @@ def getUserSyncData(domainID, userID):
         data = client.getSyncData(Config["sync"].get("syncStateFolder", "GS-SyncState"))
     for device, state in data.items():
         try:
-            stateobj = decodeSyncState(state, user.username)
-            if stateobj is None:
+            syncstate = syncStateSummary(state, user.username)
+            if syncstate is None:
                 continue
-            syncstate = {prop: stateobj[prop] for prop in props}
-            syncstate["foldersSyncable"] = len(stateobj["contentdata"])
-            syncstate["foldersSynced"] = len([folder for folder in stateobj["contentdata"].values() if "1" in folder])
             syncstate["wipeStatus"] = 0
             devices[syncstate["deviceid"]] = syncstate
         except Exception as err:
@@ -299,8 +397,11 @@ def getUserSyncData(domainID, userID):
             else:
                 devices[device.deviceID] = {"deviceid": device.deviceID, "wipeStatus": device.status}
     with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
-        for device_id, state in devices.items():
-            state["lastconnecttime"] = retrieve_lastconnecttime(redis, user.username, device_id, state.get("lastupdatetime"))
+        lastconnect = retrieve_lastconnecttimes(redis, ((user.username, device_id) for device_id in devices),
+                                                {(user.username, device_id): state.get("lastupdatetime")
+                                                 for device_id, state in devices.items()})
+    for device_id, state in devices.items():
+        state["lastconnecttime"] = lastconnect[(user.username, device_id)]
     return jsonify(data=tuple(devices.values()))
 
 
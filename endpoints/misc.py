@@ -2,17 +2,20 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 # SPDX-FileCopyrightText: 2020 grommunio GmbH
 
-from flask import jsonify, request
+from flask import Response, jsonify, request
 
 import api
 import idna
 
 from api.core import API, secure
-from api.security import loginUser, refreshToken, getSecurityContext, mkCSRF
+from api.security import checkPermissions, loginUser, refreshToken, getSecurityContext, mkCSRF
 
 from orm import DB
 from services import Service
 from tools import formats
+from tools.config import Config
+from tools.metrics import Metrics
+from tools.permissions import SystemAdminROPermission
 from tools.tasq import TasQServer
 
 
@@ -32,6 +35,15 @@ def getAbout(requireAuth=False):
     return jsonify(API=api.apiVersion, backend=api.backendVersion, schema=DB.version if DB is not None else None)
 
 
+@API.route(api.BaseRoute+"/metrics", methods=["GET"])
+@secure(requireAuth="optional")
+def getMetrics():
+    """Export metrics of all workers in OpenMetrics format."""
+    if request.remote_addr not in Config["options"].get("metrics", {}).get("allowedHosts", ()):
+        checkPermissions(SystemAdminROPermission())
+    return Response(Metrics.export(), content_type="application/openmetrics-text; version=1.0.0; charset=utf-8")
+
+
 @API.route(api.BaseRoute+"/login", methods=["POST"])
 @secure(requireAuth=False)
 def login():
@@ -2,10 +2,12 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 # SPDX-FileCopyrightText: 2021 grommunio GmbH
 
+import json
 import time
 
+from collections import defaultdict
 from datetime import datetime
-from flask import jsonify, request
+from flask import Response, jsonify, request
 
 import api
 from api.core import API, secure
@@ -14,8 +16,9 @@ from api.security import checkPermissions
 
 from services import Service
 
+from tools import syncpolicy
 from tools.config import Config
-from tools.deviceutils import retrieve_lastconnecttime
+from tools.deviceutils import retrieve_lastconnecttimes
 from tools.permissions import DomainAdminROPermission, SystemAdminPermission
 
 
@@ -28,19 +31,12 @@ def checkAccess(permission):
 @secure(requireDB=True, requireAuth="optional")
 def getUserSyncPolicy(username):
     checkAccess(DomainAdminROPermission("*"))
-    from orm.domains import Domains
-    from orm.users import Users
-    user = Users.query.filter(Users.username == username).first()
-    if user is None:
+    resolved = syncpolicy.resolve((username,)).get(username)
+    if resolved is None:
         return jsonify(data=Config["sync"]["defaultPolicy"])
-    checkAccess(DomainAdminROPermission(user.domainID))
-    domain = Domains.query.filter(Domains.ID == user.domainID, Domains._syncPolicy != None).first()
-    policy = dict(Config["sync"]["defaultPolicy"])
-    if domain is not None:
-        policy.update(domain.syncPolicy)
-    if user.syncPolicy is not None:
-        policy.update(user.syncPolicy)
-    return jsonify(data=policy)
+    domainID, policy = resolved
+    checkAccess(DomainAdminROPermission(domainID))
+    return Response('{"data":'+policy+'}', mimetype="application/json")
 
 
 @API.route(api.BaseRoute+"/service/wipe/<username>", methods=["GET"])
@@ -126,11 +122,9 @@ def getLastConnect(username):
     except Exception:
         known_devices = []
     targets = requested if requested is not None else known_devices
-    data = {}
     with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
-        for deviceID in targets:
-            data[deviceID] = {"lastconnecttime": retrieve_lastconnecttime(redis, user.username, deviceID)}
-    return jsonify(data=data)
+        lastconnect = retrieve_lastconnecttimes(redis, ((user.username, deviceID) for deviceID in targets))
+    return jsonify(data={deviceID: {"lastconnecttime": lastconnect[(user.username, deviceID)]} for deviceID in targets})
 
 
 @API.route(api.BaseRoute+"/service/userinfo/<username>", methods=["GET"])
@@ -142,3 +136,103 @@ def getUserInfo(username):
         return jsonify(message="User not found"), 404
     checkAccess(DomainAdminROPermission(user.domainID))
     return jsonify(ldap=user.externID is not None)
+
+
+def batchUsers(*entities):
+    """Load users named in the request body.
+
+    Users are resolved with one query per 1000 usernames. Access is checked for
+    the domains of all found users.
+
+    Parameters
+    ----------
+    *entities : Column
+        Additional columns to load
+
+    Returns
+    -------
+    list
+        Tuples of requested username, user ID, domain ID and additional entities. Unknown users are omitted.
+    """
+    from orm.users import Users
+    usernames = list(dict.fromkeys((request.get_json(silent=True) or {}).get("usernames", ())))
+    lookup = {username.lower(): username for username in usernames}
+    users = []
+    for offset in range(0, len(usernames), syncpolicy.QUERY_CHUNK):
+        users += Users.query.filter(Users.username.in_(usernames[offset:offset+syncpolicy.QUERY_CHUNK]))\
+                            .with_entities(Users.username, Users.ID, Users.domainID, *entities).all()
+    for domainID in {user.domainID for user in users}:
+        checkAccess(DomainAdminROPermission(domainID))
+    return [(lookup.get(user[0].lower(), user[0]), *user[1:]) for user in users]
+
+
+def batchDevices(users):
+    """Get devices of multiple users.
+
+    Parameters
+    ----------
+    users : list
+        List of tuples as returned by `batchUsers`
+
+    Returns
+    -------
+    dict
+        Mapping of username to a dict mapping device IDs to device status
+    """
+    from orm.users import UserDevices
+    names = {user[1]: user[0] for user in users}
+    IDs = list(names)
+    devices = defaultdict(dict)
+    try:
+        for offset in range(0, len(IDs), syncpolicy.QUERY_CHUNK):
+            for userID, deviceID, status in UserDevices.query\
+                    .filter(UserDevices.userID.in_(IDs[offset:offset+syncpolicy.QUERY_CHUNK]))\
+                    .with_entities(UserDevices.userID, UserDevices.deviceID, UserDevices.status):
+                devices[names[userID]][deviceID] = status
+    except Exception:
+        pass
+    return devices
+
+
+@API.route(api.BaseRoute+"/service/batch/syncPolicy", methods=["POST"])
+@secure(requireDB=True, requireAuth="optional")
+def getUserSyncPolicies():
+    checkAccess(DomainAdminROPermission("*"))
+    usernames = list(dict.fromkeys((request.get_json(silent=True) or {}).get("usernames", ())))
+    resolved = syncpolicy.resolve(usernames)
+    for domainID in {domainID for domainID, _ in resolved.values()}:
+        checkAccess(DomainAdminROPermission(domainID))
+    default = json.dumps(Config["sync"]["defaultPolicy"], separators=(",", ":"))
+    policies = ",".join(json.dumps(username)+":"+(resolved[username][1] if username in resolved else default)
+                        for username in usernames)
+    return Response('{"data":{'+policies+'}}', mimetype="application/json")
+
+
+@API.route(api.BaseRoute+"/service/batch/wipe", methods=["POST"])
+@secure(requireDB=True, requireAuth="optional")
+def getWipeStatuses():
+    users = batchUsers()
+    devices = batchDevices(users)
+    return jsonify(data={user[0]: {deviceID: {"status": status} for deviceID, status in devices[user[0]].items()}
+                         for user in users})
+
+
+@API.route(api.BaseRoute+"/service/batch/lastconnect", methods=["POST"])
+@secure(requireDB=True, requireAuth="optional")
+def getLastConnects():
+    users = batchUsers()
+    devices = batchDevices(users)
+    lastconnect = {}
+    with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
+        lastconnect = retrieve_lastconnecttimes(redis, ((user[0], deviceID) for user in users for deviceID in devices[user[0]]))
+    return jsonify(data={user[0]: {deviceID: {"lastconnecttime": lastconnect.get((user[0], deviceID))}
+                                   for deviceID in devices[user[0]]}
+                         for user in users})
+
+
+@API.route(api.BaseRoute+"/service/batch/userinfo", methods=["POST"])
+@secure(requireDB=True, requireAuth="optional")
+def getUserInfos():
+    from orm.users import Users
+    return jsonify(data={username: {"ldap": externID is not None}
+                         for username, _, _, externID in batchUsers(Users.externID)})
@@ -124,7 +124,6 @@ def getDomain(domainID):
 def updateDomain(domainID):
     checkPermissions(OrgAdminPermission("*"))
     from orm.domains import Domains
-    from orm.users import Users
     domain: Domains = Domains.query.filter(Domains.ID == domainID).first()
     if domain is None:
         return jsonify(message="Domain not found"), 404
@@ -134,9 +133,7 @@ def updateDomain(domainID):
     if isinstance(patched, tuple):  # Return value is not the domain, but an error response
         return patched
     if oldStatus != domain.domainStatus:
-        Users.query.filter(Users.domainID == domainID)\
-                   .update({Users.addressStatus: Users.addressStatus.op("&")(0xF)+(domain.domainStatus << 4)},
-                           synchronize_session=False)
+        domain.setStatus(domain.domainStatus)
     try:
         DB.session.commit()
     except IntegrityError as err:
@@ -9,8 +9,11 @@ from api.security import checkPermissions
 from services import Service
 
 from datetime import datetime
-from flask import jsonify, request
+from flask import Response, jsonify, request
+import json
 import psutil
+import threading
+import time
 
 from tools.config import Config
 from tools.logs import LogReader
@@ -38,7 +41,68 @@ def getLog(file):
     n = int(request.args.get("n", 10))
     skip = int(request.args.get("skip", 0))
     after = datetime.strptime(request.args["after"], "%Y-%m-%d %H:%M:%S.%f") if "after" in request.args else None
-    return jsonify(data=LogReader.tail(log.get("format", "journald"), log["source"], n, skip, after))
+    cursor = request.args.get("cursor")
+    level = int(request.args["level"]) if "level" in request.args else None
+    try:
+        data = LogReader.tail(log.get("format", "journald"), log["source"], n, skip, after, cursor, level,
+                              request.args.get("grep"))
+    except ValueError as err:
+        return jsonify(message=err.args[0]), 400
+    return jsonify(data=data, cursor=data[-1]["cursor"] if data else cursor)
+
+
+_streamLock = threading.Lock()
+_streams = 0
+
+
+@API.route(api.BaseRoute+"/system/logs/<file>/stream", methods=["GET"])
+@secure()
+def streamLog(file):
+    checkPermissions(SystemAdminROPermission())
+    global _streams
+    log = Config["logs"].get(file) if file != "Keycloak" else { "source": "grommunio-keycloak.service" }
+    if log is None:
+        return jsonify(message="Log file not found"), 404
+    conf = Config["options"].get("logStream", {})
+    n = int(request.args.get("n", 10))
+    cursor = request.headers.get("Last-Event-ID") or request.args.get("cursor")
+    level = int(request.args["level"]) if "level" in request.args else None
+    with _streamLock:
+        if _streams >= conf.get("maxClients", 2):
+            return jsonify(message="Too many log streams"), 503
+        _streams += 1
+
+    def release():
+        global _streams
+        batches.close()
+        with _streamLock:
+            _streams -= 1
+
+    try:
+        batches = LogReader.follow(log.get("format", "journald"), log["source"], n, cursor, level,
+                                   request.args.get("grep"), batchSize=conf.get("batchSize", 100),
+                                   batchDelay=conf.get("batchDelay", 0.5), timeout=conf.get("keepalive", 15))
+    except Exception as err:
+        with _streamLock:
+            _streams -= 1
+        if isinstance(err, ValueError):
+            return jsonify(message=err.args[0]), 400
+        raise
+
+    def generate():
+        end = time.monotonic()+conf.get("maxDuration", 3600)
+        for batch in batches:
+            if batch:
+                yield "id: {}\ndata: {}\n\n".format(batch[-1]["cursor"], json.dumps(batch, separators=(",", ":")))
+            else:
+                yield ": keepalive\n\n"
+            if time.monotonic() >= end:  # Free the worker, clients reconnect automatically
+                break
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["X-Accel-Buffering"] = "no"
+    response.call_on_close(release)
+    return response
 
 
 @API.route(api.BaseRoute+"/system/updateLog/<int:pid>", methods=["GET"])
@@ -2,7 +2,6 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 # SPDX-FileCopyrightText: 2022 grommunio GmbH
 
-import json
 import subprocess
 
 from flask import jsonify, request
@@ -11,6 +10,8 @@ import api
 
 from api.core import API, secure
 from api.security import checkPermissions
+from tools.config import Config
+from tools.mailq import MailQueue
 from tools.permissions import SystemAdminROPermission, SystemAdminPermission
 
 
@@ -18,26 +19,20 @@ from tools.permissions import SystemAdminROPermission, SystemAdminPermission
 @secure()
 def getMailqData():
     checkPermissions(SystemAdminROPermission())
-    try:
-        postfixMailq = subprocess.run("mailq", stdout=subprocess.PIPE, universal_newlines=True).stdout
-    except Exception as err:
-        API.logger.error("Failed to run mailq: {} ({})"
-                         .format(type(err).__name__, " - ".join(str(arg) for arg in err.args)))
-        postfixMailq = "Failed to run mailq."
-    try:
-        gromoxMailq = subprocess.run("gromox-mailq", stdout=subprocess.PIPE, universal_newlines=True).stdout
-    except Exception as err:
-        API.logger.error("Failed to run gromox-mailq: {} ({})"
-                         .format(type(err).__name__, " - ".join(str(arg) for arg in err.args)))
-        gromoxMailq = ""
-    try:
-        postqueue = subprocess.run(["postqueue", "-j"], stdout=subprocess.PIPE, universal_newlines=True).stdout
-        postqueue = [json.loads(line) for line in postqueue.split("\n") if line]
-    except Exception as err:
-        API.logger.error("Failed to run postqueue: {} ({})"
-                         .format(type(err).__name__, " - ".join(str(arg) for arg in err.args)))
-        postqueue = []
-    return jsonify(postfixMailq=postfixMailq, gromoxMailq=gromoxMailq, postqueue=postqueue)
+    args = request.args
+    conf = Config["options"].get("mailq", {})
+    limit = None
+    if "offset" in args or "limit" in args:  # Pagination is opt-in, the full queue is returned by default
+        limit = min(int(args.get("limit", conf.get("pageSize", 100))), conf.get("maxPageSize", 1000))
+    result = MailQueue.query(args.get("sender"), args.get("domain"), args.get("queue"),
+                             int(args["minAge"]) if "minAge" in args else None,
+                             int(args["maxAge"]) if "maxAge" in args else None,
+                             int(args.get("offset", 0)), limit, int(args.get("top", 10)))
+    if args.get("raw", "true") == "true":
+        postfixMailq = MailQueue.postfixMailq()
+        result["postfixMailq"] = postfixMailq if postfixMailq is not None else "Failed to run mailq."
+        result["gromoxMailq"] = MailQueue.gromoxMailq() or ""
+    return jsonify(result)
 
 
 @API.route(api.BaseRoute+"/system/mailq/flush", methods=["POST"])
@@ -49,6 +44,7 @@ def flushMailq():
     from subprocess import PIPE
     target = request.args.get("queue")
     result = subprocess.run(["postqueue", "-i", target], stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    MailQueue.invalidate()
     log = API.logger.warning if result.returncode else API.logger.info
     if result.stdout:
         log("Postqueue (out): "+result.stdout)
@@ -64,6 +60,7 @@ def postsuper(op):
     targets = request.args.get("queue", "ALL").split(",")
     command = ["sudo", "postsuper"]+[t for param in ((op, target) for target in targets) for t in param]
     result = subprocess.run(command, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    MailQueue.invalidate()
     log = API.logger.warning if result.returncode else API.logger.info
     if result.stdout:
         log("Postsuper (out): "+result.stdout)
@@ -15,17 +15,18 @@ from services import Service
 from tools.config import Config
 from tools.license import getLicense, updateCertificate
 from tools.permissions import SystemAdminPermission, SystemAdminROPermission
-from tools.dnsHealth import getHostByName
+from tools.sampler import DashboardSampler
+from tools.dnsHealth import fullDNSChecks, getHostsByName
 from tools.misc import callUpdateScript
+from tools.profiler import Profiler
+from tools.tasq import TasQServer
 
 import json
-import os
-import psutil
 import requests
 import shlex
+import threading
 import time
 
-from datetime import datetime
 from flask import jsonify, make_response, request
 from io import StringIO
 
@@ -34,31 +35,14 @@ from io import StringIO
 @secure()
 def getDashboard():
     checkPermissions(SystemAdminROPermission())
-    disks = []
-    for disk in psutil.disk_partitions():
-        try:
-            usage = psutil.disk_usage(disk.mountpoint)
-            stat = {"percent": usage.percent, "total": usage.total, "used": usage.used, "free": usage.free}
-            stat["device"] = disk.device
-            stat["mountpoint"] = disk.mountpoint
-            stat["filesystem"] = disk.fstype
-            disks.append(stat)
-        except:
-            pass
-    cpu = psutil.cpu_times_percent()
-    cpuPercent = dict(user=cpu.user, system=cpu.system, io=cpu.iowait, interrupt=cpu.irq+cpu.softirq, steal=cpu.steal,
-                      idle=cpu.idle)
-    vm = psutil.virtual_memory()
-    memory = dict(percent=vm.percent, total=vm.total, used=vm.used, buffer=vm.buffers, cache=vm.cached, free=vm.free,
-                  available=vm.available)
-    sm = psutil.swap_memory()
-    swap = dict(percent=sm.percent, total=sm.total, used=sm.used, free=sm.free)
-    return jsonify(disks=disks,
-                   load=os.getloadavg(),
-                   cpuPercent=cpuPercent,
-                   memory=memory,
-                   swap=swap,
-                   booted=datetime.fromtimestamp(psutil.boot_time()).strftime("%Y-%m-%d %H:%M:%S"))
+    return jsonify(DashboardSampler.latest())
+
+
+@API.route(api.BaseRoute+"/system/dashboard/history", methods=["GET"])
+@secure()
+def getDashboardHistory():
+    checkPermissions(SystemAdminROPermission())
+    return jsonify(DashboardSampler.history(int(request.args.get("window", 3600)), int(request.args.get("points", 360))))
 
 
 @API.route(api.BaseRoute+"/system/dashboard/services", methods=["GET"])
@@ -105,11 +89,55 @@ def signalDashboardService(unit, action):
         return jsonify(message=msg or "Success"), 500 if msg else 201
 
 
+@API.route(api.BaseRoute+"/system/storage", methods=["GET"])
+@secure(requireDB=True)
+def getStorageUsage():
+    checkPermissions(SystemAdminROPermission())
+    from orm.domains import Domains
+    from orm.users import Users
+    from tools.diskusage import DiskUsage
+    summary = DiskUsage.loadSummary()
+    if summary is None or request.args.get("scan") == "true":
+        checkPermissions(SystemAdminPermission())
+        task = TasQServer.mktask.diskUsage(full=request.args.get("full") == "true", permission=SystemAdminROPermission())
+        timeout = float(request.args.get("timeout", 1))
+        if timeout > 0:
+            TasQServer.wait(task.ID, timeout)
+        if not task.done:
+            return jsonify(message="Created background task #"+str(task.ID), taskID=task.ID), 202
+        if task.state != task.COMPLETED:
+            return jsonify(message="Disk usage scan failed: "+task.message), 500
+        summary = DiskUsage.loadSummary()
+        if summary is None:
+            return jsonify(message="No disk usage data available"), 503
+    entries = {path.rstrip("/"): usage for partition in summary.values() for path, usage in partition["entries"].items()}
+    users = []
+    domainUsers = {}
+    for user in Users.query.filter(Users.maildir != "")\
+                           .with_entities(Users.ID, Users.username, Users.domainID, Users.maildir):
+        files, size = entries.get(user.maildir.rstrip("/"), (0, 0))
+        users.append(dict(ID=user.ID, username=user.username, domainID=user.domainID, files=files, size=size))
+        stat = domainUsers.setdefault(user.domainID, [0, 0])
+        stat[0] += files
+        stat[1] += size
+    domains = []
+    for domain in Domains.query.with_entities(Domains.ID, Domains.domainname, Domains.homedir):
+        files, size = entries.get(domain.homedir.rstrip("/"), (0, 0))
+        userFiles, userSize = domainUsers.get(domain.ID, (0, 0))
+        domains.append(dict(ID=domain.ID, domainname=domain.domainname, files=files, size=size,
+                            userFiles=userFiles, userSize=userSize))
+    users.sort(key=lambda user: user["size"], reverse=True)
+    limit = int(request.args.get("limit", 50))
+    partitions = {name: {key: value for key, value in partition.items() if key != "entries"}
+                  for name, partition in summary.items()}
+    return jsonify(partitions=partitions, domains=domains, users=users[:limit] if limit else users)
+
+
 def dumpLicense():
     License = getLicense()
     try:
         from orm.users import Users
-        currentUsers = Users.count()
+        currentUsers = Users.licenseCount()
     except:
         currentUsers = None
     return jsonify(product=License.product,
@@ -261,6 +289,97 @@ def cliOverRest():
     return jsonify(code=result, stdout=stdout.getvalue(), fs=cli.fs)
 
 
+_syncTopExpired = """
+local function expired(data, now, expUpd, expEnd)
+    local ok, value = pcall(cjson.decode, data)
+    if not ok or type(value) ~= "table" then
+        return nil
+    end
+    local ended, update = tonumber(value["ended"]) or 0, tonumber(value["update"]) or 0
+    return (ended ~= 0 and now-ended > expEnd) or now-update > expUpd
+end
+local now, expUpd, expEnd = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+"""
+# Returns the next cursor, field/value pairs of current entries and fields of expired entries
+_syncTopScript = _syncTopExpired+"""
+local scan = redis.call("HSCAN", KEYS[1], ARGV[4], "COUNT", ARGV[5])
+local entries, fresh, stale = scan[2], {}, {}
+for i = 1, #entries, 2 do
+    local state = expired(entries[i+1], now, expUpd, expEnd)
+    if state then
+        stale[#stale+1] = entries[i]
+    elseif state ~= nil then
+        fresh[#fresh+1] = entries[i]
+        fresh[#fresh+1] = entries[i+1]
+    end
+end
+return {scan[1], fresh, stale}
+"""
+# Removes the given fields if they are still expired, must not be run while the hash is being scanned
+_syncTopCleanupScript = _syncTopExpired+"""
+local removed = 0
+for i = 1, #ARGV-3 do
+    local field = ARGV[i+3]
+    if expired(redis.call("HGET", KEYS[1], field) or "", now, expUpd, expEnd) then
+        removed = removed+redis.call("HDEL", KEYS[1], field)
+    end
+end
+return removed
+"""
+_syncTopCache = {"time": 0, "data": []}
+_syncTopLock = threading.Lock()
+
+
+def _syncTopSnapshot(now):
+    """Get all non-expired grommunio-sync processes.
+
+    Expired entries are filtered inside redis, processing the hash in HSCAN
+    sized pages to avoid blocking the server. They are removed after the scan
+    has finished, as modifying the hash during the scan can cause entries to be
+    returned multiple times. The decoded result is cached for `sync.topCacheTime`
+    seconds.
+
+    Parameters
+    ----------
+    now : int
+        Current timestamp
+
+    Returns
+    -------
+    list
+        List of process information dicts
+    """
+    sync = Config["sync"]
+    with _syncTopLock:
+        if now-_syncTopCache["time"] < sync.get("topCacheTime", 2):
+            return _syncTopCache["data"]
+        args = (now, sync.get("topExpireUpdate", 120), sync.get("topExpireEnded", 20))
+        scanCount = sync.get("topScanCount", 1000)
+        keys = (sync.get("topdataKey", "grommunio-sync:topdata"),)
+        entries, stale = {}, set()
+        with Service("redis") as r:
+            r.set(sync.get("topTimestampKey", "grommunio-sync:topenabledat"), now)
+            script, cleanup = r.register_script(_syncTopScript), r.register_script(_syncTopCleanupScript)
+            cursor = 0
+            while True:
+                cursor, fresh, expired = script(keys=keys, args=(*args, cursor, scanCount))
+                entries.update(zip(fresh[::2], fresh[1::2]))  # Fields may be returned more than once
+                stale.update(expired)
+                if int(cursor) == 0:
+                    break
+            stale = list(stale)
+            for offset in range(0, len(stale), scanCount):
+                cleanup(keys=keys, args=(*args, *stale[offset:offset+scanCount]))
+        data = []
+        for entry in entries.values():
+            try:
+                data.append(json.loads(entry))
+            except Exception as err:
+                API.logger.warning(type(err).__name__+": "+str(err.args))
+        _syncTopCache["time"], _syncTopCache["data"] = now, data
+        return data
+
+
 @API.route(api.BaseRoute+"/system/sync/top", methods=["GET"])
 @secure()
 def syncTop():
@@ -271,26 +390,9 @@ def syncTop():
     fupd = int(request.args.get("filterUpdated", expUpd))
     fend = int(request.args.get("filterEnded", expEnd))
     now = int(time.mktime(time.localtime()))
-    with Service("redis") as r:
-        r.set(sync.get("topTimestampKey", "grommunio-sync:topenabledat"), now)
-        hdata = r.hgetall(sync.get("topdataKey", "grommunio-sync:topdata"))
-        if hdata is None:
-            return jsonify(data=[], maxUpdated=expUpd, maxEnded=expEnd)
-        data = []
-        remove = []
-        for key, value in hdata.items():
-            try:
-                value = json.loads(value)
-                if (value["ended"] != 0 and now-value["ended"] > expEnd) or \
-                   now-value["update"] > expUpd:
-                    remove.append(key)
-                elif not (value["ended"] != 0 and now-value["ended"] > fend or now-value["update"] > fupd):
-                    data.append(value)
-            except Exception as err:
-                API.logger.warning(type(err).__name__+": "+str(err.args))
-        if len(remove) > 0:
-            r.hdel(sync.get("topdataKey", "grommunio-sync:topdata"), *remove)
-    return jsonify(data=data)
+    data = [value for value in _syncTopSnapshot(now)
+            if not (value.get("ended", 0) != 0 and now-value["ended"] > fend or now-value.get("update", 0) > fupd)]
+    return jsonify(data=data, maxUpdated=expUpd, maxEnded=expEnd)
 
 
 @API.route(api.BaseRoute+"/system/servers", methods=["GET", "POST"])
@@ -322,12 +424,36 @@ def getServersDNSChecks():
     uniqueHostnames = [o.hostname for o in objects]
     uniqueExternalNames = set(o.extname for o in objects)
 
-    hostsDNSCheck = {hostname: getHostByName(hostname) for hostname in uniqueHostnames}
-    extDNSCheck = {extname: getHostByName(extname) for extname in uniqueExternalNames}
+    resolved = getHostsByName(set(uniqueHostnames) | uniqueExternalNames)
+    hostsDNSCheck = {hostname: resolved[hostname] for hostname in uniqueHostnames}
+    extDNSCheck = {extname: resolved[extname] for extname in uniqueExternalNames}
 
     return jsonify({"host": hostsDNSCheck, "ext": extDNSCheck})
 
 
+@API.route(api.BaseRoute+"/system/dnsCheck", methods=["GET"])
+@secure(requireDB=True)
+def checkDomainsDNS():
+    checkPermissions(SystemAdminROPermission())
+    if "domains" in request.args:
+        domains = [domain.strip() for domain in request.args["domains"].split(",") if domain.strip()]
+    else:
+        from orm.domains import Domains
+        domains = [domain.domainname for domain in Domains.query.with_entities(Domains.domainname)]
+    result, error = fullDNSChecks(domains)
+    if error is not None:
+        return jsonify(message=error), 500
+    return jsonify(data=result)
+
+
+@API.route(api.BaseRoute+"/system/profile", methods=["GET"])
+@secure()
+def getProfiles():
+    checkPermissions(SystemAdminPermission())
+    limit = request.args.get("limit")
+    return jsonify(data=Profiler.entries(int(limit) if limit is not None else None))
+
+
 @API.route(api.BaseRoute+"/system/updates/<string:command>", methods=["POST"])
 @secure()
 def checkForUpdates(command):
@@ -20,11 +20,20 @@ else:
     from api.core import API  # Export to uwsgi server
     from cli import Cli
     from endpoints import *  # Register all endpoints
-    from tools import config
+    from tools import config, syncpolicy
+    from tools.metrics import Metrics
     Cli.initLogging()
     error = config.validate()
     if error:
         raise TypeError("Invalid configuration found - aborting ({})".format(error))
+    Metrics.enable()
+    syncpolicy.checkDefault()
+    try:
+        import uwsgidecorators
+        from tools.sampler import DashboardSampler
+        uwsgidecorators.postfork(DashboardSampler.start)
+    except ImportError:
+        pass
     if not config.Config["tasq"].get("disabled", False):
         import uwsgi
         import uwsgidecorators
@@ -4,8 +4,10 @@
 
 __all__ = ["domains", "misc", "users", "ext"]
 
+import os
 import sqlalchemy
-from sqlalchemy import create_engine, event, select, text
+import threading
+from sqlalchemy import create_engine, event, inspect, select, text
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import scoped_session, sessionmaker, class_mapper, Query, column_property
 
@@ -16,6 +18,8 @@ else:
 
 
 from tools.config import Config
+from tools.metrics import instrumentEngine
+from tools.profiler import instrumentEngine as instrumentProfiler
 
 import logging
 logger = logging.getLogger("mysql")
@@ -25,9 +29,12 @@ class DBConn:
     def __init__(self, URI):
         import threading
         self.engine = create_engine(URI, pool_recycle=Config["DB"]["sessionTimout"])
+        instrumentEngine(self.engine)
+        instrumentProfiler(self.engine)
         self.session = scoped_session(sessionmaker(self.engine), threading.get_ident)
         self.__version = None
         self.__maxversion = 0
+        self.__columns = {}
         self.initVersion()
 
     def __reinit(self):
@@ -83,6 +90,7 @@ class DBConn:
 
     def initVersion(self):
         self.__version = self._fetchVersion(True)
+        self.__columns = {}
         self.__reinit()
 
     def requireReload(self):
@@ -132,6 +140,32 @@ class DBConn:
         version = self.__version or self.__maxversion
         return sign(v)*version >= v if self.__version or v >= 0 else False
 
+    def hasColumns(self, table, *columns):
+        """Check if a table contains all specified columns.
+
+        In contrast to `minVersion`, the check fails if the table cannot be inspected.
+        Results are cached until the schema version is reloaded.
+
+        Parameters
+        ----------
+        table : str
+            Name of the table
+        columns : str
+            Names of the columns
+
+        Returns
+        -------
+        bool
+            Whether all columns exist
+        """
+        if table not in self.__columns:
+            try:
+                self.__columns[table] = {column["name"] for column in inspect(self.engine).get_columns(table)}
+            except Exception as err:
+                logger.warning("Failed to inspect table '{}': {}".format(table, err))
+                self.__columns[table] = set()
+        return all(column in self.__columns[table] for column in columns)
+
 
 def _loadDBConfig():
     """Load database parameters from configuration.
@@ -233,6 +267,42 @@ def OptionalC(version, default, column):
         return column if DB.minVersion(version) else column_property(select([text(default)]).as_scalar())
 
 
+def flushedValues(obj, attrs, defaults={}, previous=False):
+    """Get current or previous attribute values of an object in a flush event handler.
+
+    Parameters
+    ----------
+    obj : DB.Base
+        Object to inspect
+    attrs : Iterable of str
+        Names of the attributes
+    defaults : dict, optional
+        Values to assume for attributes not set on new objects. The default is {}.
+    previous : bool, optional
+        Return the values before the flush instead of the new values. The default is False.
+
+    Returns
+    -------
+    list
+        Attribute values, or None if a value is not available without loading it from the database
+    """
+    state = inspect(obj)
+    values = []
+    for attr in attrs:
+        history = state.attrs[attr].history
+        if previous and history.deleted:
+            values.append(history.deleted[0])
+        elif not previous and history.added:
+            values.append(history.added[0])
+        elif history.unchanged:
+            values.append(history.unchanged[0])
+        elif state.session is not None and obj in state.session.new and attr in defaults:
+            values.append(defaults[attr])
+        else:
+            return None
+    return values
+
+
 class NotifyTable:
     """Helper class tracking inserts and deletes.
 
@@ -271,3 +341,189 @@ class NotifyTable:
         cls.__active = state
         if clear:
             cls.NTclear()
+
+
+class ValidationContext:
+    """Per-session cache of reference data used by attribute validators.
+
+    Validators can look up sets of existing values (e.g. domain names or server IDs)
+    instead of querying the database for each validated item.
+    Each set is loaded once with a single query and kept until a flush modifies the
+    underlying table or the transaction ends.
+    """
+    def __init__(self):
+        self.__data = {}
+
+    @classmethod
+    def get(cls, session=None):
+        """Get validation context of a session.
+
+        Parameters
+        ----------
+        session : sqlalchemy.orm.Session, optional
+            Session to get the context for. The default is the current session.
+
+        Returns
+        -------
+        ValidationContext
+            The session's validation context
+        """
+        info = (session or DB.session).info
+        if "validationContext" not in info:
+            info["validationContext"] = cls()
+        return info["validationContext"]
+
+    def lookup(self, table, key, loader):
+        """Get cached data, loading it if necessary.
+
+        Autoflush is disabled during loading, as validators may be called on partially
+        initialized objects.
+
+        Parameters
+        ----------
+        table : str
+            Name of the table the data is loaded from
+        key : Any
+            Additional key to distinguish data from the same table
+        loader : callable
+            Function returning the data
+
+        Returns
+        -------
+        Any
+            Data returned by `loader`
+        """
+        if (table, key) not in self.__data:
+            with DB.session.no_autoflush:
+                self.__data[(table, key)] = loader()
+        return self.__data[(table, key)]
+
+    def invalidate(self, *tables):
+        """Drop cached data of the given tables, or all data if no tables are specified."""
+        self.__data = {key: value for key, value in self.__data.items() if tables and key[0] not in tables}
+
+    @classmethod
+    def _flushed(cls, session, *args, **kwargs):
+        if "validationContext" in session.info:
+            tables = {obj.__table__.name for objs in (session.new, session.dirty, session.deleted) for obj in objs}
+            if tables:
+                session.info["validationContext"].invalidate(*tables)
+
+    @classmethod
+    def _reset(cls, session, *args, **kwargs):
+        session.info.pop("validationContext", None)
+
+    @classmethod
+    def register(cls):
+        """Register SQLAlchemy event handlers."""
+        event.listen(DB.session, "after_flush", cls._flushed)
+        event.listen(DB.session, "after_commit", cls._reset)
+        event.listen(DB.session, "after_rollback", cls._reset)
+
+
+class TableVersions:
+    """Shared change tokens of database tables.
+
+    Each table has a random token stored in redis, which is replaced whenever a
+    committed transaction modified the table. Tokens can be used to cheaply detect
+    whether data has changed since it was last retrieved, e.g. to generate ETags.
+    Modifications are collected from flushed objects and from bulk UPDATE, DELETE
+    and INSERT statements executed through the session. Statements executed
+    directly on a connection must be reported with `touch`.
+    """
+    KEY = "grommunio-admin:tableversions"
+
+    _pending = set()  # Changes that could not be published due to redis being unavailable
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _token():
+        return os.urandom(8).hex()
+
+    @staticmethod
+    def touch(*tables, session=None):
+        """Mark tables as changed in the current transaction.
+
+        Parameters
+        ----------
+        tables : str
+            Names of the modified tables
+        session : sqlalchemy.orm.Session, optional
+            Session the modifications were made in. The default is the current session.
+        """
+        (session or DB.session).info.setdefault("changedTables", set()).update(tables)
+
+    @classmethod
+    def _publish(cls, tables):
+        from services import Service
+        with cls._lock:
+            tables = set(tables) | cls._pending
+            cls._pending = tables
+        with Service("redis", errors=Service.SUPPRESS_ALL) as redis:
+            redis.hset(cls.KEY, mapping={table: cls._token() for table in tables})
+            with cls._lock:
+                cls._pending -= tables
+            return
+        logger.warning("Failed to publish table changes, conditional requests are disabled until redis is available")
+
+    @classmethod
+    def get(cls, *tables):
+        """Get current change tokens of tables.
+
+        Missing tokens are initialized.
+
+        Parameters
+        ----------
+        tables : str
+            Names of the tables
+
+        Returns
+        -------
+        list of str or None
+            Tokens of the tables, or None if tokens are currently not available
+        """
+        from services import Service
+        if cls._pending:
+            cls._publish(())
+            if cls._pending:
+                return None
+        with Service("redis", errors=Service.SUPPRESS_ALL) as redis:
+            tokens = redis.hmget(cls.KEY, tables)
+            missing = {table: cls._token() for table, token in zip(tables, tokens) if token is None}
+            if missing:
+                redis.hset(cls.KEY, mapping=missing)
+                tokens = [token or missing[table] for table, token in zip(tables, tokens)]
+            return tokens
+        return None
+
+    @classmethod
+    def _flushed(cls, session, *args, **kwargs):
+        tables = {obj.__table__.name for obj in session.new} | {obj.__table__.name for obj in session.deleted} |\
+                 {obj.__table__.name for obj in session.dirty if session.is_modified(obj)}
+        if tables:
+            cls.touch(*tables, session=session)
+
+    @classmethod
+    def _executed(cls, state):
+        table = getattr(state.statement, "table", None)
+        if getattr(state.statement, "is_dml", False) and table is not None:
+            cls.touch(table.name, session=state.session)
+
+    @classmethod
+    def _committed(cls, session, *args, **kwargs):
+        tables = session.info.pop("changedTables", None)
+        if tables:
+            cls._publish(tables)
+
+    @classmethod
+    def _rolledBack(cls, session, *args, **kwargs):
+        session.info.pop("changedTables", None)
+
+    @classmethod
+    def register(cls):
+        """Register SQLAlchemy event handlers."""
+        event.listen(DB.session, "after_flush", cls._flushed)
+        if sqlalchemy.__version__.split(".") >= ["1", "4"]:
+            event.listen(DB.session, "do_orm_execute", cls._executed)
+        event.listen(DB.session, "after_commit", cls._committed)
+        event.listen(DB.session, "after_rollback", cls._rolledBack)
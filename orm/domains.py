@@ -2,30 +2,44 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 # SPDX-FileCopyrightText: 2021 grommunio GmbH
 
-from . import DB, OptionalC, OptionalNC, NotifyTable
+from . import DB, OptionalC, OptionalNC, NotifyTable, Stub, TableVersions, flushedValues
 from tools import formats
 from tools.DataModel import DataModel, Id, Text, Int, Date, RefProp
 from tools.DataModel import InvalidAttributeError, MismatchROError, MissingRequiredAttributeError
+from tools.reload import ReloadScheduler
 from services import Service
 
 import idna
 import json
 
+from collections import Counter, defaultdict
+
 import sqlalchemy
-from sqlalchemy import Column, func, inspect, select, ForeignKey
+from sqlalchemy import Column, ForeignKey, bindparam, case, event, func, inspect, select
 from sqlalchemy.dialects.mysql import DATE, INTEGER, TEXT, TINYINT, VARCHAR
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import column_property, validates, relationship, selectinload
 from sqlalchemy.types import TypeDecorator
 
+# Stored counter columns are not part of every gromox schema, fall back to counting on read if any is missing
+storedCounters = DB.hasColumns("domains", "active_users", "inactive_users", "virtual_users") and \
+                  DB.hasColumns("orgs", "domain_count")
+
+
+def _counterColumn(name):
+    """Create stored counter column, or a stub if the database does not provide stored counters."""
+    return Column(name, INTEGER(10, unsigned=True), nullable=False, server_default="0") if storedCounters else Stub(None)
+
 
 class Orgs(DataModel, DB.Base):
     __tablename__ = "orgs"
+    _trackedLevel = 2  # All levels consist of database data only
 
     ID = Column("id", INTEGER(10, unsigned=True), unique=True, primary_key=True, nullable=False)
     name = Column("name", VARCHAR(32), nullable=False)
     description = Column("description", VARCHAR(128))
+    domainCount = _counterColumn("domain_count")
 
     domains = relationship("Domains", back_populates="org")
 
@@ -40,11 +54,41 @@ class Orgs(DataModel, DB.Base):
                 sync = {"synchronize_session": "fetch"}
                 Domains.query.filter(Domains.orgID == self.ID, Domains.ID.notin_(domains)).update({Domains.orgID: 0}, **sync)
                 Domains.query.filter(Domains.ID.in_(domains)).update({Domains.orgID: self.ID}, **sync)
+                Orgs.recountDomains()
             else:
                 domains = Domains.query.filter(Domains.ID.in_(domains))
                 for domain in domains:
                     domain.org = self
 
+    @staticmethod
+    def recountDomains(*orgIDs):
+        """Recompute domain counters from the domains table.
+
+        Parameters
+        ----------
+        orgIDs : int
+            IDs of the organizations to update. If omitted, all organizations are updated.
+
+        Returns
+        -------
+        int
+            Number of updated organizations
+        """
+        if not storedCounters:
+            return 0
+        counts = Domains.query.with_entities(Domains.orgID, func.count(Domains.ID)).group_by(Domains.orgID)
+        orgs = Orgs.query.with_entities(Orgs.ID)
+        if orgIDs:
+            counts = counts.filter(Domains.orgID.in_(orgIDs))
+            orgs = orgs.filter(Orgs.ID.in_(orgIDs))
+        counts = dict(counts.all())
+        rows = [{"_ID": ID, "_count": counts.get(ID, 0)} for ID, in orgs]
+        if rows:
+            table = Orgs.__table__
+            DB.session.execute(table.update().where(table.c.id == bindparam("_ID")).values(domain_count=bindparam("_count")),
+                               rows)
+        return len(rows)
+
     @validates("name")
     def validateName(self, key, value, *args):
         if Orgs.query.filter(Orgs.ID != self.ID, Orgs.name == value).count():
@@ -170,6 +214,7 @@ class Domains(DataModel, DB.Base, NotifyTable):
                     return None
 
     __tablename__ = "domains"
+    _trackedLevel = 1  # Higher verbosity levels include chat team data, which is not covered by TableVersions
 
     ID = Column("id", INTEGER(10, unsigned=True), unique=True, primary_key=True, nullable=False)
     orgID = Column("org_id", INTEGER(10, unsigned=True), ForeignKey(Orgs.ID), nullable=False, server_default="0", index=True)
@@ -185,6 +230,10 @@ class Domains(DataModel, DB.Base, NotifyTable):
     domainStatus = Column("domain_status", TINYINT, nullable=False, server_default="0")
     chatID = OptionalC(79, "NULL", Column("chat_id", VARCHAR(26)))
     _syncPolicy = OptionalC(77, "NULL", Column("sync_policy", TEXT))
+    # Materialized counters, maintained by `_updateCounters` and `recountUsers`
+    activeUsers = _counterColumn("active_users")
+    inactiveUsers = _counterColumn("inactive_users")
+    virtualUsers = _counterColumn("virtual_users")
 
     org = relationship(Orgs, back_populates="domains")
     homeserver = OptionalNC(105, None,
@@ -268,6 +317,7 @@ class Domains(DataModel, DB.Base, NotifyTable):
             raise ValueError("Cannot activate chat - please upgrade database schema to at least 79")
         if value and self.domainStatus:
             raise ValueError("Cannot activate chat for deactivated domain")
+        TableVersions.touch(self.__tablename__, Users.__tablename__)
         with Service("chat") as chat:
             if isinstance(value, str):
                 tmp = chat.getTeam(value)
@@ -286,34 +336,68 @@ class Domains(DataModel, DB.Base, NotifyTable):
     def displayname(self):
         return idna.decode(self._domainname)
 
-    @validates("_syncPolicy")
-    def triggerSyncPolicyUpdate(self, key, value, *args):
-        if value != self._syncPolicy:
-            users = ["grommunio-sync:policycache-"+user.username
-                     for user in Users.query.with_entities(Users.username).filter(Users.domainID == self.ID)]
-            if len(users) > 0:
-                with Service("redis", errors=Service.SUPPRESS_INOP) as r:
-                    r.delete(*users)
-        return value
-
     @staticmethod
     def checkCreateParams(data):
         if "maxUser" not in data:
             return "Missing required property maxUser"
 
-    def delete(self):
+    def setStatus(self, status):
+        """Set domain status and propagate it to all users of the domain.
+
+        Users are updated in bulk, so stored user counters are recomputed afterwards.
+
+        Parameters
+        ----------
+        status : int
+            New domain status
+        """
         from .users import Users
-        self.domainStatus = self.DELETED
+        self.domainStatus = status
         Users.query.filter(Users.domainID == self.ID)\
-                   .update({Users.addressStatus: Users.addressStatus.op("&")(0xF) + (self.DELETED << 4)},
+                   .update({Users.addressStatus: Users.addressStatus.op("&")(0xF) + (status << 4)},
                            synchronize_session=False)
+        Domains.recountUsers(self.ID)
+
+    def delete(self):
+        self.setStatus(self.DELETED)
 
     def recover(self):
-        from .users import Users
-        self.domainStatus = self.NORMAL
-        Users.query.filter(Users.domainID == self.ID)\
-                   .update({Users.addressStatus: Users.addressStatus.op("&")(0xF) + (self.NORMAL << 4)},
-                           synchronize_session=False)
+        self.setStatus(self.NORMAL)
+
+    @staticmethod
+    def recountUsers(*domainIDs):
+        """Recompute user counters from the users table.
+
+        Counters are normally updated on each flush. Recounting is only necessary after bulk updates
+        bypassing the ORM or to repair counters after external modifications.
+
+        Parameters
+        ----------
+        domainIDs : int
+            IDs of the domains to update. If omitted, all domains are updated.
+
+        Returns
+        -------
+        int
+            Number of updated domains
+        """
+        if not storedCounters:
+            return 0
+        counts = Users.query.with_entities(Users.domainID, *(func.sum(_case(condition)) for _, condition in _userCategories))\
+                            .group_by(Users.domainID)
+        domains = Domains.query.with_entities(Domains.ID)
+        if domainIDs:
+            counts = counts.filter(Users.domainID.in_(domainIDs))
+            domains = domains.filter(Domains.ID.in_(domainIDs))
+        counts = {row[0]: row[1:] for row in counts}
+        table = Domains.__table__
+        values = {Domains.__mapper__.columns[attr].name: bindparam("_"+attr) for attr, _ in _userCategories}
+        rows = [dict(_ID=ID, **{"_"+attr: int(count or 0)
+                                for (attr, _), count in zip(_userCategories, counts.get(ID, (0, 0, 0)))})
+                for ID, in domains]
+        if rows:
+            DB.session.execute(table.update().where(table.c.id == bindparam("_ID")).values(values), rows)
+        return len(rows)
 
     def purge(self, deleteFiles=False, printStatus=False):
         from .misc import DBConf
@@ -340,7 +424,9 @@ class Domains(DataModel, DB.Base, NotifyTable):
         Associations.query.filter(Associations.listID.in_(mlists.with_entities(MLists.ID))).delete(**nosync)
         mlists.delete(**nosync)
         Aliases.query.filter(Aliases.mainname.in_(users.with_entities(Users.username))).delete(**nosync)
+        SyncPolicyCache.invalidate(*(username for username, in users.with_entities(Users.username)))
         users.delete(**nosync)
+        LicenseCounter.invalidate()
         permissions = ARPR.query.filter(ARPR.permission == "DomainAdmin", ARPR._params == self.ID)
         roles = []
         for permission in permissions:
@@ -404,61 +490,100 @@ class Domains(DataModel, DB.Base, NotifyTable):
         if self.homeserverID and value != self.homeserverID and Config["options"].get("serverExplicitMount"):
             raise ValueError("Cannot change homeserver with explicitly mounted home-directories")
         from .misc import Servers
-        if value and Servers.query.filter(Servers.ID == value).count() == 0:
+        if value and not Servers.exists(value):
             raise ValueError("Invalid homeserver")
         return value or 0
 
     @classmethod
     def _commit(cls, *args, **kwargs):
-        with Service("systemd", errors=Service.SUPPRESS_ALL) as sysd:
-            sysd.reloadService("gromox-delivery.service", "gromox-delivery-queue.service",
-                               "gromox-http.service")
+        ReloadScheduler.request("gromox-delivery.service", "gromox-delivery-queue.service", "gromox-http.service")
 
 
-from .users import Users
+from .users import LicenseCounter, SyncPolicyCache, Users
 from . import misc
 
+# User counter categories, matching `_userCategory`
+_userCategories = (("activeUsers", (Users.addressStatus == Users.NORMAL) & (Users.maildir != "")),
+                   ("inactiveUsers", (Users.addressStatus != Users.NORMAL) & (Users.addressStatus != Users.SHARED) &
+                                     (Users.maildir != "")),
+                   ("virtualUsers", (Users.addressStatus == Users.SHARED) | (Users.maildir == "")))
+
+
+def _userCategory(addressStatus, maildir):
+    if addressStatus == Users.SHARED or not maildir:
+        return "virtualUsers"
+    return "activeUsers" if addressStatus == Users.NORMAL else "inactiveUsers"
+
+
 if sqlalchemy.__version__.split(".") >= ["1", "4"]:
-    inspect(Domains).add_property("activeUsers",
-                                  column_property(select(func.count(Users.ID))
-                                                  .where(Users.domainID == Domains.ID, Users.addressStatus == Users.NORMAL,
-                                                         Users.maildir != "")
-                                                  .scalar_subquery()))
-    inspect(Domains).add_property("inactiveUsers",
-                                  column_property(select(func.count(Users.ID))
-                                                  .where(Users.domainID == Domains.ID,
-                                                         Users.addressStatus.not_in((Users.NORMAL, Users.SHARED)),
-                                                         Users.maildir != "")
-                                                  .scalar_subquery()))
-    inspect(Domains).add_property("virtualUsers",
-                                  column_property(select(func.count(Users.ID))
-                                                  .where(Users.domainID == Domains.ID, (Users.addressStatus == Users.SHARED) |
-                                                         (Users.maildir == ""))
-                                                  .scalar_subquery()))
-    inspect(Orgs).add_property("domainCount",
-                               column_property(select(func.count(Domains.ID))
-                                               .where(Domains.orgID == Orgs.ID)
-                                               .scalar_subquery()))
+    def _case(condition):
+        return case((condition, 1), else_=0)
+
+    def _count(column, condition):
+        return column_property(select(func.count(column)).where(condition).scalar_subquery())
 else:
-    inspect(Domains).add_property("activeUsers",
-                                  column_property(select([func.count(Users.ID)])
-                                                  .where((Users.domainID == Domains.ID) &
-                                                         (Users.addressStatus == Users.NORMAL) & (Users.maildir != ""))
-                                                  .as_scalar()))
-    inspect(Domains).add_property("inactiveUsers",
-                                  column_property(select([func.count(Users.ID)])
-                                                  .where((Users.domainID == Domains.ID) &
-                                                         (Users.addressStatus != Users.NORMAL) &
-                                                         (Users.addressStatus != Users.SHARED) & (Users.maildir != ""))
-                                                  .as_scalar()))
-    inspect(Domains).add_property("virtualUsers",
-                                  column_property(select([func.count(Users.ID)])
-                                                  .where((Users.domainID == Domains.ID) &
-                                                         ((Users.addressStatus == Users.SHARED) | (Users.maildir == "")))
-                                                  .as_scalar()))
-    inspect(Orgs).add_property("domainCount",
-                               column_property(select([func.count(Domains.ID)])
-                                               .where(Domains.orgID == Orgs.ID)
-                                               .as_scalar()))
+    def _case(condition):
+        return case([(condition, 1)], else_=0)
+
+    def _count(column, condition):
+        return column_property(select([func.count(column)]).where(condition).as_scalar())
+
+if not storedCounters:
+    for attr, condition in _userCategories:
+        inspect(Domains).add_property(attr, _count(Users.ID, (Users.domainID == Domains.ID) & (condition)))
+    inspect(Orgs).add_property("domainCount", _count(Domains.ID, Domains.orgID == Orgs.ID))
+
+
+def _updateCounters(session, *args, **kwargs):
+    """Apply changes of users and domains flushed to the database to the stored counters.
+
+    Counters are updated in the same transaction. Objects whose previous state
+    is unknown trigger a recount of the affected domains instead.
+    """
+    userAttrs, userDefaults = ("domainID", "addressStatus", "maildir"), {"addressStatus": 0, "maildir": ""}
+    domainDeltas, orgDeltas = defaultdict(Counter), Counter()
+    recount = set()
+
+    def userChange(user, sign, previous=False):
+        values = flushedValues(user, userAttrs, userDefaults, previous)
+        if values is None:
+            recount.add(user.domainID)
+        else:
+            domainDeltas[values[0]][_userCategory(*values[1:])] += sign
+
+    for obj in session.new:
+        if isinstance(obj, Users):
+            userChange(obj, 1)
+        elif isinstance(obj, Domains):
+            orgDeltas[obj.orgID or 0] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Users):
+            userChange(obj, -1, True)
+        elif isinstance(obj, Domains):
+            orgDeltas[(flushedValues(obj, ("orgID",), {}, True) or (obj.orgID,))[0]] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Users) and any(inspect(obj).attrs[attr].history.has_changes() for attr in userAttrs):
+            userChange(obj, -1, True)
+            userChange(obj, 1)
+        elif isinstance(obj, Domains) and inspect(obj).attrs.orgID.history.has_changes():
+            orgDeltas[(flushedValues(obj, ("orgID",), {}, True) or (0,))[0]] -= 1
+            orgDeltas[obj.orgID] += 1
+    connection = session.connection()
+    for table, key, deltas in ((Domains, Domains.ID, domainDeltas.items()),
+                               (Orgs, Orgs.ID, ((ID, {"domainCount": delta}) for ID, delta in orgDeltas.items()))):
+        for ID, delta in deltas:
+            delta = {attr: value for attr, value in delta.items() if value}
+            if ID and ID not in recount and delta:
+                columns = table.__mapper__.columns
+                connection.execute(table.__table__.update().where(key == ID)
+                                   .values({columns[attr].name: columns[attr]+value for attr, value in delta.items()}))
+                TableVersions.touch(table.__tablename__, session=session)
+    recount.discard(None)
+    if recount:
+        Domains.recountUsers(*recount)
+
+
+if storedCounters:
+    event.listen(DB.session, "after_flush", _updateCounters)
 
 Domains.NTregister()
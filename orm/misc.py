@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 # SPDX-FileCopyrightText: 2020 grommunio GmbH
 
-from . import DB, logger
+from . import DB, ValidationContext, logger
 
 from tools.DataModel import DataModel, Id, Date, Int, Text
 from tools.misc import RecursiveDict
@@ -145,6 +145,7 @@ class TasQ(DataModel, DB.Base):
 
 class Servers(DataModel, DB.Base):
     __tablename__ = "servers"
+    _trackedLevel = 2  # All levels consist of database data only
 
     ID = Column("id", TINYINT(unsigned=True), primary_key=True)
     hostname = Column("hostname", VARCHAR(255), nullable=False, unique=True)
@@ -183,6 +184,25 @@ class Servers(DataModel, DB.Base):
         else:
             return select([func.count(Domains.ID)]).where(Domains.homeserverID == cls.ID).as_scalar()
 
+    @staticmethod
+    def exists(serverID):
+        """Check if a server exists.
+
+        Server IDs are cached in the session's validation context.
+
+        Parameters
+        ----------
+        serverID : int
+            ID of the server
+
+        Returns
+        -------
+        bool
+            Whether the server exists
+        """
+        return serverID in ValidationContext.get().lookup("servers", None,
+                                                          lambda: {ID for ID, in Servers.query.with_entities(Servers.ID)})
+
     @staticmethod
     def _getServer(objID, serverID=None, domain=False):
         """Select a server for an object
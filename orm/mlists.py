@@ -44,6 +44,7 @@ class Specifieds(DataModel, DB.Base):
 
 class MLists(DataModel, DB.Base):
     __tablename__ = "mlists"
+    _trackedLevel = 1  # Higher verbosity levels include properties of the list user
 
     ID = Column("id", INTEGER(10, unsigned=True), nullable=False, primary_key=True)
     listname = Column("listname", VARCHAR(128), ForeignKey(Users.username), nullable=False, unique=True)
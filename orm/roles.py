@@ -15,6 +15,7 @@ from . import DB
 
 class AdminRoles(DataModel, DB.Base):
     __tablename__ = "admin_roles"
+    _trackedLevel = 2  # All levels consist of database data only
 
     ID = Column("id", INTEGER(10, unsigned=True), unique=True, primary_key=True)
     name = Column("name", VARCHAR(32), unique=True, nullable=False)
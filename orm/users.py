@@ -2,12 +2,13 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 # SPDX-FileCopyrightText: 2020-2021 grommunio GmbH
 
-from . import DB, OptionalC, OptionalNC, NotifyTable, logger
+from . import DB, OptionalC, OptionalNC, NotifyTable, TableVersions, ValidationContext, flushedValues, logger
 from services import Service
-from tools import formats
+from tools import formats, passwords, syncpolicy
 from tools.constants import PropTags, PropTypes
 from tools.DataModel import DataModel, Id, Text, Int, BoolP, RefProp, Bool, Date
 from tools.DataModel import InvalidAttributeError, MismatchROError, MissingRequiredAttributeError
+from tools.reload import ReloadScheduler
 from tools.rop import nxTime
 
 from sqlalchemy import Column, ForeignKey, event, func, inspect, select
@@ -16,14 +17,9 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import column_property, relationship, selectinload, validates
 
-try:
-    # python 3.13
-    import legacycrypt as crypt
-except ImportError:
-    import crypt as crypt
-
 import json
-import sys
+import threading
+import time
 
 from datetime import datetime
 
@@ -134,6 +130,7 @@ class Users(DataModel, DB.Base, NotifyTable):
                     for tag, prop in self.__struct.items()}
 
     __tablename__ = "users"
+    _trackedLevel = 1  # Higher verbosity levels include exmdb store properties, which are not covered by TableVersions
 
     ID = Column("id", INTEGER(10, unsigned=True), nullable=False, primary_key=True, unique=True)
     username = Column("username", VARCHAR(320, charset="ascii"), nullable=False, unique=True)
@@ -244,7 +241,7 @@ class Users(DataModel, DB.Base, NotifyTable):
         from tools.license import getLicense
         if "username" not in data:
             return "Missing username"
-        if maildir and data.get("status", Users.NORMAL) == Users.NORMAL and Users.count() >= getLicense().users:
+        if maildir and data.get("status", Users.NORMAL) == Users.NORMAL and Users.licenseCount() >= getLicense().users:
             return "License user limit exceeded"
         if "domainID" in data:
             domain = Domains.query.filter(Domains.ID == data.get("domainID")).first()
@@ -280,12 +277,13 @@ class Users(DataModel, DB.Base, NotifyTable):
         if props is None:
             return
         status = props.pop("domainStatus") << 4
-        # Cache domainnames in the same organization to enforce valid aliases
-        # Necessary because retrieving domainnames causes the partially created user to be flushed, resulting in DB errors
-        self.orgDomains = {d._domainname for d in Domains.query.filter(Domains.orgID == props["domain"].orgID)
-                                                               .with_entities(Domains._domainname)}
+        # Resolve domainnames in the same organization to enforce valid aliases
+        # Necessary because the orgID column property is not available before the user is flushed
+        self.orgDomains = Users._orgDomains(props["domain"].orgID)
         self.fromdict(props, *args, **kwargs)
         self.addressStatus = (self.addressStatus or 0) | status
+        if self.maildir is None:
+            self.maildir = ""  # Set explicitly, so the value is known to flush handlers
 
     def fromdict(self, patches, syncStore=True, *args, **kwargs):
         isContact = patches.get("status", self.status) == Users.CONTACT
@@ -366,15 +364,26 @@ class Users(DataModel, DB.Base, NotifyTable):
 
     @password.setter
     def password(self, pw):
-        # On OpenBSD only blowfish is supported
-        if sys.platform.startswith("openbsd"):
-            _method = crypt.METHOD_BLOWFISH
-        else:
-            _method = crypt.METHOD_SHA512
-        self._password = crypt.crypt(pw, crypt.mksalt(_method))
+        self._password = passwords.hashPassword(pw)
 
     def chkPw(self, pw):
-        return crypt.crypt(pw, self.password) == self.password
+        return passwords.checkPassword(pw, self.password)
+
+    @staticmethod
+    def setPasswords(users, pws):
+        """Set passwords of multiple users.
+
+        Passwords are hashed in parallel.
+
+        Parameters
+        ----------
+        users : Iterable of Users
+            Users to update
+        pws : Iterable of str
+            New passwords, in the same order as the users
+        """
+        for user, hashed in zip(users, passwords.hashPasswords(pws)):
+            user._password = hashed
 
     @property
     def propmap_id(self):
@@ -563,7 +572,7 @@ class Users(DataModel, DB.Base, NotifyTable):
     @status.setter
     def status(self, val):
         from tools.license import getLicense
-        if self.status and not val and Users.count() >= getLicense().users:
+        if self.status and not val and Users.licenseCount() >= getLicense().users:
             raise ValueError("License user limit exceeded")
         self.addressStatus = ((self.addressStatus or 0) & ~self.USER_MASK) | (val & self.USER_MASK)
 
@@ -613,6 +622,7 @@ class Users(DataModel, DB.Base, NotifyTable):
                 self.chatID = value
                 self._chatUser = tmp
                 return
+            TableVersions.touch(self.__tablename__)
             if self._chatUser:
                 tmp = chat.activateUser(self, value)
                 if tmp:
@@ -638,6 +648,7 @@ class Users(DataModel, DB.Base, NotifyTable):
             tmpRoles = " ".join(self._chatUser["roles"].split(" ")+["system_admin"])
         else:
             tmpRoles = " ".join(role for role in self._chatUser["roles"].split(" ") if role != "system_admin")
+        TableVersions.touch(self.__tablename__)
         with Service("chat") as chat:
             tmp = chat.setUserRoles(self.chatID, tmpRoles)
         if tmp is None:
@@ -646,19 +657,18 @@ class Users(DataModel, DB.Base, NotifyTable):
 
     @validates("aliases")
     def checkAlias(self, key, value, *args):
-        domains = getattr(self, "orgDomains", None) or\
-                  [d._domainname for d in Domains.query.with_entities(Domains._domainname).filter(Domains.orgID == self.orgID)]
-        domains = [domain.lower() for domain in domains]
+        domains = getattr(self, "orgDomains", None) or Users._orgDomains(self.orgID)
         if not value.aliasname.lower().split('@')[1] in domains:
             raise ValueError(f"Cannot use alias from foreign domain: {value.aliasname.lower()}")
         return value
 
-    @validates("_syncPolicy")
-    def triggerSyncPolicyUpdate(self, key, value, *args):
-        if value != self._syncPolicy:
-            with Service("redis", errors=Service.SUPPRESS_INOP) as r:
-                r.delete("grommunio-sync:policycache-"+self.username)
-        return value
+    @staticmethod
+    def _orgDomains(orgID):
+        """Get lower case names of all domains in an organization."""
+        def load():
+            return {name.lower() for name, in Domains.query.filter(Domains.orgID == orgID).with_entities(Domains._domainname)}
+
+        return ValidationContext.get().lookup("domains", orgID, load)
 
     @validates("homeserverID")
     def checkHomeserver(self, key, value, *args):
@@ -666,7 +676,7 @@ class Users(DataModel, DB.Base, NotifyTable):
         if self.homeserverID and value != self.homeserverID and Config["options"].get("serverExplicitMount"):
             raise ValueError("Cannot change homeserver with explicitly mounted home-directories")
         from .misc import Servers
-        if value and Servers.query.filter(Servers.ID == value).count() == 0:
+        if value and not Servers.exists(value):
             raise ValueError("Invalid homeserver")
         return value or 0
 
@@ -690,6 +700,20 @@ class Users(DataModel, DB.Base, NotifyTable):
                           .filter(Users.ID != 0, Users.maildir != "", Users.status == Users.NORMAL, *filters)\
                           .count()
 
+    @staticmethod
+    def licenseCount():
+        """Get number of users counting towards the license limit.
+
+        Equivalent to `Users.count()` without filters, but served from a cache that
+        is kept up to date by flush and commit events.
+
+        Returns
+        -------
+        int
+            Number of users
+        """
+        return LicenseCounter.get()
+
     def delete(self, deleteChatUser=True):
         """Delete user from database.
 
@@ -789,12 +813,11 @@ class Users(DataModel, DB.Base, NotifyTable):
 
     @classmethod
     def _commit(*args, **kwargs):
-        with Service("systemd", errors=Service.SUPPRESS_ALL) as sysd:
-            sysd.reloadService("gromox-http.service", "gromox-zcore.service")
+        ReloadScheduler.request("gromox-http.service", "gromox-zcore.service")
 
     @validates("username")
     def validateUsername(self, key, value, *args):
-        if not self.username == value and Altnames.query.filter(Altnames.altname == value).count():
+        if not self.username == value and Altnames.exists(value):
             raise ValueError("Username is already used as alternative name")
         return value
 
@@ -933,8 +956,7 @@ class Aliases(DataModel, DB.Base, NotifyTable):
 
     @classmethod
     def _commit(*args, **kwargs):
-        with Service("systemd", errors=Service.SUPPRESS_ALL) as sysd:
-            sysd.reloadService("gromox-delivery.service", "gromox-http.service", "gromox-zcore.service")
+        ReloadScheduler.request("gromox-delivery.service", "gromox-http.service", "gromox-zcore.service")
 
 
 class Altnames(DataModel, DB.Base):
@@ -952,6 +974,32 @@ class Altnames(DataModel, DB.Base):
 
     _dictmapping_ = ((Text("altname", flags="patch"), Int("magic"),),)
 
+    @staticmethod
+    def exists(altname):
+        """Check if an alternative name is in use.
+
+        Each name is looked up with a single indexed query, results are cached in the session's validation context.
+        Pending objects are checked as well.
+
+        Parameters
+        ----------
+        altname : str
+            Name to check (case insensitive)
+
+        Returns
+        -------
+        bool
+            Whether the name is in use
+        """
+        altname = altname.lower()
+        known = ValidationContext.get().lookup("altnames", None, dict)
+        if altname not in known:
+            with DB.session.no_autoflush:
+                known[altname] = Altnames.query.with_entities(Altnames.altname)\
+                                               .filter(Altnames.altname == altname).first() is not None
+        return known[altname] or any(isinstance(obj, Altnames) and (obj.altname or "").lower() == altname
+                                          for obj in DB.session.new)
+
 
 class Fetchmail(DataModel, DB.Base):
     __tablename__ = "fetchmail"
@@ -1110,12 +1158,153 @@ class Forwards(DataModel, DB.Base):
         return value
 
 
+class LicenseCounter:
+    """Cached number of users counting towards the license limit.
+
+    The count is loaded from the database on first use and re-verified every
+    `options.licenseCountInterval` seconds, picking up changes made by other processes.
+    Changes made by this process are tracked per session on flush and applied to the
+    cached value on commit.
+    """
+    _lock = threading.Lock()
+    _value = None
+    _loaded = 0
+
+    @staticmethod
+    def _counts(values):
+        return values is not None and values[0] != 0 and bool(values[1]) and values[2] & Users.USER_MASK == Users.NORMAL
+
+    @classmethod
+    def get(cls):
+        """Get current user count, including uncommitted changes of the current session."""
+        from tools.config import Config
+        info = DB.session.info
+        with cls._lock:
+            if cls._value is None or time.monotonic()-cls._loaded >= Config["options"].get("licenseCountInterval", 60):
+                count = Users.count()  # Includes (and flushes) changes of the current session
+                cls._value, cls._loaded = count-info.get("licenseCountDelta", 0), time.monotonic()
+            return cls._value+info.get("licenseCountDelta", 0)
+
+    @classmethod
+    def invalidate(cls):
+        """Force reload of the user count after the current transaction."""
+        DB.session.info["licenseCountStale"] = True
+
+    @classmethod
+    def _flushed(cls, session, *args, **kwargs):
+        attrs, defaults = ("ID", "maildir", "addressStatus"), {"maildir": "", "addressStatus": 0}
+        delta = 0
+        for obj in session.new:
+            if isinstance(obj, Users):
+                delta += cls._counts(flushedValues(obj, attrs, defaults))
+        for obj in session.deleted:
+            if isinstance(obj, Users):
+                previous = flushedValues(obj, attrs, previous=True)
+                if previous is None:
+                    session.info["licenseCountStale"] = True
+                delta -= cls._counts(previous)
+        for obj in session.dirty:
+            if isinstance(obj, Users) and any(inspect(obj).attrs[attr].history.has_changes() for attr in attrs):
+                previous, current = flushedValues(obj, attrs, previous=True), flushedValues(obj, attrs)
+                if previous is None or current is None:
+                    session.info["licenseCountStale"] = True
+                delta += cls._counts(current)-cls._counts(previous)
+        if delta:
+            session.info["licenseCountDelta"] = session.info.get("licenseCountDelta", 0)+delta
+
+    @classmethod
+    def _committed(cls, session, *args, **kwargs):
+        delta = session.info.pop("licenseCountDelta", 0)
+        with cls._lock:
+            if session.info.pop("licenseCountStale", False):
+                cls._value = None
+            elif cls._value is not None:
+                cls._value += delta
+
+    @classmethod
+    def _rolledBack(cls, session, *args, **kwargs):
+        session.info.pop("licenseCountDelta", None)
+        session.info.pop("licenseCountStale", None)
+
+    @classmethod
+    def register(cls):
+        """Register SQLAlchemy event handlers."""
+        event.listen(DB.session, "after_flush", cls._flushed)
+        event.listen(DB.session, "after_commit", cls._committed)
+        event.listen(DB.session, "after_rollback", cls._rolledBack)
+
+
+class SyncPolicyCache:
+    """Invalidate cached sync policies of users modified in a transaction.
+
+    Affected users are collected on each flush, their cached policies are only removed
+    after the commit, so that concurrent requests cannot cache the previous policy again.
+    """
+    _userAttrs = ("username", "domainID", "_syncPolicy")
+    _domainAttrs = ("domainStatus", "_syncPolicy")
+
+    @staticmethod
+    def invalidate(*usernames):
+        """Remove cached policies of the users after the current transaction."""
+        DB.session.info.setdefault("syncPolicyUsers", set()).update(usernames)
+
+    @staticmethod
+    def _usernames(obj):
+        return set(inspect(obj).attrs["username"].history.sum()) or {obj.username}
+
+    @classmethod
+    def _flushed(cls, session, *args, **kwargs):
+        usernames, domains = set(), set()
+        for obj in session.new:
+            if isinstance(obj, Users):
+                usernames |= cls._usernames(obj)
+        for obj in session.deleted:
+            if isinstance(obj, Users):
+                usernames |= cls._usernames(obj)
+            elif isinstance(obj, Domains):
+                domains.add(obj.ID)
+        for obj in session.dirty:
+            if isinstance(obj, (Users, Domains)):
+                state = inspect(obj)
+                if isinstance(obj, Users) and any(state.attrs[attr].history.has_changes() for attr in cls._userAttrs):
+                    usernames |= cls._usernames(obj)
+                elif isinstance(obj, Domains) and any(state.attrs[attr].history.has_changes() for attr in cls._domainAttrs):
+                    domains.add(obj.ID)
+        if domains:
+            with session.no_autoflush:
+                usernames.update(username for username, in session.query(Users.username)
+                                                                  .filter(Users.domainID.in_(domains)))
+        if usernames:
+            session.info.setdefault("syncPolicyUsers", set()).update(usernames)
+
+    @classmethod
+    def _committed(cls, session, *args, **kwargs):
+        usernames = session.info.pop("syncPolicyUsers", None)
+        if usernames:
+            syncpolicy.invalidate(usernames)
+
+    @classmethod
+    def _rolledBack(cls, session, *args, **kwargs):
+        session.info.pop("syncPolicyUsers", None)
+
+    @classmethod
+    def register(cls):
+        """Register SQLAlchemy event handlers."""
+        event.listen(DB.session, "after_flush", cls._flushed)
+        event.listen(DB.session, "after_commit", cls._committed)
+        event.listen(DB.session, "after_rollback", cls._rolledBack)
+
+
 from .domains import Domains
 from . import misc, mlists, roles
 
 
 Users.NTregister()
 Aliases.NTregister()
+ValidationContext.register()
+LicenseCounter.register()
+SyncPolicyCache.register()
+TableVersions.register()
 
 if sqlalchemy.__version__.split(".") >= ["1", "4"]:
     inspect(Users).add_property("orgID", column_property(select(Domains.orgID)
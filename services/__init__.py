@@ -109,11 +109,25 @@ class ServiceHub(metaclass=_ServiceHubMeta):
         def _checkArgs(self):
             return self._service.checkArgs(*self._args)
 
+        def close(self):
+            """Release resources held by the current manager.
+
+            Managers can define a `close` method, which is called before the manager is replaced or discarded.
+            """
+            manager, self.manager = self.manager, None
+            if manager is not None and hasattr(manager, "close"):
+                try:
+                    manager.close()
+                except Exception as err:
+                    self.logger.warning("Failed to close service: "+" - ".join(str(arg) for arg in err.args))
+
         def disable(self):
             self.state = ServiceHub.DISABLED
             self.exc = ServiceDisabledError("Service disabled manually")
 
         def failed(self, newstate, exception):
+            from tools.metrics import serviceFailures
+            serviceFailures.inc(service=self._service._name)
             self._failures += 1
             self.exc = exception
             if self._service._maxfailures is not None and self._failures > self._service._maxfailures:
@@ -130,6 +144,7 @@ class ServiceHub(metaclass=_ServiceHubMeta):
                time()-self._lastreload < self._service._reloadlocktime) and not force_reload:
                 return
             self._reloads += 1
+            self.close()
             try:
                 self._checkArgs()
                 self.manager = self._service.mgrclass(*self._args)
@@ -187,7 +202,13 @@ class ServiceHub(metaclass=_ServiceHubMeta):
         def state(self, value):
             newstate = value if ServiceHub.UNINITIALIZED <= value <= ServiceHub.DISABLED else ServiceHub.ERROR
             if newstate != self._state:
+                from tools.metrics import serviceState, serviceTransitions
                 self.logger.debug("State changed {} -> {}".format(self.statename, ServiceHub.statename(newstate)))
+                serviceTransitions.inc(service=self._service._name, **{"from": self.statename,
+                                                                         "to": ServiceHub.statename(newstate)})
+                if self._state != ServiceHub.UNINITIALIZED:
+                    serviceState.inc(-1, service=self._service._name, state=self.statename)
+                serviceState.inc(1, service=self._service._name, state=ServiceHub.statename(newstate))
             self._state = newstate
 
         @property
@@ -249,6 +270,9 @@ class ServiceHub(metaclass=_ServiceHubMeta):
         args = cls._services[service].checkArgs(*args)
         instanceKey = (service, *args)
         if force_reload or instanceKey not in cls._instances:
+            old = cls._instances.get(instanceKey)
+            if old is not None and (not args or old is not cls._instances.get((service,))):  # Keep shared default instance
+                old.close()
             try:
                 cls._instances[instanceKey] = cls.ServiceInstance(cls._services[service], *args)
             except InstanceDefault:
@@ -4,6 +4,8 @@
 
 from . import ServiceHub
 
+import threading
+
 
 def exmdbHandleException(service, error):
     if isinstance(error, ExmdbService.ConnectionError):
@@ -14,7 +16,9 @@ def exmdbHandleException(service, error):
 class ExmdbService:
     class _BoundClient:
         def __init__(self, exmdb, host, port, homedir, isPrivate):
+            self.__exmdb = exmdb
             self.__homedir = homedir
+            self.__store = (host, port, homedir)
             self.__client = exmdb.ExmdbQueries(host, port, homedir, isPrivate)
 
         def __getattr__(self, attr):
@@ -23,10 +27,43 @@ class ExmdbService:
                 return lambda *args, **kwargs: target(self.__homedir, *args, **kwargs)
             return target
 
+        @property
+        def homedir(self):
+            return self.__homedir
+
+        def namedPropIDs(self, names):
+            """Resolve named properties, creating them if necessary.
+
+            Property IDs of a store never change once assigned, so resolved IDs are cached for the lifetime of the process.
+
+            Parameters
+            ----------
+            names : Iterable of (str, str)
+                Tuples of property set GUID name (see `GUID`) and property name
+
+            Returns
+            -------
+            list of int
+                Property IDs (0 if the property could not be resolved)
+            """
+            names = list(names)
+            cache, resolved = ExmdbService._namedProps, {}
+            missing = [name for name in names if (self.__store, name) not in cache]
+            if missing:
+                exmdb = self.__exmdb
+                propIDs = self.resolveNamedProperties(True, [exmdb.PropertyName(getattr(exmdb.GUID, guid), name)
+                                                             for guid, name in missing])
+                resolved = dict(zip(missing, propIDs))
+                with ExmdbService._namedPropsLock:
+                    cache.update({(self.__store, name): propID for name, propID in resolved.items() if propID})
+            return [cache.get((self.__store, name)) or resolved.get(name, 0) for name in names]
+
     __loaded = False
     __symbols = ("ConnectionError", "ExmdbError", "ExmdbProtocolError", "SerializationError", "ExmdbQueries", "Folder",
                  "GUID", "PropertyName", "Restriction")
     __methods = ("TaggedPropval", "FolderList", "FolderMemberList")
+    _namedProps = {}  # ((host, port, homedir), (GUID name, property name)) -> property ID
+    _namedPropsLock = threading.Lock()
 
     def __init__(self):
         self._loadPyexmdb()
@@ -4,19 +4,53 @@
 
 from . import ServiceHub
 
-from redis import Redis
+import inspect
+import logging
+
+from redis import BlockingConnectionPool, Redis
+from redis.connection import Connection, SSLConnection, UnixDomainSocketConnection
 from redis.exceptions import RedisError
 
+logger = logging.getLogger("redis")
+
 
 def handleRedisExceptions(service, error):
     if isinstance(error, RedisError):
         return ServiceHub.UNAVAILABLE
 
 
+def _connectionArgs(connectionClass):
+    """Get names of the keyword arguments accepted by a connection class."""
+    names = set()
+    for cls in connectionClass.__mro__[:-1]:
+        init = cls.__dict__.get("__init__")
+        if init is not None:
+            names.update(name for name, param in inspect.signature(init).parameters.items()
+                         if param.kind in (param.POSITIONAL_OR_KEYWORD, param.KEYWORD_ONLY))
+    names.discard("self")
+    return names
+
+
 @ServiceHub.register("redis", handleRedisExceptions, maxfailures=5)
 class RedisService(Redis):
     def __init__(self):
         from tools.config import Config
-        conf = Config["sync"].get("connection", {})
+        conf = dict(Config["sync"].get("connection", {}))
+        pool = Config["sync"].get("pool", {})
         conf["decode_responses"] = True
-        Redis.__init__(self, **conf)
+        conf.setdefault("health_check_interval", pool.get("healthCheckInterval", 30))
+        if "unix_socket_path" in conf:
+            conf["path"] = conf.pop("unix_socket_path")
+            connectionClass = UnixDomainSocketConnection
+        else:
+            connectionClass = SSLConnection if conf.pop("ssl", False) else Connection
+        # Options accepted by Redis() but not by the selected connection type (e.g. host/port with a unix socket) are ignored
+        accepted = _connectionArgs(connectionClass)
+        ignored = sorted(key for key in conf if key not in accepted)
+        if ignored:
+            logger.debug("Ignoring connection options not applicable to {}: {}".format(connectionClass.__name__,
+                                                                                         ", ".join(ignored)))
+        conf = {key: value for key, value in conf.items() if key in accepted}
+        Redis.__init__(self, connection_pool=BlockingConnectionPool(connection_class=connectionClass,
+                                                                     max_connections=pool.get("maxConnections", 16),
+                                                                     timeout=pool.get("timeout", 5), **conf))
@@ -2,13 +2,122 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 # SPDX-FileCopyrightText: 2021 grommunio GmbH
 
-from . import ServiceHub
+from . import ServiceHub, ServiceUnavailableError
 
+import logging
+import queue
 import subprocess
+import threading
 import time
 
 from datetime import datetime
 
+logger = logging.getLogger("systemd")
+
+
+class DBusUnitCache:
+    """In-memory unit state cache backed by the systemd D-Bus API.
+
+    Unit properties are loaded on first access and kept up to date by
+    listening to `PropertiesChanged` signals. The cache is cleared when
+    the service manager reloads its configuration.
+    """
+    unitIface = "org.freedesktop.systemd1.Unit"
+
+    def __init__(self, bus):
+        """Connect to bus and subscribe to unit changes.
+
+        Parameters
+        ----------
+        bus : str
+            `SYSTEM`, `SESSION` or address of the bus to connect to
+        """
+        from jeepney import DBusAddress, MatchRule, message_bus
+        from jeepney.io.threading import DBusRouter, Proxy, open_dbus_connection
+        self._router = DBusRouter(open_dbus_connection(bus))
+        self._manager = DBusAddress("/org/freedesktop/systemd1", bus_name="org.freedesktop.systemd1",
+                                    interface="org.freedesktop.systemd1.Manager")
+        self._lock = threading.Lock()
+        self._paths = {}  # unit name -> object path
+        self._units = {}  # object path -> properties
+        self._signals = queue.Queue()
+        rules = (dict(type="signal", interface="org.freedesktop.DBus.Properties", member="PropertiesChanged",
+                      path_namespace="/org/freedesktop/systemd1/unit"),
+                 dict(type="signal", interface=self._manager.interface, member="Reloading"))
+        bus = Proxy(message_bus, self._router, timeout=5)
+        for rule in rules:
+            # Signals carry the unique name of the sender, so only the bus can match the well-known name
+            self._router.filter(MatchRule(**rule), queue=self._signals)
+            bus.AddMatch(MatchRule(sender="org.freedesktop.systemd1", **rule))
+        self._call(self._manager, "Subscribe")
+        self._listener = threading.Thread(target=self._listen, name="systemd D-Bus listener", daemon=True)
+        self._listener.start()
+
+    def close(self):
+        """Stop listener thread and close the D-Bus connection."""
+        self._signals.put(None)
+        self._listener.join(timeout=5)
+        self._router.close()
+        self._router.conn.close()
+
+    def _call(self, address, method, signature=None, body=()):
+        from jeepney import new_method_call
+        from jeepney.wrappers import unwrap_msg
+        return unwrap_msg(self._router.send_and_get_reply(new_method_call(address, method, signature, body), timeout=5))
+
+    def _listen(self):
+        from jeepney import HeaderFields
+        while True:
+            msg = self._signals.get()
+            if msg is None:
+                return
+            if msg.header.fields.get(HeaderFields.member) == "Reloading":
+                with self._lock:
+                    self._units.clear()
+                continue
+            interface, changed, invalidated = msg.body
+            if interface != self.unitIface:
+                continue
+            path = msg.header.fields.get(HeaderFields.path)
+            with self._lock:
+                if path not in self._units:
+                    continue
+                if invalidated:
+                    self._units.pop(path)
+                else:
+                    self._units[path].update({key: value for key, (_, value) in changed.items()})
+
+    def _path(self, unit):
+        path = self._paths.get(unit)
+        if path is None:
+            path = self._paths[unit] = self._call(self._manager, "LoadUnit", "s", (unit,))[0]
+        return path
+
+    def unit(self, unit):
+        """Get properties of a unit.
+
+        Parameters
+        ----------
+        unit : str
+            Name of the unit
+
+        Returns
+        -------
+        dict
+            Unit properties
+        """
+        from jeepney import DBusAddress
+        path = self._path(unit)
+        with self._lock:
+            props = self._units.get(path)
+        if props is None:
+            address = DBusAddress(path, bus_name="org.freedesktop.systemd1", interface="org.freedesktop.DBus.Properties")
+            props = {key: value for key, (_, value) in self._call(address, "GetAll", "s", (self.unitIface,))[0].items()}
+            with self._lock:
+                self._units[path] = props
+        return props
+
+
 def handleSystemdExceptions(service, error):
     if isinstance(error, FileNotFoundError):
         return  # Invalid argument, pass exception on to the caller...
@@ -29,40 +138,91 @@ class Systemd:
     def __init__(self, system=None):
         from tools.config import Config
         self.system = system if system is not None else not Config["options"].get("systemdUser", False)
+        self.dbus = None
+        backend = Config["options"].get("systemdBackend", "auto")
+        if backend == "systemctl":
+            return
+        try:
+            self.dbus = DBusUnitCache(Config["options"].get("systemdBus") or ("SYSTEM" if self.system else "SESSION"))
+        except Exception as err:
+            if backend == "dbus":
+                raise ServiceUnavailableError("Failed to connect to D-Bus: "+" - ".join(str(arg) for arg in err.args))
+            logger.info("D-Bus not available ({}), falling back to systemctl".format(type(err).__name__))
 
     @property
     def __mode(self):
         return "--system" if self.system else "--user"
 
-    def getServices(self, *services):
-        # Manually add grommunio-keycloak if it's installed
-        if self.gKeycloakExists(): # keycloak found
-            services = ["grommunio-keycloak.service", *services]
+    def _dbusFailed(self, err):
+        logger.warning("D-Bus query failed, falling back to systemctl: "+" - ".join(str(arg) for arg in err.args))
+        self.close()
 
+    def close(self):
+        """Close D-Bus connection, if any."""
+        dbus, self.dbus = self.dbus, None
+        if dbus is not None:
+            try:
+                dbus.close()
+            except Exception as err:
+                logger.debug("Failed to close D-Bus connection: "+" - ".join(str(arg) for arg in err.args))
+
+    @staticmethod
+    def _since(unit):
+        sa, si = unit.pop("sa", None), unit.pop("si", None)
+        since = sa if unit.get("state") == "active" else si
+        try:
+            since = time.clock_gettime(time.CLOCK_REALTIME)-time.clock_gettime(time.CLOCK_MONOTONIC)+int(since)/1000000
+            return datetime.fromtimestamp(int(since)).strftime("%Y-%m-%d %H:%M:%S") if since != 0 else None
+        except Exception:
+            return None
+
+    def _getServicesDBus(self, *services):
+        units = []
+        for service in services:
+            props = self.dbus.unit(service)
+            unit = {self.valmap[key]: value for key, value in props.items() if key in self.valmap}
+            unit["unit"] = unit["unit"][0] if unit.get("unit") else service
+            units.append(unit)
+        return units
+
+    def _getServicesSystemctl(self, *services):
         args = ("systemctl", "-q", self.__mode, "show",
                 "--property="+",".join(self.valmap), *services)
         result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
         if result.returncode != 0:
             # systemd not reachable (e.g. running inside a container without systemd as PID 1)
-            return {}
+            return []
         split = [[line.split("=", 1) for line in block.split("\n") if "=" in line] for block in result.stdout.split("\n\n")]
         units = [{self.valmap[key]: value for key, value in block if key in self.valmap} for block in split]
-
         for unit in units:
-            if "unit" not in unit:
-                continue
-            unit["unit"] = unit["unit"].split(" ")[0]
-            since = unit.get("sa") if unit.get("state") == "active" else unit.get("si")
+            if "unit" in unit:
+                unit["unit"] = unit["unit"].split(" ")[0]
+        return units
+
+    def getServices(self, *services):
+        # Manually add grommunio-keycloak if it's installed
+        if self.gKeycloakExists(): # keycloak found
+            services = ["grommunio-keycloak.service", *services]
+
+        units = None
+        if self.dbus is not None:
             try:
-                since = time.clock_gettime(time.CLOCK_REALTIME)-time.clock_gettime(time.CLOCK_MONOTONIC)+int(since)/1000000
-                since = datetime.fromtimestamp(int(since)).strftime("%Y-%m-%d %H:%M:%S") if since != 0 else None
-            except Exception:
-                since = None
-            unit["since"] = since
-            unit.pop("sa", None), unit.pop("si", None)
+                units = self._getServicesDBus(*services)
+            except Exception as err:
+                self._dbusFailed(err)
+        if units is None:
+            units = self._getServicesSystemctl(*services)
+        for unit in units:
+            if "unit" in unit:
+                unit["since"] = self._since(unit)
         return {unit["unit"]: unit for unit in units if "unit" in unit}
-    
+
     def gKeycloakExists(self):
+        if self.dbus is not None:
+            try:
+                return self.dbus.unit("grommunio-keycloak.service").get("LoadState") != "not-found"
+            except Exception as err:
+                self._dbusFailed(err)
         args = ("systemctl", "list-unit-files", "grommunio-keycloak.service")
         result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
         return result.returncode == 0
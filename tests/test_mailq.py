@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+import json
+import os
+import time
+
+import pytest
+
+from tools.config import Config
+from tools.mailq import MailQueue
+
+FAKE_POSTQUEUE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fakepostqueue")
+
+
+def _message(queueID, queue, sender, recipients, age, reason=None):
+    return {"queue_name": queue, "queue_id": queueID, "arrival_time": int(time.time())-age, "message_size": 1024,
+            "sender": sender,
+            "recipients": [dict(address=rcpt, **({"delay_reason": reason} if reason else {})) for rcpt in recipients]}
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    messages = [_message("A1", "deferred", "alice@example.com", ["bob@remote.test", "carol@other.test"], 7200,
+                         "connect to remote.test: Connection refused"),
+                _message("A2", "deferred", "Alice@Example.com", ["dave@remote.test"], 3600,
+                         "connect to remote.test: Connection refused"),
+                _message("A3", "active", "eve@example.org", ["frank@other.test"], 60),
+                _message("A4", "hold", "mallory@spam.test", ["bob@remote.test"], 600, "held by admin")]
+    path = tmp_path/"queue.jsonl"
+    with open(path, "w", encoding="utf-8") as file:
+        for message in messages:
+            file.write(json.dumps(message)+"\n")
+        file.write("not json\n\n")
+    monkeypatch.setenv("FAKE_POSTQUEUE_FILE", str(path))
+    monkeypatch.setitem(Config["options"], "mailq", {"cacheTime": 5, "postqueue": FAKE_POSTQUEUE})
+    MailQueue.invalidate()
+    yield messages
+    MailQueue.invalidate()
+
+
+def _ids(result):
+    return [message["queue_id"] for message in result["postqueue"]]
+
+
+def testParse(queue):
+    entries = MailQueue.entries()
+    assert [entry.data["queue_id"] for entry in entries] == ["A1", "A2", "A4", "A3"]  # Sorted by arrival
+    assert entries[0].domains == {"remote.test", "other.test"}
+    assert entries[0].sender == "alice@example.com"
+
+
+def testFilter(queue):
+    assert _ids(MailQueue.query(sender="ALICE@")) == ["A1", "A2"]
+    assert _ids(MailQueue.query(domain="Other.test")) == ["A1", "A3"]
+    assert _ids(MailQueue.query(queue="hold")) == ["A4"]
+    assert _ids(MailQueue.query(minAge=3000)) == ["A1", "A2"]
+    assert _ids(MailQueue.query(maxAge=1000)) == ["A4", "A3"]
+    assert _ids(MailQueue.query(sender="alice", domain="other.test", queue="deferred")) == ["A1"]
+    assert MailQueue.query(sender="nobody")["total"] == 0
+
+
+def testAggregate(queue):
+    result = MailQueue.query()
+    assert result["total"] == 4
+    assert result["domains"][0] == {"domain": "remote.test", "count": 3}
+    assert {"domain": "other.test", "count": 2} in result["domains"]
+    assert result["reasons"] == [{"reason": "connect to remote.test: Connection refused", "count": 3},
+                                 {"reason": "held by admin", "count": 1}]
+    assert MailQueue.query(top=1)["domains"] == [{"domain": "remote.test", "count": 3}]
+    assert MailQueue.query(queue="active")["reasons"] == []
+
+
+def testPaginate(queue):
+    assert _ids(MailQueue.query()) == ["A1", "A2", "A4", "A3"]  # Unpaginated by default
+    assert _ids(MailQueue.query(limit=2)) == ["A1", "A2"]
+    assert _ids(MailQueue.query(offset=2, limit=2)) == ["A4", "A3"]
+    result = MailQueue.query(offset=3, limit=2)
+    assert _ids(result) == ["A3"]
+    assert result["total"] == 4
+    assert _ids(MailQueue.query(offset=10)) == []
+
+
+def testCache(queue, tmp_path):
+    assert MailQueue.query()["total"] == 4
+    os.remove(tmp_path/"queue.jsonl")
+    assert MailQueue.query()["total"] == 4
+    MailQueue.invalidate()
+    assert MailQueue.query()["total"] == 0
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+"""Negotiated response compression.
+
+Responses are compressed with the first method of `options.compression.methods`
+accepted by the client. gzip is always available, brotli (`br`) and `zstd`
+require the brotli and zstandard modules respectively and are skipped if the
+modules are not installed.
+
+Buffered responses are compressed if their body exceeds the configured
+threshold. Streamed responses are compressed on the fly, flushing the encoder
+after each chunk, so that e.g. server-sent events are not delayed.
+"""
+
+import zlib
+
+from .config import Config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GzipEncoder:
+    def __init__(self, level):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data, flush=False):
+        return self._obj.compress(data)+(self._obj.flush(zlib.Z_SYNC_FLUSH) if flush else b"")
+
+    def finish(self):
+        return self._obj.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, level):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data, flush=False):
+        return self._obj.process(data)+(self._obj.flush() if flush else b"")
+
+    def finish(self):
+        return self._obj.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data, flush=False):
+        return self._obj.compress(data)+(self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else b"")
+
+    def finish(self):
+        return self._obj.flush()
+
+
+encoders = {"gzip": GzipEncoder}
+if brotli is not None:
+    encoders["br"] = BrotliEncoder
+if zstandard is not None:
+    encoders["zstd"] = ZstdEncoder
+
+_defaultLevels = {"gzip": 6, "br": 4, "zstd": 3}
+
+
+def negotiate(acceptEncodings):
+    """Select compression method.
+
+    Parameters
+    ----------
+    acceptEncodings : werkzeug.datastructures.Accept
+        Parsed Accept-Encoding header of the request
+
+    Returns
+    -------
+    str
+        Name of the selected method or None if no supported method is accepted
+    """
+    for method in Config["options"]["compression"].get("methods", ("gzip",)):
+        if method in encoders and acceptEncodings[method] > 0:
+            return method
+    return None
+
+
+def encoder(method):
+    """Create encoder for the given method using the configured level."""
+    levels = Config["options"]["compression"].get("levels", {})
+    return encoders[method](levels.get(method, _defaultLevels[method]))
+
+
+def _stream(chunks, enc):
+    for chunk in chunks:
+        data = enc.compress(chunk, flush=True)
+        if data:
+            yield data
+    yield enc.finish()
+
+
+def compress(request, response):
+    """Compress response if possible and accepted by the client.
+
+    Parameters
+    ----------
+    request : flask.Request
+        The request
+    response : flask.Response
+        The response, modified in place
+    """
+    conf = Config["options"]["compression"]
+    if not conf.get("enabled", True) or response.mimetype not in conf.get("mimetypes", ()) or \
+            response.status_code < 200 or response.status_code in (204, 206, 304) or \
+            response.direct_passthrough or "Content-Encoding" in response.headers:
+        return
+    response.vary.add("Accept-Encoding")
+    method = negotiate(request.accept_encodings)
+    if method is None:
+        return
+    if response.is_streamed:
+        response.response = _stream(response.iter_encoded(), encoder(method))
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < conf.get("threshold", 2048):
+            return
+        enc = encoder(method)
+        compressed = enc.compress(data)+enc.finish()
+        if len(compressed) >= len(data):
+            return
+        response.set_data(compressed)
+    response.headers["Content-Encoding"] = method
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:  # Strong ETags identify the exact bytes of the uncompressed representation
+        response.set_etag(etag, weak=True)
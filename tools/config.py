@@ -63,7 +63,10 @@ def _defaultConfig():
         "dns": {
             "disabled": False,
             "dudIP": "172.16.254.254",
-            "externalResolvers": ["1.1.1.1", "1.0.0.1"]
+            "externalResolvers": ["1.1.1.1", "1.0.0.1"],
+            "timeout": 3,
+            "workers": 16,
+            "negativeCacheTime": 60,
             },
         "openapi": {
             "validateRequest": True,
@@ -83,8 +86,57 @@ def _defaultConfig():
             "domainStorageLevels": 1,
             "userStorageLevels": 2,
             "dashboard": {
-                "services": []
+                "services": [],
+                "sampleInterval": 10,
+                "historySize": 8640,
+                "directory": "/run/grommunio/admin-api-dashboard",
                 },
+            "systemdBackend": "auto",
+            "reload": {
+                "quietPeriod": 2,
+                "maxDelay": 10,
+                "stateFile": "/run/grommunio/admin-api-reload.json",
+                },
+            "logStream": {
+                "maxClients": 2,
+                "batchSize": 100,
+                "batchDelay": 0.5,
+                "keepalive": 15,
+                "maxDuration": 3600,
+                },
+            "mailq": {
+                "cacheTime": 5,
+                "pageSize": 100,
+                "maxPageSize": 1000,
+                "postqueue": "postqueue",
+                },
+            "metrics": {
+                "enabled": True,
+                "directory": "/run/grommunio/admin-api-metrics",
+                "allowedHosts": ["127.0.0.1", "localhost", "::1", "::ffff:127.0.0.1"],
+                },
+            "profiling": {
+                "enabled": False,
+                "bufferSize": 100,
+                "repeatThreshold": 5,
+                "cprofile": False,
+                "cprofileThreshold": 1,
+                },
+            "compression": {
+                "enabled": True,
+                "threshold": 2048,
+                "methods": ["zstd", "br", "gzip"],
+                "levels": {"gzip": 6, "br": 4, "zstd": 3},
+                "mimetypes": ["application/json", "text/event-stream", "text/plain", "application/openmetrics-text"],
+                },
+            "diskUsage": {
+                "cacheFile": "/var/lib/grommunio-admin-api/diskusage.json",
+                "workers": 8,
+                "maxAge": 86400,
+                },
+            "etags": True,
+            "folderCacheTime": 30,
+            "licenseCountInterval": 60,
             "serverPolicy": "round-robin",
             "updateLogPath": "/var/log/grommunio-update.log",
             "updateSkriptPath": "/usr/sbin/grommunio-update",
@@ -93,6 +145,11 @@ def _defaultConfig():
             "jwtPrivateKeyFile": "/var/lib/grommunio-admin-api/auth-private.pem",
             "jwtPublicKeyFile": "/var/lib/grommunio-admin-api/auth-public.pem",
             "rsaKeySize": 4096,
+            "passwordHashing": {
+                "workers": 2,
+                "queueSize": 32,
+                "queueTimeout": 10,
+                },
             },
         "mconf": {
           "ldapPath": "/etc/gromox/ldap_adaptor.cfg",
@@ -102,7 +159,14 @@ def _defaultConfig():
         "sync": {
             "syncStateFolder": "GS-SyncState",
             "defaultPolicy": _defaultSyncPolicy,
-            "policyHosts": ["127.0.0.1", "localhost", "::1", "::ffff:127.0.0.1"]
+            "policyHosts": ["127.0.0.1", "localhost", "::1", "::ffff:127.0.0.1"],
+            "policyCacheTime": 3600,
+            "stateCacheSize": 1024,
+            "pool": {
+                "maxConnections": 16,
+                "timeout": 5,
+                "healthCheckInterval": 30,
+                },
             },
         "chat": {
             "connection": {},
@@ -5,10 +5,13 @@
 """Utility helpers for device-related metadata."""
 
 import json
-from typing import Any, Optional
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
 from services import ServiceUnavailableError
 
 CONNECTION_KEY = "grommunio-sync:connections"
+HMGET_CHUNK = 1000
+
+DeviceKey = Tuple[str, str]
 
 
 def _normalize_timestamp(value: Any) -> Optional[int]:
@@ -28,28 +31,65 @@ def _normalize_timestamp(value: Any) -> Optional[int]:
     return None
 
 
-def _parse_lastconnect_payload(raw: Any) -> Optional[int]:
-    """Parse Redis payload and return normalized timestamp."""
-    try:
-        payload = json.loads(raw)
-    except (TypeError, ValueError, json.JSONDecodeError):
-        return None
-    return _normalize_timestamp(payload.get("starttime"))
+def _connection_field(username: str, device_id: str) -> str:
+    """Return connection hash field name of a device."""
+    return f"{device_id}|-|{username}"
 
 
-def retrieve_lastconnecttime(redis, username: str, device_id: str, fallback: Any = None) -> Optional[int]:
-    """Read last connect timestamp for device, returning fallback if unavailable."""
-    _fallback = _normalize_timestamp(fallback)
-    if not redis:
-        return _fallback
+def retrieve_connections(redis, devices: Iterable[DeviceKey]) -> Dict[DeviceKey, Optional[dict]]:
+    """Read connection metadata of multiple devices in a single round trip.
+
+    `devices` is an iterable of (username, device_id) tuples and may span
+    multiple users. Large requests are split into chunks of `HMGET_CHUNK`
+    fields, which are sent in one pipeline.
+
+    Returns a dict mapping each (username, device_id) tuple to the decoded
+    payload, or None if no valid data is available.
+    """
+    keys = list(dict.fromkeys(devices))
+    result = dict.fromkeys(keys)
+    if not redis or not keys:
+        return result
+    fields = [_connection_field(username, device_id) for username, device_id in keys]
     try:
-        raw = redis.hget(CONNECTION_KEY, f"{device_id}|-|{username}")
+        if len(fields) <= HMGET_CHUNK:
+            values = redis.hmget(CONNECTION_KEY, fields)
+        else:
+            pipe = redis.pipeline(transaction=False)
+            for offset in range(0, len(fields), HMGET_CHUNK):
+                pipe.hmget(CONNECTION_KEY, fields[offset:offset+HMGET_CHUNK])
+            values = [value for chunk in pipe.execute() for value in chunk]
     except ServiceUnavailableError:
-        return _fallback
+        return result
     except Exception:
-        return _fallback
-    if not raw:
-        return _fallback
-    candidate = _parse_lastconnect_payload(raw)
-    return candidate if candidate is not None else _fallback
+        return result
+    for key, raw in zip(keys, values):
+        if not raw:
+            continue
+        try:
+            payload = json.loads(raw)
+        except (TypeError, ValueError, json.JSONDecodeError):
+            continue
+        if isinstance(payload, dict):
+            result[key] = payload
+    return result
+
+
+def retrieve_lastconnecttimes(redis, devices: Iterable[DeviceKey],
+                              fallbacks: Optional[Mapping[DeviceKey, Any]] = None) -> Dict[DeviceKey, Optional[int]]:
+    """Read last connect timestamps of multiple devices in a single round trip.
+
+    Devices without (valid) data in Redis get the value from `fallbacks`, if present.
+    """
+    fallbacks = fallbacks or {}
+    result = {}
+    for key, payload in retrieve_connections(redis, devices).items():
+        candidate = _normalize_timestamp(payload.get("starttime")) if payload is not None else None
+        result[key] = candidate if candidate is not None else _normalize_timestamp(fallbacks.get(key))
+    return result
 
+
+def retrieve_lastconnecttime(redis, username: str, device_id: str, fallback: Any = None) -> Optional[int]:
+    """Read last connect timestamp for device, returning fallback if unavailable."""
+    key = (username, device_id)
+    return retrieve_lastconnecttimes(redis, (key,), {key: fallback})[key]
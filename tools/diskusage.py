@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+import json
+import logging
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import Config
+
+logger = logging.getLogger("diskusage")
+
+
+class DiskUsage:
+    """Parallel, incremental disk usage scanner.
+
+    The scanner walks storage partitions using `os.scandir`, distributing the
+    per-user and per-domain directories over a thread pool.
+
+    Each scanned directory is stored in a cache together with its modification
+    time. On subsequent scans, directories with unchanged mtime are not listed
+    again, only their subdirectories are checked for changes. As modifying a
+    file in place does not change the mtime of the containing directory,
+    cached entries are re-read after `maxAge` seconds.
+    """
+
+    # Cache entry fields
+    MTIME, FILES, SIZE, SUBDIRS, SCANNED = range(5)
+
+    partitions = ("domain", "user")
+
+    def __init__(self, cacheFile=None, workers=None, maxAge=None):
+        """Initialize scanner.
+
+        Parameters
+        ----------
+        cacheFile : str, optional
+            Path of the persistent cache or None to use configured value. The default is None.
+        workers : int, optional
+            Number of scanning threads or None to use configured value. The default is None.
+        maxAge : int, optional
+            Maximum age in seconds of cached directory listings or None to use configured value. The default is None.
+        """
+        conf = Config["options"].get("diskUsage", {})
+        self.cacheFile = cacheFile if cacheFile is not None else conf.get("cacheFile")
+        self.workers = max(1, workers if workers is not None else conf.get("workers", 8))
+        self.maxAge = maxAge if maxAge is not None else conf.get("maxAge", 86400)
+        self.cache = {}
+        self.summary = {}
+        self.load()
+
+    @staticmethod
+    def loadSummary(cacheFile=None):
+        """Load summary of the last scan from the cache file.
+
+        Parameters
+        ----------
+        cacheFile : str, optional
+            Path of the persistent cache or None to use configured value. The default is None.
+
+        Returns
+        -------
+        dict
+            Summary of the last scan, or None if no scan results are available
+        """
+        cacheFile = cacheFile or Config["options"].get("diskUsage", {}).get("cacheFile")
+        try:
+            with open(cacheFile) as file:
+                return json.load(file).get("summary") or None
+        except (OSError, TypeError, ValueError):
+            return None
+
+    def load(self):
+        """Load persistent cache."""
+        if not self.cacheFile:
+            return
+        try:
+            with open(self.cacheFile) as file:
+                data = json.load(file)
+            self.cache = data.get("dirs", {})
+            self.summary = data.get("summary", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as err:
+            logger.warning("Failed to load disk usage cache: "+" - ".join(str(arg) for arg in err.args))
+
+    def save(self):
+        """Save persistent cache.
+
+        The file is replaced atomically, so concurrent readers never see partial data.
+        """
+        if not self.cacheFile:
+            return
+        tmpfile = "{}.{}.tmp".format(self.cacheFile, os.getpid())
+        try:
+            with open(tmpfile, "w") as file:
+                json.dump({"dirs": self.cache, "summary": self.summary}, file, separators=(",", ":"))
+            os.replace(tmpfile, self.cacheFile)
+        except OSError as err:
+            logger.warning("Failed to save disk usage cache: "+" - ".join(str(arg) for arg in err.args))
+            try:
+                os.unlink(tmpfile)
+            except OSError:
+                pass
+
+    def _scanDir(self, path, st, result, now):
+        """Recursively scan directory.
+
+        Parameters
+        ----------
+        path : str
+            Path of the directory
+        st : os.stat_result
+            Stat result of the directory
+        result : dict
+            Dictionary to store cache entries in
+        now : float
+            Timestamp of the scan
+
+        Returns
+        -------
+        tuple(int, int)
+            Number of files and total size in bytes (including directories)
+        """
+        cached = self.cache.get(path)
+        subdirs = []
+        if cached is not None and cached[self.MTIME] == st.st_mtime_ns and now-cached[self.SCANNED] < self.maxAge:
+            entry = cached
+            for name in cached[self.SUBDIRS]:
+                subpath = os.path.join(path, name)
+                try:
+                    subdirs.append((subpath, os.stat(subpath, follow_symlinks=False)))
+                except OSError:
+                    pass
+        else:
+            files = size = 0
+            names = []
+            try:
+                with os.scandir(path) as it:
+                    for dirent in it:
+                        try:
+                            if dirent.is_symlink():
+                                continue
+                            direntStat = dirent.stat(follow_symlinks=False)
+                            if dirent.is_dir(follow_symlinks=False):
+                                names.append(dirent.name)
+                                subdirs.append((dirent.path, direntStat))
+                            else:
+                                files += dirent.is_file(follow_symlinks=False)
+                                size += direntStat.st_size
+                        except OSError:
+                            pass
+            except OSError as err:
+                logger.debug("Cannot scan '{}': {}".format(path, " - ".join(str(arg) for arg in err.args)))
+            entry = [st.st_mtime_ns, files, size, names, now]
+        result[path] = entry
+        files, size = entry[self.FILES], entry[self.SIZE]+st.st_size
+        for subpath, subst in subdirs:
+            f, s = self._scanDir(subpath, subst, result, now)
+            files += f
+            size += s
+        return files, size
+
+    def _scanUnit(self, path, st, now):
+        result = {}
+        files, size = self._scanDir(path, st, result, now)
+        return files, size, result
+
+    @staticmethod
+    def _units(prefix, levels):
+        """Collect directories at storage level.
+
+        Parameters
+        ----------
+        prefix : str
+            Partition root
+        levels : int
+            Number of sub-directory levels
+
+        Returns
+        -------
+        tuple(list, int, int)
+            List of (path, stat) tuples, number of files and size of the intermediate levels
+        """
+        current = [(prefix, os.stat(prefix))]
+        files, size = 0, 0
+        for _ in range(levels):
+            subdirs = []
+            for path, st in current:
+                size += st.st_size
+                try:
+                    with os.scandir(path) as it:
+                        for dirent in it:
+                            try:
+                                if dirent.is_symlink():
+                                    continue
+                                direntStat = dirent.stat(follow_symlinks=False)
+                                if dirent.is_dir(follow_symlinks=False):
+                                    subdirs.append((dirent.path, direntStat))
+                                else:
+                                    files += dirent.is_file(follow_symlinks=False)
+                                    size += direntStat.st_size
+                            except OSError:
+                                pass
+                except OSError:
+                    pass
+            current = subdirs
+        return current, files, size
+
+    def scanPartition(self, partition, executor, now):
+        """Scan a storage partition.
+
+        Parameters
+        ----------
+        partition : str
+            Name of the partition, either `domain` or `user`
+        executor : concurrent.futures.Executor
+            Executor to submit unit scans to
+        now : float
+            Timestamp of the scan
+
+        Returns
+        -------
+        tuple(dict, dict)
+            Partition summary and new cache entries
+        """
+        prefix = Config["options"][partition+"Prefix"].rstrip(os.path.sep) or os.path.sep
+        levels = Config["options"][partition+"StorageLevels"]
+        if Config["options"].get("serverExplicitMount"):
+            levels += 1
+        units, files, size = self._units(prefix, levels)
+        futures = [(path, executor.submit(self._scanUnit, path, st, now)) for path, st in units]
+        entries, cache = {}, {}
+        for path, future in futures:
+            f, s, result = future.result()
+            files += f
+            size += s
+            entries[path] = (f, s)
+            cache.update(result)
+        return {"path": prefix, "files": files, "size": size, "entries": entries}, cache
+
+    def scan(self, partitions=None, full=False):
+        """Scan storage partitions and update the persistent cache.
+
+        Parameters
+        ----------
+        partitions : iterable, optional
+            Partitions to scan or None to scan all. The default is None.
+        full : bool, optional
+            Ignore cached entries. The default is False.
+
+        Returns
+        -------
+        dict
+            Summary of the scanned partitions
+        """
+        partitions = partitions or self.partitions
+        if full:
+            self.cache = {}
+        now = time.time()
+        summary = {}
+        with ThreadPoolExecutor(self.workers) as executor:
+            for partition in partitions:
+                start = time.time()
+                try:
+                    summary[partition], cache = self.scanPartition(partition, executor, now)
+                except OSError as err:
+                    logger.warning("Failed to scan {} partition: {}"
+                                   .format(partition, " - ".join(str(arg) for arg in err.args)))
+                    continue
+                prefix = summary[partition]["path"].rstrip(os.path.sep)+os.path.sep
+                self.cache = {path: entry for path, entry in self.cache.items() if not path.startswith(prefix)}
+                self.cache.update(cache)
+                summary[partition]["time"] = now
+                logger.info("Scanned {} partition in {:.1f}s".format(partition, time.time()-start))
+        self.summary.update(summary)
+        self.save()
+        return summary
@@ -3,11 +3,107 @@
 # SPDX-FileCopyrightText: 2023 grommunio GmbH
 
 from dns import resolver, reversename
+import ipaddress
+import os
 import socket
 import subprocess
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 from .config import Config
 
 
+class CachedResolver:
+    """DNS resolver with per-query timeout and shared answer cache.
+
+    Answers are cached per (resolver, name, record type) until their TTL
+    expires, negative answers for `negativeCacheTime` seconds.
+    """
+    nameservers = {"internal": None,
+                   "external": lambda: Config["dns"]["externalResolvers"],
+                   "opendns": lambda: ["208.67.222.222", "208.67.220.220", "208.67.222.220"]}
+    maxEntries = 10000
+
+    _resolvers = {}
+    _cache = {}  # (resolver, name, type) -> (expiration, records or exception)
+    _lock = threading.Lock()
+
+    def __init__(self, name):
+        self.name = name
+        self.resolver = resolver.Resolver()
+        if self.nameservers[name] is not None:
+            self.resolver.nameservers = self.nameservers[name]()
+        self.resolver.lifetime = Config["dns"].get("timeout", 3)
+
+    @classmethod
+    def get(cls, name):
+        """Get resolver instance.
+
+        Parameters
+        ----------
+        name : str
+            Name of the resolver, either `internal`, `external` or `opendns`
+
+        Returns
+        -------
+        CachedResolver
+            Resolver object
+        """
+        if name not in cls._resolvers:
+            cls._resolvers[name] = cls(name)
+        return cls._resolvers[name]
+
+    @classmethod
+    def _store(cls, key, expiration, value):
+        with cls._lock:
+            if len(cls._cache) >= cls.maxEntries:
+                now = time.time()
+                for expired in [cached for cached, (exp, _) in cls._cache.items() if exp <= now]:
+                    cls._cache.pop(expired)
+                if len(cls._cache) >= cls.maxEntries:
+                    cls._cache.clear()
+            cls._cache[key] = (expiration, value)
+
+    def query(self, qname, rdtype="A"):
+        """Resolve name, using cached answers if possible.
+
+        Parameters
+        ----------
+        qname : str or dns.name.Name
+            Name to resolve
+        rdtype : str, optional
+            Record type. The default is "A".
+
+        Raises
+        ------
+        dns.exception.DNSException
+            Resolution failed
+
+        Returns
+        -------
+        tuple
+            Records returned by the DNS server
+        """
+        key = (self.name, str(qname).lower(), rdtype)
+        now = time.time()
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > now:
+            if isinstance(cached[1], Exception):
+                raise cached[1]
+            return cached[1]
+        try:
+            answer = self.resolver.resolve(qname, rdtype)
+        except (resolver.NXDOMAIN, resolver.NoAnswer) as err:
+            self._store(key, now+Config["dns"].get("negativeCacheTime", 60), err)
+            raise
+        records = tuple(answer)
+        self._store(key, answer.expiration, records)
+        return records
+
+
 class ExternalResolver:
     resolver = None
 
@@ -15,22 +111,104 @@ class ExternalResolver:
     def get(cls):
         if cls.resolver is None:
             try:
-                cls.resolver = resolver.Resolver()
-                cls.resolver.nameservers = Config["dns"]["externalResolvers"]
+                cls.resolver = CachedResolver.get("external")
             except Exception:
                 pass
         return cls.resolver
 
 
-def getHostByName(domain):
+class _Executor:
+    executor = None
+    lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        with cls.lock:
+            if cls.executor is None:
+                cls.executor = ThreadPoolExecutor(Config["dns"].get("workers", 16), thread_name_prefix="dns")
+        return cls.executor
+
+
+def _query(qname, rdtype="A"):
+    return CachedResolver.get("internal").query(qname, rdtype)
+
+
+class _HostsFile:
+    """Names listed in /etc/hosts, reloaded when the file changes."""
+    path = "/etc/hosts"
+    _names = frozenset()
+    _mtime = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def names(cls):
+        try:
+            mtime = os.stat(cls.path).st_mtime
+        except OSError:
+            return frozenset()
+        with cls._lock:
+            if mtime != cls._mtime:
+                names = set()
+                try:
+                    with open(cls.path, encoding="utf-8", errors="replace") as file:
+                        for line in file:
+                            names.update(name.lower().rstrip(".") for name in line.split("#", 1)[0].split()[1:])
+                except OSError:
+                    pass
+                cls._names, cls._mtime = frozenset(names), mtime
+            return cls._names
+
+
+def _isLocal(hostname):
+    """Check whether the host name is an IP address or listed in /etc/hosts."""
     try:
-        # If host can be resolved
-        socket.getaddrinfo(domain, None)
+        ipaddress.ip_address(hostname)
         return True
+    except ValueError:
+        return hostname.lower().rstrip(".") in _HostsFile.names()
+
+
+def _resolvable(hostname, rdtype):
+    try:
+        return len(_query(hostname, rdtype)) > 0
     except Exception:
-        pass
-    # Host could not be resolved
-    return False
+        return False
+
+
+def getHostByName(domain):
+    """Check whether a host name resolves to an IPv4 or IPv6 address."""
+    return getHostsByName((domain,))[domain]
+
+
+def getHostsByName(hostnames):
+    """Check resolvability of multiple host names concurrently.
+
+    IP addresses and names listed in /etc/hosts are always resolvable. Other
+    names are resolved (A and AAAA) with the cached DNS resolver, whose
+    lifetime limits each lookup to the configured timeout.
+
+    Parameters
+    ----------
+    hostnames : iterable
+        Host names to resolve
+
+    Returns
+    -------
+    dict
+        Mapping of host name to boolean indicating whether it could be resolved
+    """
+    executor = _Executor.get()
+    result, futures = {}, {}
+    for hostname in set(hostnames):
+        if not hostname:
+            result[hostname] = False
+        elif _isLocal(hostname):
+            result[hostname] = True
+        else:
+            futures[hostname] = [executor.submit(_resolvable, hostname, rdtype) for rdtype in ("A", "AAAA")]
+    for hostname, lookups in futures.items():
+        result[hostname] = any(future.result() for future in lookups)
+    return result
 
 
 def getLocalIp():
@@ -46,47 +224,47 @@ def getLocalIp():
 
 
 def fullDNSCheck(domain: str):
+    result, error = fullDNSChecks((domain,))
+    return (result[domain] if result is not None else None), error
+
+
+def fullDNSChecks(domains):
+    """Run DNS checks for multiple domains.
+
+    All lookups are distributed over a shared thread pool.
+
+    Parameters
+    ----------
+    domains : iterable
+        Names of the domains to check
+
+    Returns
+    -------
+    dict
+        Mapping of domain name to check results, or None on error
+    str
+        Error message or None if successful
+    """
     if Config["dns"]["disabled"]:
         return None, "DNS check disabled by configuration"
-        
+
     externalResolver = ExternalResolver.get()
     if externalResolver is None:
         return None, "DNS resolver initialization failed"
 
-    localIp = getLocalIp()
-    externalIp = checkMyIP()
-    mxRecords = checkMX(domain)
-    autodiscover = checkAutodiscover(domain)
-    autodiscoverSRV = checkAutodiscoverSRV(domain)
-    autoconfig = checkAutoconfig(domain)
-    txt = checkTXT(domain)
-    dkim = checkDKIM(domain)
-    dmarc = checkDMARC(domain)
-    srv = checkAllSRV(domain)
-    caldavTXT = checkCaldavTxt(domain)
-    carddavTXT = checkCarddavTxt(domain)
-    return {
-        "localIp": localIp,
-        "externalIp": externalIp,
-        "mxRecords": mxRecords,
-        "autodiscover": autodiscover,
-        "autodiscoverSRV": autodiscoverSRV,
-        "autoconfig": autoconfig,
-        "txt": txt,
-        "dkim": dkim,
-        "dmarc": dmarc,
-        "caldavTXT": caldavTXT,
-        "carddavTXT": carddavTXT,
-        **srv
-    }, None
+    executor = _Executor.get()
+    common = {"localIp": executor.submit(getLocalIp), "externalIp": executor.submit(checkMyIP)}
+    checks = {domain: {key: executor.submit(check, domain) for key, check in _domainChecks.items()}
+              for domain in domains}
+    common = {key: future.result() for key, future in common.items()}
+    return {domain: {**common, **{key: future.result() for key, future in futures.items()}}
+            for domain, futures in checks.items()}, None
 
 
 def checkMyIP():
     res = None
     try:
-        customResolver = resolver.Resolver()
-        customResolver.nameservers = ["208.67.222.222", "208.67.220.220", "208.67.222.220"]
-        dnsAnswer = customResolver.query("myip.opendns.com")
+        dnsAnswer = CachedResolver.get("opendns").query("myip.opendns.com")
         res = ", ".join([str(a) for a in dnsAnswer])
     except Exception:
         pass
@@ -96,7 +274,7 @@ def checkMyIP():
 def ip(domain: str):
     res = None
     try:
-        dnsAnswer = resolver.query(domain)
+        dnsAnswer = _query(domain)
         res = ", ".join([str(a) for a in dnsAnswer])
     except Exception:
         pass
@@ -116,7 +294,7 @@ def checkMX(domain: str):
         return res
     
     try:
-        mxRecords = resolver.query(domain, "MX")
+        mxRecords = _query(domain, "MX")
         mxDomain = mxRecords[0].exchange # Mail-domain of domain
         res["mxDomain"] = str(mxDomain)
         try:
@@ -125,11 +303,11 @@ def checkMX(domain: str):
 
             # Reverse lookup
             addresses = [reversename.from_address(str(r)) for r in mxResolved]
-            res["reverseLookup"] = str(resolver.query(addresses[0], "PTR")[0])
+            res["reverseLookup"] = str(_query(addresses[0], "PTR")[0])
         except Exception:
             pass
         try:
-            mxResolved = resolver.query(mxDomain, "A")
+            mxResolved = _query(mxDomain, "A")
             res["internalDNS"] = ", ".join([str(r) for r in mxResolved])
         except Exception:
             pass
@@ -146,10 +324,7 @@ def checkAutoconfig(domain: str):
     return defaultDNSQuery("autoconfig.", domain)
 
 
-def checkAllSRV(domain: str):
-    res = {f"{subdomain}SRV": defaultDNSQuery(f"_{subdomain}._tcp.", domain, recordType="SRV")
-           for subdomain in ["submission", "imap", "imaps", "pop3", "pop3s", "caldav", "caldavs", "carddav", "carddavs"]}
-    return res
+_srvServices = ["submission", "imap", "imaps", "pop3", "pop3s", "caldav", "caldavs", "carddav", "carddavs"]
 
 
 def checkAutodiscoverSRV(domain: str):
@@ -157,7 +332,7 @@ def checkAutodiscoverSRV(domain: str):
     resExternal = None
     adIp = None
     try:
-        records = resolver.query("_autodiscover._tcp." + domain, "SRV")
+        records = _query("_autodiscover._tcp." + domain, "SRV")
         res = ", ".join([str(r) for r in records])
     except Exception:
         pass
@@ -177,7 +352,7 @@ def checkTXT(domain: str):
     res = None
     resExternal = None
     try:
-        txtRecords = resolver.query(domain, "TXT")
+        txtRecords = _query(domain, "TXT")
         res = ", ".join([str(r) for r in txtRecords if str(r).startswith('"v=spf1')])
     except Exception:
         pass
@@ -212,7 +387,7 @@ def defaultDNSQuery(subdomain: str, domain: str, recordType="A", path=""):
     res = None
     resExternal = None
     try:
-        records = resolver.query(subdomain + domain + path, recordType)
+        records = _query(subdomain + domain + path, recordType)
         res = ", ".join([str(r) for r in records])
     except Exception:
         pass
@@ -227,6 +402,21 @@ def defaultDNSQuery(subdomain: str, domain: str, recordType="A", path=""):
     return {"internalDNS": res, "externalDNS": resExternal}
 
 
+
+_domainChecks = {
+    "mxRecords": checkMX,
+    "autodiscover": checkAutodiscover,
+    "autodiscoverSRV": checkAutodiscoverSRV,
+    "autoconfig": checkAutoconfig,
+    "txt": checkTXT,
+    "dkim": checkDKIM,
+    "dmarc": checkDMARC,
+    "caldavTXT": checkCaldavTxt,
+    "carddavTXT": checkCarddavTxt,
+    **{f"{subdomain}SRV": partial(defaultDNSQuery, f"_{subdomain}._tcp.", recordType="SRV")
+       for subdomain in _srvServices}
+}
+
 def generateDkimKeys(domain, type="rsa", selector="dkim"):
     import os
     import shutil
@@ -18,6 +18,57 @@ def exmdbFolderPermissionString(permission):
     return permstring
 
 
+def setFolderPermissions(exmdb, client, entries, recursive=False):
+    """Apply a folder permission matrix over a single exmdb connection.
+
+    Each entry assigns the same permissions to every member on every listed folder.
+    Errors of single assignments do not abort the operation.
+
+    Parameters
+    ----------
+    exmdb : services.exmdb.ExmdbService
+        Exmdb service
+    client : services.exmdb.ExmdbService._BoundClient
+        Client of the store containing the folders
+    entries : Iterable of (list of int, list of str, int, int)
+        Tuples of folder IDs, members (username, `default` or `anonymous`), permission mask and
+        mode (`client.ADD`, `client.SET` or `client.REMOVE`).
+        Member IDs are not supported, as they are only valid for a single folder.
+    recursive : bool, optional
+        Additionally apply each entry to all subfolders. The default is False.
+
+    Returns
+    -------
+    int
+        Number of successful assignments
+    list of (int, str, str)
+        Folder ID, member and error message of each failed assignment
+    """
+    from tools.constants import PropTags
+    subfolders = {}
+    updated, errors = 0, []
+    for folderIDs, members, permissions, mode in entries:
+        fids = list(folderIDs)
+        if recursive:
+            for folderID in folderIDs:
+                if folderID not in subfolders:
+                    try:
+                        folders = exmdb.FolderList(client.listFolders(folderID, True, (PropTags.FOLDERID,))).folders
+                        subfolders[folderID] = [folder.folderId for folder in folders]
+                    except exmdb.ExmdbError as err:
+                        subfolders[folderID] = []
+                        errors += [(folderID, member, "Failed to list subfolders: "+str(err)) for member in members]
+                fids += subfolders[folderID]
+        for fid in dict.fromkeys(fids):
+            for member in members:
+                try:
+                    client.setFolderMember(fid, member, permissions, mode)
+                    updated += 1
+                except exmdb.ExmdbError as err:
+                    errors.append((fid, member, str(err) or "Failed to set permissions"))
+    return updated, errors
+
+
 class _FolderNode():
     I = chr(0x2502)+" "
     L = chr(0x2514)+chr(0x2500)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+"""Public folder hierarchy cache.
+
+Folder listings of domain stores are stored in redis for
+`options.folderCacheTime` seconds, so that browsing the folder UI does not
+query exmdb for each request. All entries of a store are kept in a single hash
+(`<timestamp>:<JSON>` per listing), which is reset whenever the API creates,
+modifies or deletes a public folder of the store. The time of the reset is kept
+in the hash, so that listings loaded concurrently to a modification are not
+used afterwards. Modifications made by other clients are visible after the
+cache time has passed.
+"""
+
+import json
+import time
+
+from services import Service
+from tools.config import Config
+
+CACHE_PREFIX = "grommunio-admin:publicfolders-"
+INVALIDATED = "@invalidated"
+
+
+def cacheKey(homedir):
+    """Return redis key of a domain store's cached folder listings."""
+    return CACHE_PREFIX+homedir
+
+
+def cached(homedir, key, loader):
+    """Get cached folder data, loading it if necessary.
+
+    Parameters
+    ----------
+    homedir : str
+        Home directory of the domain store
+    key : str
+        Key identifying the listing (e.g. type and parameters of the request)
+    loader : callable
+        Function returning the JSON serializable data
+
+    Returns
+    -------
+    Any
+        Data returned by `loader`
+    """
+    ttl = Config["options"].get("folderCacheTime", 30)
+    if ttl <= 0:
+        return loader()
+    now = time.time()
+    with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
+        entry, invalidated = redis.hmget(cacheKey(homedir), [key, INVALIDATED])
+        if entry:
+            timestamp, data = entry.split(":", 1)
+            timestamp = float(timestamp)
+            if timestamp >= float(invalidated or 0) and now-timestamp < ttl:
+                return json.loads(data)
+    data = loader()
+    with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
+        pipe = redis.pipeline(transaction=False)
+        pipe.hset(cacheKey(homedir), key, "{}:{}".format(now, json.dumps(data, separators=(",", ":"))))
+        pipe.expire(cacheKey(homedir), ttl)
+        pipe.execute()
+    return data
+
+
+def invalidate(homedir):
+    """Remove all cached folder listings of a domain store."""
+    ttl = Config["options"].get("folderCacheTime", 30)
+    if ttl > 0:
+        with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
+            pipe = redis.pipeline()
+            pipe.delete(cacheKey(homedir))
+            pipe.hset(cacheKey(homedir), INVALIDATED, time.time())
+            pipe.expire(cacheKey(homedir), ttl)
+            pipe.execute()
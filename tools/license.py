@@ -6,6 +6,7 @@ from datetime import datetime, timezone, MAXYEAR
 
 import cryptography
 import logging
+import os
 
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
@@ -88,6 +89,14 @@ def loadCertificate():
         logger.warn("Could not load license: "+err.args[1])
 
 
+def _fileMtime():
+    try:
+        return os.stat(Config["options"]["licenseFile"]).st_mtime_ns
+    except (KeyError, OSError):
+        return None
+
+
+_licenseMtime = _fileMtime()
 _license = loadCertificate() or _defaultLicense()
 
 
@@ -98,8 +107,8 @@ def updateCertificate(data):
     try:
         with open(Config["options"]["licenseFile"], "wb") as file:
             file.write(data)
-        global _license
-        _license = val
+        global _license, _licenseMtime
+        _license, _licenseMtime = val, _fileMtime()
     except KeyError:
         return "Could not save license: location not configured"
     except FileNotFoundError as err:
@@ -109,7 +118,15 @@ def updateCertificate(data):
 
 
 def getLicense():
-    global _license
+    """Get current license.
+
+    The parsed certificate is cached until the modification time of the license file changes.
+    """
+    global _license, _licenseMtime
+    mtime = _fileMtime()
+    if mtime != _licenseMtime:
+        _licenseMtime = mtime
+        _license = loadCertificate() or _defaultLicense()
     if _license.error:
         _license = _defaultLicense()
     return _license
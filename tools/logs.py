@@ -2,8 +2,102 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 # SPDX-FileCopyrightText: 2021 grommunio GmbH
 
+import ctypes
+import os
+import re
+import select
+import threading
+import time
+
+from collections import OrderedDict
 from systemd.journal import Reader
 
+
+def _compile(grep):
+    """Compile grep expression.
+
+    Matching is case insensitive if the expression contains no upper case characters.
+
+    Parameters
+    ----------
+    grep : str
+        Regular expression or None
+
+    Raises
+    ------
+    ValueError
+        Invalid expression
+
+    Returns
+    -------
+    re.Pattern
+        Compiled expression or None if no expression was given
+    """
+    try:
+        return re.compile(grep, 0 if grep != grep.lower() else re.IGNORECASE) if grep else None
+    except re.error as err:
+        raise ValueError("Invalid expression: "+err.msg)
+
+
+def _batched(read, wait, batchSize, batchDelay, timeout):
+    """Collect newly arriving log entries into batches.
+
+    Entries are only read when the consumer requests the next batch, so slow
+    consumers never cause entries to be buffered.
+
+    Parameters
+    ----------
+    read : function
+        Function taking the maximum number of entries and returning a list of new entries
+    wait : function
+        Function taking a timeout in seconds and blocking until new entries might be available
+    batchSize : int
+        Maximum number of entries per batch
+    batchDelay : float
+        Time in seconds to wait for further entries before a batch is emitted
+    timeout : float
+        Time in seconds after which an empty batch is emitted if no entries arrived
+
+    Yields
+    ------
+    list
+        List of log entries
+    """
+    batch, deadline, last = [], None, time.monotonic()
+    while True:
+        batch += read(batchSize-len(batch))
+        now = time.monotonic()
+        if batch and deadline is None:
+            deadline = now+batchDelay
+        if len(batch) >= batchSize or (batch and now >= deadline) or (not batch and now-last >= timeout):
+            yield batch
+            batch, deadline, last = [], None, time.monotonic()
+            continue
+        wait(deadline-now if batch else timeout-(now-last))
+
+
+class _Stream:
+    """Iterator over followed log batches.
+
+    Closing the stream closes the underlying generator and releases the
+    resources of the reader, even if iteration has never started (in which
+    case the generator's cleanup would not run).
+    """
+    def __init__(self, batches, release):
+        self._batches = batches
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._batches)
+
+    def close(self):
+        self._batches.close()
+        self._release()
+
+
 class LogReader:
     """Central log reader class."""
     rreg = {}
@@ -58,10 +152,47 @@ class LogReader:
             raise ValueError("Unknown source '{}'".format(source))
         return cls.rreg[source](target).tail(*args, **kwargs)
 
+    @classmethod
+    def follow(cls, source, target, *args, **kwargs):
+        """Follow log.
+
+        Automatically uses the correct log reader according to `source`.
+
+        Parameters
+        ----------
+        source : str
+            Name of the log source
+        target : str
+            Name of the log file or unit
+        *args : any
+            Arguments forwarded to the log reader
+        **kwargs : any
+            Keyword arguments forwarded to the log reader
+
+        Raises
+        ------
+        ValueError
+            `source` is not a registered log reader
+
+        Returns
+        -------
+        iterator
+            Closeable iterator yielding lists of new log file entries
+        """
+        if source not in cls.rreg:
+            raise ValueError("Unknown source '{}'".format(source))
+        return cls.rreg[source](target).follow(*args, **kwargs)
+
 
 @LogReader.register("journald")
 class JournaldReader:
-    """Reader class four journald logs."""
+    """Reader class four journald logs.
+
+    Journal readers are kept open in a small per-unit cache and reused by subsequent calls.
+    """
+    cacheSize = 8
+    _readers = OrderedDict()
+    _lock = threading.Lock()
 
     def __init__(self, unit):
         """Create journald reader
@@ -71,48 +202,512 @@ class JournaldReader:
         unit : str
             Name of the unit.
         """
-        self.reader = Reader()
-        self.reader.add_match(_SYSTEMD_UNIT=unit)
+        self.unit = unit
+        self.reader = None
+
+    def _acquire(self, level=None):
+        """Get journal reader from the cache or open a new one.
+
+        Parameters
+        ----------
+        level : int, optional
+            Maximum priority level of entries to return. The default is None.
+        """
+        self.key = (self.unit, level)
+        with self._lock:
+            self.reader = self._readers.pop(self.key, None)
+        if self.reader is None:
+            self.reader = Reader()
+            self.reader.add_match(_SYSTEMD_UNIT=self.unit)
+            if level is not None:
+                self.reader.log_level(level)
+            self.reader.fileno()  # Enable change tracking for `process`
+        else:
+            self.reader.process()
+
+    def _release(self):
+        """Return reader to the cache."""
+        with self._lock:
+            if self.key in self._readers:
+                self.reader.close()
+            else:
+                self._readers[self.key] = self.reader
+                while len(self._readers) > self.cacheSize:
+                    self._readers.popitem(last=False)[1].close()
+        self.reader = None
 
     @staticmethod
     def _entry(data):
         return dict(level=data["PRIORITY"],
                     message=data["MESSAGE"],
                     time=data["__REALTIME_TIMESTAMP"].strftime("%Y-%m-%d %H:%M:%S.%f"),
-                    runtime=data["__MONOTONIC_TIMESTAMP"].timestamp.total_seconds())
+                    runtime=data["__MONOTONIC_TIMESTAMP"].timestamp.total_seconds(),
+                    cursor=data["__CURSOR"])
 
     @staticmethod
     def _valid(data):
         """Check if log entry is valid."""
         return len(data) != 0 and isinstance(data["MESSAGE"], str)
 
-    def tail(self, n=10, skip=0, after=None):
+    def _read(self, step, count=None, grep=None, stop=None):
+        """Read matching entries.
+
+        Parameters
+        ----------
+        step : function
+            Function returning the next entry
+        count : int, optional
+            Maximum number of entries to read or None for no limit. The default is None.
+        grep : re.Pattern, optional
+            Only return entries with matching message. The default is None.
+        stop : function, optional
+            Stop reading when function returns True for an entry. The default is None.
+
+        Returns
+        -------
+        list
+            List of raw journal entries
+        """
+        entries = []
+        while count is None or len(entries) < count:
+            entry = step()
+            if len(entry) == 0 or (stop is not None and stop(entry)):
+                break
+            if self._valid(entry) and (grep is None or grep.search(entry["MESSAGE"])):
+                entries.append(entry)
+        return entries
+
+    def tail(self, n=10, skip=0, after=None, cursor=None, level=None, grep=None):
         """Get log tail.
 
         Parameters
         ----------
         n : int, optional
-            Number of lines to return. The default is 10.
+            Maximum number of lines to return. The default is 10.
         skip : int, optional
             Number of lines to skip. The default is 0.
         after : datetime, optional
-            Return all lines after given time point. Overrides `n` and `skip`. The default is None.
+            Return the first `n` lines after given time point. Overrides `skip`. The default is None.
+        cursor : str, optional
+            Return the first `n` lines after the entry with the given cursor. Overrides `skip` and `after`.
+            The default is None.
+        level : int, optional
+            Return only lines with priority level lower or equal to `level`. The default is None.
+        grep : str, optional
+            Regular expression log messages must match. Case insensitive if it contains no upper case characters.
+            The default is None.
+
+        Raises
+        ------
+        ValueError
+            Invalid cursor or expression
 
         Returns
         -------
         list
             List of log file entries
         """
-        self.reader.seek_tail()
-        if after is None:
+        grep = _compile(grep)
+        self._acquire(level)
+        try:
+            if cursor is not None:
+                try:
+                    self.reader.seek_cursor(cursor)
+                except OSError:
+                    raise ValueError("Invalid cursor")
+                entry = self.reader.get_next()
+                # Cursor entry might have been rotated away, in which case the next one is returned
+                pending = [entry] if entry and not self.reader.test_cursor(cursor) else []
+                entries = self._read(lambda: pending.pop() if pending else self.reader.get_next(), n, grep)
+            elif after is not None:
+                self.reader.seek_realtime(after)
+
+                def step():
+                    entry = self.reader.get_next()
+                    while entry and entry["__REALTIME_TIMESTAMP"].timestamp() <= after.timestamp():
+                        entry = self.reader.get_next()
+                    return entry
+
+                entries = self._read(step, n, grep)
+            else:
+                self.reader.seek_tail()
+                if skip > 0:
+                    self._read(self.reader.get_previous, skip, grep)
+                entries = list(reversed(self._read(self.reader.get_previous, n, grep)))
+        finally:
+            self._release()
+        return [self._entry(entry) for entry in entries]
+
+    def follow(self, n=10, cursor=None, level=None, grep=None, batchSize=100, batchDelay=0.5, timeout=15):
+        """Follow log.
+
+        Uses a dedicated journal reader, which is closed when the stream is closed.
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of previous lines to return first. The default is 10.
+        cursor : str, optional
+            Start after the entry with the given cursor instead of the last `n` lines. The default is None.
+        level : int, optional
+            Return only lines with priority level lower or equal to `level`. The default is None.
+        grep : str, optional
+            Regular expression log messages must match. The default is None.
+        batchSize : int, optional
+            Maximum number of entries per batch. The default is 100.
+        batchDelay : float, optional
+            Time in seconds to wait for further entries before emitting a batch. The default is 0.5.
+        timeout : float, optional
+            Time in seconds after which an empty batch is emitted if no entries arrived. The default is 15.
+
+        Raises
+        ------
+        ValueError
+            Invalid cursor or expression
+
+        Returns
+        -------
+        iterator
+            Closeable iterator yielding lists of log file entries
+        """
+        grep = _compile(grep)
+        self.reader = Reader()
+        try:
+            self.reader.add_match(_SYSTEMD_UNIT=self.unit)
+            if level is not None:
+                self.reader.log_level(level)
+            if cursor is not None:
+                try:
+                    self.reader.seek_cursor(cursor)
+                except OSError:
+                    raise ValueError("Invalid cursor")
+                entry = self.reader.get_next()
+                initial = [entry] if entry and not self.reader.test_cursor(cursor) and self._valid(entry) and \
+                    (grep is None or grep.search(entry["MESSAGE"])) else []
+            else:
+                self.reader.seek_tail()
+                initial = list(reversed(self._read(self.reader.get_previous, n, grep)))
+                if initial:
+                    self.reader.seek_cursor(initial[-1]["__CURSOR"])
+                    self.reader.get_next()
+                else:
+                    self.reader.seek_tail()
+                    self.reader.get_previous()
+        except Exception:
+            self._closeReader()
+            raise
+        return _Stream(self._follow([self._entry(entry) for entry in initial], grep, batchSize, batchDelay, timeout),
+                       self._closeReader)
+
+    def _closeReader(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def _follow(self, initial, grep, batchSize, batchDelay, timeout):
+        try:
+            if initial:
+                yield initial
+            yield from _batched(lambda count: [self._entry(entry) for entry in
+                                               self._read(self.reader.get_next, count, grep)],
+                                self.reader.wait, batchSize, batchDelay, timeout)
+        finally:
+            self._closeReader()
+
+
+class _FileWatch:
+    """Wait for changes of a file.
+
+    Uses inotify to watch the containing directory, which also catches rotation
+    of the file. Falls back to polling if inotify is not available.
+    """
+    # IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    mask = 0x002 | 0x040 | 0x080 | 0x100 | 0x200
+    pollInterval = 1
+
+    def __init__(self, path):
+        self.fd = None
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return
+            if libc.inotify_add_watch(fd, os.path.dirname(os.path.abspath(path)).encode(), self.mask) < 0:
+                os.close(fd)
+                return
+            self.fd = fd
+        except (AttributeError, OSError):
+            pass
+
+    def wait(self, timeout):
+        """Block until the file might have changed or `timeout` seconds have passed."""
+        if self.fd is None:
+            time.sleep(min(timeout, self.pollInterval))
+            return
+        if select.select([self.fd], [], [], timeout)[0]:
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+@LogReader.register("file")
+class FileReader:
+    """Reader class for plain text log files.
+
+    Each line of the file is treated as one entry. Cursors consist of the inode
+    number of the file and the offset after the entry, so reading can continue
+    across log rotation.
+    """
+    blockSize = 65536
+
+    def __init__(self, path):
+        """Create file reader
+
+        Parameters
+        ----------
+        path : str
+            Path of the log file.
+        """
+        self.path = path
+        self.file = None
+
+    @staticmethod
+    def _entry(message, inode, offset):
+        return dict(message=message, cursor="{}:{}".format(inode, offset))
+
+    @staticmethod
+    def _parseCursor(cursor):
+        try:
+            inode, offset = cursor.split(":")
+            return int(inode), int(offset)
+        except ValueError:
+            raise ValueError("Invalid cursor")
+
+    def _open(self):
+        """Open log file and return its inode number and size."""
+        self.file = open(self.path, "rb")
+        st = os.fstat(self.file.fileno())
+        return st.st_ino, st.st_size
+
+    def _lines(self, end):
+        """Iterate over complete lines backwards, starting at `end`.
+
+        Yields
+        ------
+        tuple(bytes, int)
+            Line without line break and offset after the line
+        """
+        pos, buffer, trimmed = end, b"", False
+        while True:
+            if not trimmed:
+                index = buffer.rfind(b"\n")
+                if index >= 0:
+                    buffer, trimmed = buffer[:index+1], True
+            if trimmed:
+                index = buffer.rfind(b"\n", 0, len(buffer)-1)
+                if index >= 0 or pos == 0:
+                    yield buffer[index+1:-1], pos+len(buffer)
+                    buffer = buffer[:index+1]
+                    if not buffer:
+                        return
+                    continue
+            if pos == 0:
+                return
+            size = min(self.blockSize, pos)
+            pos -= size
+            self.file.seek(pos)
+            buffer = self.file.read(size)+buffer
+
+    def _tail(self, inode, size, n, skip, grep):
+        """Read the last lines of the file.
+
+        Returns
+        -------
+        tuple(list, int)
+            List of log file entries and offset after the last complete line
+        """
+        entries, end = [], None
+        for line, offset in self._lines(size):
+            end = end or offset
+            message = line.decode("utf-8", "replace")
+            if grep is not None and not grep.search(message):
+                continue
             if skip > 0:
-                self.reader.get_previous(skip)
-            entries = reversed([self.reader.get_previous() for _ in range(n)])
-            return [self._entry(entry) for entry in entries if self._valid(entry)]
+                skip -= 1
+                continue
+            if len(entries) >= n:
+                break
+            entries.append(self._entry(message, inode, offset))
+        return list(reversed(entries)), end or 0
+
+    def _forward(self, inode, offset, count=None, grep=None):
+        """Read complete lines starting at `offset`.
+
+        Returns
+        -------
+        tuple(list, int)
+            List of log file entries and offset after the last line read
+        """
         entries = []
-        while True:
-            entry = self.reader.get_previous()
-            if len(entry) == 0 or entry["__REALTIME_TIMESTAMP"].timestamp() <= after.timestamp():
+        self.file.seek(offset)
+        while count is None or len(entries) < count:
+            line = self.file.readline()
+            if not line.endswith(b"\n"):
                 break
-            entries.append(self._entry(entry))
-        return list(reversed(entries))
+            offset += len(line)
+            message = line[:-1].decode("utf-8", "replace")
+            if grep is None or grep.search(message):
+                entries.append(self._entry(message, inode, offset))
+        return entries, offset
+
+    def _start(self, inode, size, cursor):
+        """Get offset to continue reading after `cursor`.
+
+        If the cursor belongs to a different (rotated) file or the file was truncated, reading starts at the beginning.
+        """
+        cursorInode, offset = self._parseCursor(cursor)
+        return offset if cursorInode == inode and offset <= size else 0
+
+    def tail(self, n=10, skip=0, after=None, cursor=None, level=None, grep=None):
+        """Get log tail.
+
+        Plain log files have no priority levels, so `level` is ignored. As there are
+        no reliable time stamps either, `after` only suppresses output if the file
+        was not modified since.
+
+        Parameters
+        ----------
+        n : int, optional
+            Maximum number of lines to return. The default is 10.
+        skip : int, optional
+            Number of lines to skip. The default is 0.
+        after : datetime, optional
+            Return nothing if the file was not modified after the given time point. The default is None.
+        cursor : str, optional
+            Return the first `n` lines after the entry with the given cursor. Overrides `skip` and `after`.
+            The default is None.
+        level : int, optional
+            Ignored. The default is None.
+        grep : str, optional
+            Regular expression log messages must match. Case insensitive if it contains no upper case characters.
+            The default is None.
+
+        Raises
+        ------
+        ValueError
+            Invalid cursor or expression
+
+        Returns
+        -------
+        list
+            List of log file entries
+        """
+        grep = _compile(grep)
+        try:
+            inode, size = self._open()
+        except FileNotFoundError:
+            return []
+        try:
+            if cursor is not None:
+                return self._forward(inode, self._start(inode, size, cursor), n, grep)[0]
+            if after is not None and os.fstat(self.file.fileno()).st_mtime <= after.timestamp():
+                return []
+            return self._tail(inode, size, n, skip, grep)[0]
+        finally:
+            self.file.close()
+
+    def follow(self, n=10, cursor=None, level=None, grep=None, batchSize=100, batchDelay=0.5, timeout=15):
+        """Follow log.
+
+        New lines are detected using inotify. Rotated or truncated files are
+        reopened and read from the beginning.
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of previous lines to return first. The default is 10.
+        cursor : str, optional
+            Start after the entry with the given cursor instead of the last `n` lines. The default is None.
+        level : int, optional
+            Ignored. The default is None.
+        grep : str, optional
+            Regular expression log messages must match. The default is None.
+        batchSize : int, optional
+            Maximum number of entries per batch. The default is 100.
+        batchDelay : float, optional
+            Time in seconds to wait for further entries before emitting a batch. The default is 0.5.
+        timeout : float, optional
+            Time in seconds after which an empty batch is emitted if no entries arrived. The default is 15.
+
+        Raises
+        ------
+        ValueError
+            Invalid cursor or expression
+
+        Returns
+        -------
+        iterator
+            Closeable iterator yielding lists of log file entries
+        """
+        grep = _compile(grep)
+        if cursor is not None:
+            self._parseCursor(cursor)
+        try:
+            inode, size = self._open()
+        except FileNotFoundError:
+            return _Stream(self._follow(None, 0, [], grep, batchSize, batchDelay, timeout), self._closeFile)
+        try:
+            if cursor is not None:
+                initial, offset = [], self._start(inode, size, cursor)
+            else:
+                initial, offset = self._tail(inode, size, n, 0, grep)
+        except Exception:
+            self._closeFile()
+            raise
+        return _Stream(self._follow(inode, offset, initial, grep, batchSize, batchDelay, timeout), self._closeFile)
+
+    def _closeFile(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _follow(self, inode, offset, initial, grep, batchSize, batchDelay, timeout):
+        def read(count):
+            nonlocal inode, offset
+            entries = []
+            if self.file is not None:
+                entries, offset = self._forward(inode, offset, count, grep)
+                if len(entries) >= count:
+                    return entries
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return entries
+            if self.file is None or st.st_ino != inode or st.st_size < offset:
+                # Old file has been read completely, continue with the new one
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                try:
+                    inode, offset = self._open()[0], 0
+                except FileNotFoundError:
+                    return entries
+                more, offset = self._forward(inode, offset, count-len(entries), grep)
+                entries += more
+            return entries
+
+        watch = _FileWatch(self.path)
+        try:
+            if initial:
+                yield initial
+            yield from _batched(read, watch.wait, batchSize, batchDelay, timeout)
+        finally:
+            watch.close()
+            self._closeFile()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+import json
+import logging
+import subprocess
+import threading
+import time
+
+from collections import Counter, namedtuple
+
+from .config import Config
+
+logger = logging.getLogger("mailq")
+
+
+QueueEntry = namedtuple("QueueEntry", ("data", "queue", "sender", "domains", "reasons", "arrival"))
+
+
+class MailQueue:
+    """Cached mail queue snapshots.
+
+    The output of `postqueue -j` is parsed line by line while the command is
+    still running and kept for `cacheTime` seconds, so that repeated requests
+    (e.g. paging through the queue) do not invoke postqueue again. Concurrent
+    requests for an expired snapshot wait for a single reload.
+    """
+    _lock = threading.Lock()
+    _cache = {}  # name -> (time, value)
+
+    @staticmethod
+    def _conf():
+        return Config["options"].get("mailq", {})
+
+    @classmethod
+    def _cached(cls, name, func):
+        with cls._lock:
+            cached = cls._cache.get(name)
+            if cached is None or time.monotonic()-cached[0] > cls._conf().get("cacheTime", 5):
+                value = func()
+                cached = cls._cache[name] = (time.monotonic(), value)
+            return cached[1]
+
+    @classmethod
+    def invalidate(cls):
+        """Discard cached snapshots, e.g. after the queue was modified."""
+        with cls._lock:
+            cls._cache.clear()
+
+    @staticmethod
+    def _entry(data):
+        recipients = data.get("recipients") or []
+        return QueueEntry(data, data.get("queue_name"), (data.get("sender") or "").lower(),
+                          frozenset(rcpt.get("address", "").rsplit("@", 1)[-1].lower() for rcpt in recipients),
+                          tuple(rcpt["delay_reason"] for rcpt in recipients if rcpt.get("delay_reason")),
+                          data.get("arrival_time") or 0)
+
+    @classmethod
+    def _load(cls):
+        """Run postqueue and parse its output.
+
+        Returns
+        -------
+        list
+            List of QueueEntry tuples, sorted by arrival time
+        """
+        entries = []
+        invalid = 0
+        try:
+            with subprocess.Popen([cls._conf().get("postqueue", "postqueue"), "-j"], stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL, universal_newlines=True) as proc:
+                for line in proc.stdout:
+                    if not line.strip():
+                        continue
+                    try:
+                        entries.append(cls._entry(json.loads(line)))
+                    except (ValueError, AttributeError, TypeError):
+                        invalid += 1
+        except Exception as err:
+            logger.error("Failed to run postqueue: {} ({})".format(type(err).__name__,
+                                                                   " - ".join(str(arg) for arg in err.args)))
+        if invalid:
+            logger.warning("Ignored {} invalid postqueue line{}".format(invalid, "" if invalid == 1 else "s"))
+        entries.sort(key=lambda entry: entry.arrival)
+        return entries
+
+    @staticmethod
+    def _run(command):
+        try:
+            return subprocess.run(command, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        except Exception as err:
+            logger.error("Failed to run {}: {} ({})".format(command, type(err).__name__,
+                                                            " - ".join(str(arg) for arg in err.args)))
+
+    @classmethod
+    def entries(cls):
+        """Get parsed postqueue snapshot.
+
+        Returns
+        -------
+        list
+            List of QueueEntry tuples, sorted by arrival time
+        """
+        return cls._cached("postqueue", cls._load)
+
+    @classmethod
+    def postfixMailq(cls):
+        """Get cached output of `mailq`, or None if the command failed."""
+        return cls._cached("mailq", lambda: cls._run("mailq"))
+
+    @classmethod
+    def gromoxMailq(cls):
+        """Get cached output of `gromox-mailq`, or None if the command failed."""
+        return cls._cached("gromox-mailq", lambda: cls._run("gromox-mailq"))
+
+    @classmethod
+    def query(cls, sender=None, domain=None, queue=None, minAge=None, maxAge=None, offset=0, limit=None, top=10):
+        """Filter, aggregate and paginate queue entries.
+
+        Parameters
+        ----------
+        sender : str, optional
+            Only include messages whose sender contains this string (case insensitive). The default is None.
+        domain : str, optional
+            Only include messages with at least one recipient in this domain. The default is None.
+        queue : str, optional
+            Only include messages in this queue. The default is None.
+        minAge : int, optional
+            Only include messages queued at least this many seconds ago. The default is None.
+        maxAge : int, optional
+            Only include messages queued at most this many seconds ago. The default is None.
+        offset : int, optional
+            Number of matching messages to skip. The default is 0.
+        limit : int, optional
+            Maximum number of messages to return. The default is None (no limit).
+        top : int, optional
+            Number of recipient domains and delay reasons to report. The default is 10.
+
+        Returns
+        -------
+        dict
+            Matching messages, total count and aggregated recipient domain and delay reason counts
+        """
+        now = time.time()
+        sender = sender.lower() if sender else None
+        domain = domain.lower() if domain else None
+        entries = [entry for entry in cls.entries()
+                   if (queue is None or entry.queue == queue) and
+                   (sender is None or sender in entry.sender) and
+                   (domain is None or domain in entry.domains) and
+                   (minAge is None or now-entry.arrival >= minAge) and
+                   (maxAge is None or now-entry.arrival <= maxAge)]
+        domains, reasons = Counter(), Counter()
+        for entry in entries:
+            domains.update(entry.domains)
+            reasons.update(entry.reasons)
+        return dict(total=len(entries),
+                    postqueue=[entry.data for entry in entries[offset:None if limit is None else offset+limit]],
+                    domains=[dict(domain=name, count=count) for name, count in domains.most_common(top)],
+                    reasons=[dict(reason=name, count=count) for name, count in reasons.most_common(top)])
@@ -0,0 +1,513 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+import fcntl
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .config import Config
+
+logger = logging.getLogger("metrics")
+
+
+class _ValueFile:
+    """Append-only key/value store in a memory mapped file.
+
+    The file starts with the 8 byte length of the used area, followed by
+    entries consisting of the 4 byte key length, the UTF-8 encoded key padded
+    to a multiple of 8 bytes and an 8 byte double value.
+
+    Only the owning process writes to the file, other processes may read it at
+    any time. The used length is updated after an entry is complete, so
+    readers never see partial entries.
+    """
+    initialSize = 65536
+
+    def __init__(self, filename=None):
+        """Create value file.
+
+        Parameters
+        ----------
+        filename : str, optional
+            Path of the file or None to use anonymous memory. The default is None.
+        """
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.positions = {}
+        self.used = 8
+        self.size = self.initialSize
+        if filename is None:
+            self.file = None
+            self.map = mmap.mmap(-1, self.size)
+        else:
+            self.file = open(filename, "w+b")
+            self.file.truncate(self.size)
+            self.map = mmap.mmap(self.file.fileno(), self.size)
+        struct.pack_into("Q", self.map, 0, self.used)
+
+    def _position(self, key):
+        """Get position of the value of `key`, creating a new entry if necessary. Must be called with lock held."""
+        position = self.positions.get(key)
+        if position is not None:
+            return position
+        encoded = key.encode("utf-8")
+        padded = len(encoded)+(-(len(encoded)+4) % 8)
+        length = 4+padded+8
+        if self.used+length > self.size:
+            while self.used+length > self.size:
+                self.size *= 2
+            if self.file is None:
+                newMap = mmap.mmap(-1, self.size)
+                newMap[:self.used] = self.map[:self.used]
+            else:
+                self.file.truncate(self.size)
+                newMap = mmap.mmap(self.file.fileno(), self.size)
+            self.map.close()
+            self.map = newMap
+        struct.pack_into("i{}sd".format(padded), self.map, self.used, len(encoded), encoded, 0.0)
+        position = self.positions[key] = self.used+4+padded
+        self.used += length
+        struct.pack_into("Q", self.map, 0, self.used)
+        return position
+
+    def add(self, key, amount):
+        with self.lock:
+            position = self._position(key)
+            struct.pack_into("d", self.map, position, struct.unpack_from("d", self.map, position)[0]+amount)
+
+    def set(self, key, value):
+        with self.lock:
+            struct.pack_into("d", self.map, self._position(key), value)
+
+    def items(self):
+        with self.lock:
+            return self.parse(self.map[:self.used])
+
+    @staticmethod
+    def parse(data):
+        """Parse value file content.
+
+        Parameters
+        ----------
+        data : bytes
+            Content of the file
+
+        Returns
+        -------
+        list
+            List of (key, value) tuples
+        """
+        if len(data) < 8:
+            return []
+        used = min(struct.unpack_from("Q", data, 0)[0], len(data))
+        position, items = 8, []
+        while position+4 <= used:
+            length = struct.unpack_from("i", data, position)[0]
+            padded = length+(-(length+4) % 8)
+            if position+4+padded+8 > used:
+                break
+            key = data[position+4:position+4+length].decode("utf-8")
+            items.append((key, struct.unpack_from("d", data, position+4+padded)[0]))
+            position += 4+padded+8
+        return items
+
+    def close(self):
+        self.map.close()
+        if self.file is not None:
+            self.file.close()
+
+
+class Metric:
+    """Base class for metrics."""
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        Metrics.registry[name] = self
+
+    def _key(self, sample, labels):
+        return json.dumps([sample, [labels.get(label, "") for label in self.labels]], separators=(",", ":"))
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if Metrics.enabled:
+            Metrics.store().add(self._key(self.name+"_total", labels), amount)
+
+
+class Gauge(Metric):
+    """Gauge metric.
+
+    Values of all running processes are summed up.
+    """
+    type = "gauge"
+
+    def set(self, value, **labels):
+        if Metrics.enabled:
+            Metrics.store().set(self._key(self.name, labels), value)
+
+    def inc(self, amount=1, **labels):
+        if Metrics.enabled:
+            Metrics.store().add(self._key(self.name, labels), amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+    defaultBuckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, documentation, labels=(), buckets=defaultBuckets):
+        Metric.__init__(self, name, documentation, labels)
+        self.buckets = tuple(buckets)+(math.inf,)
+
+    def observe(self, value, **labels):
+        if not Metrics.enabled:
+            return
+        store = Metrics.store()
+        for bucket in self.buckets:
+            if value <= bucket:
+                break
+        # Buckets are stored non-cumulative and summed up when exporting
+        store.add(self._key(self.name+"_bucket", dict(labels, le=bucket)), 1)
+        store.add(self._key(self.name+"_sum", labels), value)
+
+    def _key(self, sample, labels):
+        if sample.endswith("_bucket"):
+            return json.dumps([sample, [labels.get(label, "") for label in self.labels], labels["le"]],
+                              separators=(",", ":"))
+        return Metric._key(self, sample, labels)
+
+
+class _Timer:
+    """Context manager observing the elapsed time in a histogram."""
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.perf_counter()-self.start, **self.labels)
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class Metrics:
+    """Central metrics registry.
+
+    Each process writes its metrics to a memory mapped file in the configured
+    directory, which are aggregated on export. Counters and histograms of
+    terminated processes are kept, gauges are only exported for running processes.
+    On export, files of terminated processes are merged into a single aggregate
+    file and removed, so the number of files does not grow with process restarts.
+    If the directory is not writable, only metrics of the current process are exported.
+
+    Recording is disabled until `enable` is called, so that command line
+    invocations do not create metric files.
+    """
+    enabled = False
+    registry = {}
+
+    _store = None
+    _pid = None
+    _lock = threading.Lock()
+
+    aggregateFile = "aggregate.bin"
+    lockFile = "metrics.lock"
+
+    @staticmethod
+    def _directory():
+        return Config["options"].get("metrics", {}).get("directory")
+
+    @classmethod
+    def enable(cls):
+        """Enable recording of metrics and remove files of previous runs.
+
+        Should be called once before worker processes are forked.
+        """
+        if not Config["options"].get("metrics", {}).get("enabled", True):
+            return
+        directory = cls._directory()
+        if directory:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                for filename in os.listdir(directory):
+                    if filename.endswith(".db") or filename == cls.aggregateFile:
+                        os.unlink(os.path.join(directory, filename))
+            except OSError as err:
+                logger.warning("Cannot use metrics directory: "+" - ".join(str(arg) for arg in err.args))
+        cls.enabled = True
+
+    @classmethod
+    def store(cls):
+        """Get the value file of the current process."""
+        if cls._pid != os.getpid():
+            with cls._lock:
+                if cls._pid != os.getpid():
+                    directory = cls._directory()
+                    filename = os.path.join(directory, "{}.db".format(os.getpid())) if directory else None
+                    try:
+                        cls._store = _ValueFile(filename)
+                    except OSError as err:
+                        logger.warning("Failed to create metrics file: "+" - ".join(str(arg) for arg in err.args))
+                        cls._store = _ValueFile()
+                    cls._pid = os.getpid()
+        return cls._store
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    @classmethod
+    def _fold(cls, directory, processes):
+        """Merge values of terminated processes into the aggregate file.
+
+        Must be called with the directory lock held.
+
+        Parameters
+        ----------
+        directory : str
+            Metrics directory
+        processes : list
+            List of (filename, items, alive) tuples of all process files
+
+        Returns
+        -------
+        list
+            (key, value) tuples of the aggregate file
+        """
+        path = os.path.join(directory, cls.aggregateFile)
+        try:
+            with open(path, "rb") as file:
+                aggregate = _ValueFile.parse(file.read())
+        except OSError:
+            aggregate = []
+        dead = [(filename, items) for filename, items, alive in processes if not alive]
+        if not dead:
+            return aggregate
+        values = dict(aggregate)
+        for _, items in dead:
+            for key, value in items:
+                metric = cls.registry.get(json.loads(key)[0])
+                if metric is None or metric.type != "gauge":
+                    values[key] = values.get(key, 0)+value
+        try:
+            store = _ValueFile(path+".tmp")
+            for key, value in values.items():
+                store.set(key, value)
+            store.close()
+            os.replace(path+".tmp", path)
+            for filename, _ in dead:
+                os.unlink(os.path.join(directory, filename))
+        except OSError as err:
+            logger.warning("Failed to merge metrics of terminated processes: "+" - ".join(str(arg) for arg in err.args))
+            return aggregate+[item for _, items in dead for item in items]
+        return list(values.items())
+
+    @classmethod
+    def _collect(cls):
+        """Collect values of all processes.
+
+        Returns
+        -------
+        dict
+            Mapping of sample keys to values summed over all processes
+        """
+        sources = []
+        own = cls.store()
+        directory = cls._directory()
+        if own.filename is None:
+            sources.append((own.items(), True))
+        else:
+            try:
+                lock = open(os.path.join(directory, cls.lockFile), "a")
+            except OSError:
+                lock = None
+            try:
+                if lock is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    filenames = os.listdir(directory)
+                except OSError:
+                    filenames = []
+                processes = []
+                for filename in filenames:
+                    if not filename.endswith(".db"):
+                        continue
+                    try:
+                        pid = int(filename[:-3])
+                        with open(os.path.join(directory, filename), "rb") as file:
+                            processes.append((filename, _ValueFile.parse(file.read()), cls._alive(pid)))
+                    except (OSError, ValueError):
+                        pass
+                if lock is not None:
+                    sources.append((cls._fold(directory, processes), False))
+                    processes = [process for process in processes if process[2]]
+                else:  # Cannot merge without lock, read current aggregate only
+                    sources.append((cls._fold(directory, []), False))
+                sources += [(items, alive) for _, items, alive in processes]
+            finally:
+                if lock is not None:
+                    lock.close()
+        values = {}
+        for items, alive in sources:
+            for key, value in items:
+                sample = json.loads(key)
+                metric = cls.registry.get(sample[0])
+                if metric is not None and metric.type == "gauge" and not alive:
+                    continue
+                values[key] = values.get(key, 0)+value
+        return values
+
+    @staticmethod
+    def _labels(names, values, extra=None):
+        pairs = [(name, value) for name, value in zip(names, values)]+([("le", extra)] if extra is not None else [])
+        if not pairs:
+            return ""
+        escape = lambda value: str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        return "{"+",".join('{}="{}"'.format(name, escape(value)) for name, value in pairs)+"}"
+
+    @staticmethod
+    def _number(value):
+        if value == math.inf:
+            return "+Inf"
+        return repr(float(value)) if value != int(value) else str(int(value))
+
+    @classmethod
+    def export(cls):
+        """Export metrics of all processes.
+
+        Returns
+        -------
+        str
+            Metrics in OpenMetrics text format
+        """
+        samples = {}
+        for key, value in cls._collect().items():
+            sample, *rest = json.loads(key)
+            samples.setdefault(sample, []).append((tuple(rest[0]), rest[1] if len(rest) > 1 else None, value))
+        lines = []
+        for name, metric in sorted(cls.registry.items()):
+            lines.append("# TYPE {} {}".format(name, metric.type))
+            lines.append("# HELP {} {}".format(name, metric.documentation))
+            if metric.type == "histogram":
+                counts = {}
+                for labels, bucket, value in samples.get(name+"_bucket", ()):
+                    counts.setdefault(labels, {})[bucket] = value
+                sums = {labels: value for labels, _, value in samples.get(name+"_sum", ())}
+                for labels in sorted(counts):
+                    total = 0
+                    for bucket in metric.buckets:
+                        total += counts[labels].get(bucket, 0)
+                        lines.append("{}_bucket{} {}".format(name, cls._labels(metric.labels, labels,
+                                                                               cls._number(bucket)), int(total)))
+                    lines.append("{}_count{} {}".format(name, cls._labels(metric.labels, labels), int(total)))
+                    lines.append("{}_sum{} {}".format(name, cls._labels(metric.labels, labels),
+                                                      cls._number(sums.get(labels, 0))))
+            else:
+                sample = name+"_total" if metric.type == "counter" else name
+                for labels, _, value in sorted(samples.get(sample, ())):
+                    lines.append("{}{} {}".format(sample, cls._labels(metric.labels, labels), cls._number(value)))
+        lines.append("# EOF\n")
+        return "\n".join(lines)
+
+
+def instrumentEngine(engine):
+    """Record statement counts and execution times of an SQLAlchemy engine.
+
+    Per-request totals are accumulated in `flask.g` and recorded by `recordRequest`.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        Engine to instrument
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def beforeExecute(conn, cursor, statement, parameters, context, executemany):
+        if Metrics.enabled:
+            conn.info.setdefault("metricsStart", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def afterExecute(conn, cursor, statement, parameters, context, executemany):
+        if not Metrics.enabled or not conn.info.get("metricsStart"):
+            return
+        duration = time.perf_counter()-conn.info["metricsStart"].pop()
+        sqlDuration.observe(duration)
+        from flask import g, has_app_context
+        if has_app_context():
+            g.sqlStatements = g.get("sqlStatements", 0)+1
+            g.sqlTime = g.get("sqlTime", 0)+duration
+
+
+def recordRequest(request, response):
+    """Record metrics of a finished request.
+
+    Parameters
+    ----------
+    request : flask.Request
+        The request
+    response : flask.Response
+        The response
+    """
+    if not Metrics.enabled:
+        return
+    from flask import g
+    route = request.url_rule.rule if request.url_rule is not None else "<unknown>"
+    requests.inc(route=route, method=request.method, status=response.status_code)
+    sqlStatements.observe(g.get("sqlStatements", 0), route=route, method=request.method)
+    sqlTime.observe(g.get("sqlTime", 0), route=route, method=request.method)
+
+
+def requestPhase(phase):
+    """Create context manager recording the duration of a request processing phase."""
+    if not Metrics.enabled:
+        return _NoTimer()
+    from flask import request
+    return _Timer(requestDuration, dict(route=request.url_rule.rule if request.url_rule is not None else "<unknown>",
+                                        method=request.method, phase=phase))
+
+
+requestDuration = Histogram("grommunio_admin_request_duration_seconds",
+                            "Time spent processing requests, split into auth, validation, handler, "
+                            "responseValidation, serialization and compression phases",
+                            ("route", "method", "phase"))
+requests = Counter("grommunio_admin_requests", "Number of processed requests", ("route", "method", "status"))
+sqlDuration = Histogram("grommunio_admin_sql_statement_duration_seconds", "Execution time of SQL statements")
+sqlStatements = Histogram("grommunio_admin_sql_statements_per_request", "Number of SQL statements per request",
+                          ("route", "method"), buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+sqlTime = Histogram("grommunio_admin_sql_time_per_request_seconds", "Total SQL execution time per request",
+                    ("route", "method"))
+serviceState = Gauge("grommunio_admin_service_instances", "Number of service instances by state",
+                     ("service", "state"))
+serviceTransitions = Counter("grommunio_admin_service_transitions", "Number of service state transitions",
+                             ("service", "from", "to"))
+serviceFailures = Counter("grommunio_admin_service_failures", "Number of handled service errors", ("service",))
+tasqQueued = Gauge("grommunio_admin_tasq_queued", "Number of tasks waiting to be processed")
+tasqDuration = Histogram("grommunio_admin_tasq_task_duration_seconds", "Task execution time", ("command", "state"),
+                         buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600))
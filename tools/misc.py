@@ -257,6 +257,132 @@ def loadPSO(data, charset='utf-8', decode_strings=False,
     return _unserialize()
 
 
+def scanPSO(data, skip=None, charset='utf-8', decode_strings=False, array_hook=None):
+    """Decode PHP-serialized data, optionally skipping unneeded values.
+
+    Produces the same structure as `loadPSO`, but works on offsets into `data`
+    instead of reading single bytes from a stream, which is considerably faster
+    for large inputs.
+
+    If `skip` is given, it is called with the path of each value (tuple of
+    array keys and class names leading to the value). Values for which it
+    returns True are passed over without being decoded and are replaced by
+    None. Skipped strings and custom serialized classes (`C:`) are jumped over
+    by their length prefix.
+
+    Parameters
+    ----------
+    data : bytes
+        Serialized data
+    skip : callable, optional
+        Function deciding whether to skip a value. The default is None.
+    charset : str, optional
+        Charset used to decode strings. The default is 'utf-8'.
+    decode_strings : bool, optional
+        Whether to decode strings and class names. The default is False.
+    array_hook : callable, optional
+        Function called with a list of key/value pairs for each array. The default is dict.
+
+    Returns
+    -------
+    Any
+        The decoded object
+
+    Raises
+    ------
+    ValueError
+        The data is malformed or contains unsupported opcodes
+    """
+    if array_hook is None:
+        array_hook = dict
+    index = data.index
+
+    def _expect(pos, e):
+        if data[pos:pos+len(e)] != e:
+            raise ValueError('failed expectation at offset %d, expected %r got %r' % (pos, e, data[pos:pos+len(e)]))
+        return pos+len(e)
+
+    def _number(pos, delim):
+        end = index(delim, pos)
+        return int(data[pos:end]), end+1
+
+    def _name(pos):
+        length, pos = _number(pos+2, b':')
+        pos = _expect(pos, b'"')
+        name = data[pos:pos+length]
+        pos = _expect(pos+length, b'":')
+        return name.decode(charset) if decode_strings else name, pos
+
+    def _pass(pos):
+        type_ = data[pos:pos+1].lower()
+        if type_ == b'n':
+            return _expect(pos+1, b';')
+        if type_ in (b'i', b'd', b'b'):
+            return index(b';', pos)+1
+        if type_ == b's':
+            length, pos = _number(pos+2, b':')
+            return _expect(_expect(pos, b'"')+length, b'";')
+        if type_ == b'a':
+            items, pos = _number(pos+2, b':')
+        elif type_ == b'o':
+            items, pos = _number(_name(pos)[1], b':')
+        elif type_ == b'c':
+            length, pos = _number(_name(pos)[1], b':')
+            return _expect(_expect(pos, b'{')+length, b'}')
+        else:
+            raise ValueError('unexpected opcode %r at offset %d' % (type_, pos))
+        pos = _expect(pos, b'{')
+        for _ in range(items*2):
+            pos = _pass(pos)
+        return _expect(pos, b'}')
+
+    def _load_array(pos, path):
+        items, pos = _number(pos, b':')
+        pos = _expect(pos, b'{')
+        result = []
+        for _ in range(items):
+            key, pos = _unserialize(pos, None)
+            if skip is not None and skip(path+(key,)):
+                value, pos = None, _pass(pos)
+            else:
+                value, pos = _unserialize(pos, path+(key,))
+            result.append((key, value))
+        return result, _expect(pos, b'}')
+
+    def _unserialize(pos, path):
+        type_ = data[pos:pos+1].lower()
+        if type_ == b'n':
+            return None, _expect(pos+1, b';')
+        if type_ in (b'i', b'd', b'b'):
+            end = index(b';', _expect(pos+1, b':'))
+            value = data[pos+2:end]
+            return int(value) if type_ == b'i' else float(value) if type_ == b'd' else int(value) != 0, end+1
+        if type_ == b's':
+            length, pos = _number(pos+2, b':')
+            pos = _expect(pos, b'"')
+            value = data[pos:pos+length]
+            return value.decode(charset) if decode_strings else value, _expect(pos+length, b'";')
+        if type_ == b'a':
+            items, pos = _load_array(pos+2, path)
+            return array_hook(items), pos
+        if type_ == b'o':
+            name, pos = _name(pos)
+            items, pos = _load_array(pos, path+(name,))
+            return {name: dict(items)}, pos
+        if type_ == b'c':
+            name, pos = _name(pos)
+            length, pos = _number(pos, b':')
+            pos = _expect(pos, b'{')
+            if skip is not None and skip(path+(name,)):
+                value, pos = None, pos+length
+            else:
+                value, pos = _unserialize(pos, path+(name,))
+            return {name: value}, _expect(pos, b'}')
+        raise ValueError('unexpected opcode %r at offset %d' % (type_, pos))
+
+    return _unserialize(0, ())[0]
+
+
 class RecursiveDict(dict):
     """dict extension to handle keys in dottet notation."""
 
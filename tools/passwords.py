@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+"""Password hashing on a bounded process pool.
+
+Hashing and verification are CPU bound and would otherwise block the request
+threads of a worker. Jobs are executed by a per-process pool of
+`security.passwordHashing.workers` processes. At most `queueSize` jobs are
+queued per API worker, further requests wait up to `queueTimeout` seconds for
+a free slot before failing with a `HashingBusyError`.
+Setting `workers` to 0 hashes on the calling thread.
+"""
+
+import hmac
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .config import Config
+
+try:
+    # python 3.13
+    import legacycrypt as crypt
+except ImportError:
+    import crypt as crypt
+
+logger = logging.getLogger("passwords")
+
+# Number of passwords hashed per job in batch operations
+BATCH_CHUNK = 16
+
+
+class HashingBusyError(RuntimeError):
+    pass
+
+
+def _method():
+    # On OpenBSD only blowfish is supported
+    return crypt.METHOD_BLOWFISH if sys.platform.startswith("openbsd") else crypt.METHOD_SHA512
+
+
+def _hash(password):
+    return crypt.crypt(password, crypt.mksalt(_method()))
+
+
+def _hashMany(passwords):
+    return [_hash(password) for password in passwords]
+
+
+def _check(password, hashed):
+    return hmac.compare_digest(crypt.crypt(password, hashed) or "", hashed)
+
+
+class _Pool:
+    executor = None
+    pid = None
+    slots = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def conf():
+        return Config["security"].get("passwordHashing", {})
+
+    @classmethod
+    def get(cls):
+        """Get executor of the current process, or None if hashing is done inline."""
+        workers = cls.conf().get("workers", 2)
+        if workers <= 0:
+            return None
+        with cls.lock:
+            if cls.executor is None or cls.pid != os.getpid():
+                # Processes are forked, as the executable might not be a python interpreter (uwsgi)
+                cls.executor = ProcessPoolExecutor(workers, multiprocessing.get_context("fork"))
+                cls.pid = os.getpid()
+                cls.slots = threading.BoundedSemaphore(cls.conf().get("queueSize", 32))
+        return cls.executor
+
+    @classmethod
+    def reset(cls, executor):
+        with cls.lock:
+            if cls.executor is executor:
+                cls.executor = None
+
+    @classmethod
+    def submit(cls, func, *args):
+        """Submit job, waiting for a free queue slot.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Future of the job or None if the job should be executed inline
+        """
+        executor = cls.get()
+        if executor is None:
+            return None
+        slots = cls.slots
+        if not slots.acquire(timeout=cls.conf().get("queueTimeout", 10)):
+            raise HashingBusyError("Too many concurrent password operations, please try again later")
+        try:
+            future = executor.submit(func, *args)
+        except (BrokenProcessPool, RuntimeError):
+            slots.release()
+            cls.reset(executor)
+            return None
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    @classmethod
+    def run(cls, func, *args):
+        """Run job on the pool, falling back to inline execution if the pool is broken."""
+        return cls.result(cls.submit(func, *args), func, *args)
+
+    @classmethod
+    def result(cls, future, func, *args):
+        if future is None:
+            return func(*args)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            logger.warning("Password hashing pool died, restarting")
+            cls.reset(cls.executor)
+            return func(*args)
+
+
+def hashPassword(password):
+    """Create password hash.
+
+    Parameters
+    ----------
+    password : str
+        Plain text password
+
+    Returns
+    -------
+    str
+        Salted crypt hash
+
+    Raises
+    ------
+    HashingBusyError
+        No queue slot became available within the configured timeout
+    """
+    return _Pool.run(_hash, password)
+
+
+def checkPassword(password, hashed):
+    """Check password against crypt hash.
+
+    Parameters
+    ----------
+    password : str
+        Plain text password
+    hashed : str
+        Stored crypt hash
+
+    Returns
+    -------
+    bool
+        Whether the password matches
+
+    Raises
+    ------
+    HashingBusyError
+        No queue slot became available within the configured timeout
+    """
+    if not hashed:
+        return False
+    return _Pool.run(_check, password, hashed)
+
+
+def hashPasswords(passwords):
+    """Create hashes for multiple passwords in parallel.
+
+    Passwords are hashed in chunks of `BATCH_CHUNK`, with at most one chunk per
+    pool process in flight, so that concurrent single operations (e.g. logins)
+    are not stuck behind the whole batch.
+
+    Parameters
+    ----------
+    passwords : Iterable of str
+        Plain text passwords
+
+    Returns
+    -------
+    list of str
+        Hashes in the order of the passwords
+
+    Raises
+    ------
+    HashingBusyError
+        No queue slot became available within the configured timeout
+    """
+    passwords = list(passwords)
+    chunks = [passwords[offset:offset+BATCH_CHUNK] for offset in range(0, len(passwords), BATCH_CHUNK)]
+    window = max(1, _Pool.conf().get("workers", 2))
+    hashes, pending = [], deque()
+    for chunk in chunks:
+        if len(pending) >= window:
+            hashes += _Pool.result(*pending.popleft())
+        pending.append((_Pool.submit(_hashMany, chunk), _hashMany, chunk))
+    while pending:
+        hashes += _Pool.result(*pending.popleft())
+    return hashes
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+import logging
+import re
+import threading
+import time
+
+from collections import deque
+from datetime import datetime
+
+from .config import Config
+
+logger = logging.getLogger("profiler")
+
+
+class RequestProfile:
+    """SQL statistics of a single request."""
+    _placeholders = re.compile(r"\(\s*(?:%s|\?|%\(\w+\)s)(?:\s*,\s*(?:%s|\?|%\(\w+\)s))*\s*\)")
+    _literals = re.compile(r"'(?:[^'\\]|\\.|'')*'|\b\d+\b")
+    _whitespace = re.compile(r"\s+")
+
+    def __init__(self, forced):
+        self.forced = forced
+        self.start = time.perf_counter()
+        self.shapes = {}  # statement shape -> [count, time]
+        self.statements = 0
+        self.sqlTime = 0
+        self.profiler = None
+
+    @classmethod
+    def shape(cls, statement):
+        """Normalize SQL statement.
+
+        Literals and expanded parameter lists are replaced, so that statements
+        differing only in their parameters map to the same shape.
+        """
+        statement = cls._whitespace.sub(" ", statement).strip()
+        statement = cls._placeholders.sub("(...)", statement)
+        return cls._literals.sub("?", statement)
+
+    def record(self, statement, duration):
+        shape = self.shapes.setdefault(self.shape(statement), [0, 0])
+        shape[0] += 1
+        shape[1] += duration
+        self.statements += 1
+        self.sqlTime += duration
+
+
+class Profiler:
+    """Opt-in per-request SQL profiler.
+
+    Profiling is active for all requests if `options.profiling.enabled` is set,
+    or for single requests sent by system admins with the `X-Profile` header.
+    Statements are grouped by shape, shapes executed at least `repeatThreshold`
+    times in a single request are reported as potential N+1 queries.
+
+    Results are returned in the `Server-Timing` header and kept in a ring
+    buffer of the last `bufferSize` profiled requests.
+    If `cprofile` is enabled, requests taking longer than `cprofileThreshold`
+    seconds additionally include the output of cProfile.
+    """
+    _buffer = None
+    _lock = threading.Lock()
+    _cprofileLock = threading.Lock()
+
+    @staticmethod
+    def _conf():
+        return Config["options"].get("profiling", {})
+
+    @classmethod
+    def buffer(cls):
+        with cls._lock:
+            if cls._buffer is None:
+                cls._buffer = deque(maxlen=cls._conf().get("bufferSize", 100))
+            return cls._buffer
+
+    @classmethod
+    def start(cls, request, g):
+        """Start profiling the current request if profiling is enabled for all requests."""
+        if cls._conf().get("enabled", False):
+            cls._begin(g, False)
+
+    @classmethod
+    def startForced(cls, request, g):
+        """Start profiling the current request if requested via header.
+
+        Must be called after authentication, the header is ignored unless the user is a system admin.
+        """
+        if "profile" in g or "X-Profile" not in request.headers:
+            return
+        from api.security import checkPermissions
+        from tools.permissions import SystemAdminPermission
+        try:
+            checkPermissions(SystemAdminPermission())
+        except Exception:
+            return
+        cls._begin(g, True)
+
+    @classmethod
+    def _begin(cls, g, forced):
+        profile = g.profile = RequestProfile(forced)
+        if cls._conf().get("cprofile", False) and cls._cprofileLock.acquire(False):
+            import cProfile
+            profile.profiler = cProfile.Profile()
+            try:
+                profile.profiler.enable()
+            except ValueError:  # Another profiler is active
+                profile.profiler = None
+                cls._cprofileLock.release()
+
+    @classmethod
+    def _stopCProfile(cls, profile, duration):
+        profile.profiler.disable()
+        cls._cprofileLock.release()
+        if duration < cls._conf().get("cprofileThreshold", 1):
+            return None
+        import io
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(profile.profiler, stream=output).sort_stats("cumulative").print_stats(40)
+        return output.getvalue()
+
+    @classmethod
+    def finish(cls, request, response, g):
+        """Finish profiling of the current request.
+
+        Adds the `Server-Timing` header and stores the results in the ring buffer.
+        """
+        profile = g.pop("profile", None)
+        if profile is None:
+            return
+        duration = time.perf_counter()-profile.start
+        stats = cls._stopCProfile(profile, duration) if profile.profiler is not None else None
+        threshold = cls._conf().get("repeatThreshold", 5)
+        shapes = sorted(({"statement": shape, "count": count, "time": round(sqlTime*1000, 3)}
+                         for shape, (count, sqlTime) in profile.shapes.items()),
+                        key=lambda shape: shape["time"], reverse=True)
+        repeated = [shape for shape in shapes if shape["count"] >= threshold]
+        route = request.url_rule.rule if request.url_rule is not None else None
+        if repeated:
+            logger.info("{} {}: {} statement shape{} executed repeatedly"
+                        .format(request.method, route or request.path, len(repeated), "" if len(repeated) == 1 else "s"))
+        response.headers.add("Server-Timing",
+                             'sql;dur={:.3f};desc="{} statements, {} repeated", app;dur={:.3f}, total;dur={:.3f}'
+                             .format(profile.sqlTime*1000, profile.statements, len(repeated),
+                                     (duration-profile.sqlTime)*1000, duration*1000))
+        cls.buffer().append({"time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                             "method": request.method,
+                             "path": request.path,
+                             "route": route,
+                             "status": response.status_code,
+                             "duration": round(duration*1000, 3),
+                             "sqlCount": profile.statements,
+                             "sqlTime": round(profile.sqlTime*1000, 3),
+                             "statements": shapes,
+                             "repeated": repeated,
+                             "profile": stats})
+
+    @classmethod
+    def entries(cls, limit=None):
+        """Get profiling results, newest first.
+
+        Parameters
+        ----------
+        limit : int, optional
+            Maximum number of entries to return. The default is None.
+
+        Returns
+        -------
+        list
+            List of profiling results
+        """
+        with cls._lock:
+            entries = list(reversed(cls._buffer or ()))
+        return entries[:limit] if limit is not None else entries
+
+
+def instrumentEngine(engine):
+    """Record SQL statements of profiled requests.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        Engine to instrument
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def beforeExecute(conn, cursor, statement, parameters, context, executemany):
+        from flask import g, has_app_context
+        if has_app_context() and "profile" in g:
+            conn.info.setdefault("profileStart", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def afterExecute(conn, cursor, statement, parameters, context, executemany):
+        from flask import g, has_app_context
+        if not conn.info.get("profileStart"):
+            return
+        duration = time.perf_counter()-conn.info["profileStart"].pop()
+        if has_app_context() and "profile" in g:
+            g.profile.record(statement, duration)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("reload")
+
+
+class ReloadScheduler:
+    """Debounced service reload scheduler.
+
+    Reload requests are collected by a background thread, which waits until no
+    new requests arrive for `quietPeriod` seconds (or at most `maxDelay` seconds
+    after the first request) and then issues a single `try-reload-or-restart`
+    for all requested units.
+
+    Workers on the same host coordinate through a shared state file, which
+    records the time of the last reload of each unit. Units that have already
+    been reloaded by another process after the last local request are skipped.
+    If the state file is not accessible, reloads are issued without coordination.
+    """
+    _pending = {}  # unit -> time of the last request
+    _first = None
+    _last = None
+    _cond = threading.Condition()
+    _thread = None
+
+    @staticmethod
+    def _conf():
+        from .config import Config
+        return Config["options"].get("reload", {})
+
+    @classmethod
+    def request(cls, *units):
+        """Request reload of units.
+
+        If both `quietPeriod` and `maxDelay` are set to 0, the reload is issued immediately.
+
+        Parameters
+        ----------
+        *units : str
+            Names of the units to reload
+        """
+        conf = cls._conf()
+        now = time.time()
+        if not conf.get("quietPeriod", 2) and not conf.get("maxDelay", 10):
+            cls._issue({unit: now for unit in units})
+            return
+        with cls._cond:
+            for unit in units:
+                cls._pending[unit] = now
+            cls._first = cls._first or now
+            cls._last = now
+            if cls._thread is None:
+                import atexit
+                atexit.register(cls.flush)
+                cls._thread = threading.Thread(target=cls._run, name="Reload scheduler", daemon=True)
+                cls._thread.start()
+            cls._cond.notify()
+
+    @classmethod
+    def _take(cls):
+        """Remove and return pending units. Must be called with lock held."""
+        units = cls._pending
+        cls._pending = {}
+        cls._first = cls._last = None
+        return units
+
+    @classmethod
+    def flush(cls):
+        """Immediately issue pending reloads."""
+        with cls._cond:
+            units = cls._take()
+        if units:
+            cls._issue(units)
+
+    @classmethod
+    def _run(cls):
+        while True:
+            with cls._cond:
+                while not cls._pending:
+                    cls._cond.wait()
+                conf = cls._conf()
+                due = min(cls._last+conf.get("quietPeriod", 2), cls._first+conf.get("maxDelay", 10))-time.time()
+                if due > 0:
+                    cls._cond.wait(due)
+                    continue
+                units = cls._take()
+            try:
+                cls._issue(units)
+            except Exception as err:
+                logger.error("Failed to reload services: "+" - ".join(str(arg) for arg in err.args))
+
+    @classmethod
+    def _issue(cls, units):
+        """Reload units, skipping those already reloaded by another process.
+
+        Parameters
+        ----------
+        units : dict
+            Mapping of unit names to the time the reload was requested
+        """
+        stateFile = cls._conf().get("stateFile")
+        try:
+            fd = os.open(stateFile, os.O_RDWR | os.O_CREAT, 0o660)
+        except (OSError, TypeError):
+            cls._reload(units)
+            return
+        with os.fdopen(fd, "r+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                state = json.load(file)
+            except ValueError:
+                state = {}
+            units = {unit: requested for unit, requested in units.items() if state.get(unit, 0) < requested}
+            if not units:
+                logger.debug("Reload already performed by another process")
+                return
+            now = time.time()
+            cls._reload(units)
+            state.update({unit: now for unit in units})
+            file.seek(0)
+            file.truncate()
+            json.dump(state, file)
+
+    @staticmethod
+    def _reload(units):
+        from services import Service
+        logger.debug("Reloading "+", ".join(sorted(units)))
+        with Service("systemd", errors=Service.SUPPRESS_ALL) as sysd:
+            sysd.tryReloadRestartService(*sorted(units))
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+import fcntl
+import json
+import logging
+import math
+import mmap
+import os
+import psutil
+import struct
+import threading
+import time
+
+from datetime import datetime
+
+from .config import Config
+
+logger = logging.getLogger("sampler")
+
+
+class _History:
+    """Ring buffers of metric series in a memory mapped file.
+
+    The file starts with a header of four 8 byte integers (magic number,
+    number of slots per series, number of series and number of samples taken),
+    followed by the ring buffers of all series. The first series contains the
+    time stamps of the samples. Missing values are stored as NaN.
+
+    Only the sampling process writes to the file. The sample count is updated
+    after all values of a sample are written, so readers only see complete
+    samples.
+    """
+    magic = 0x67726f6d6d646173
+    header = struct.Struct("4Q")
+
+    def __init__(self, map, slots, columns):
+        self.map = map
+        self.slots = slots
+        self.columns = columns
+        self.values = memoryview(map)[self.header.size:].cast("d")
+
+    @classmethod
+    def create(cls, path, slots, columns):
+        """Create new history.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file or None to use anonymous memory
+        slots : int
+            Number of samples to keep
+        columns : int
+            Number of series, including the time stamps
+
+        Returns
+        -------
+        _History
+            New history object
+        """
+        size = cls.header.size+8*slots*columns
+        if path is None:
+            map = mmap.mmap(-1, size)
+        else:
+            tmp = "{}.{}".format(path, os.getpid())
+            with open(tmp, "w+b") as file:
+                file.truncate(size)
+                map = mmap.mmap(file.fileno(), size)
+            os.replace(tmp, path)
+        cls.header.pack_into(map, 0, cls.magic, slots, columns, 0)
+        history = cls(map, slots, columns)
+        for index in range(len(history.values)):
+            history.values[index] = math.nan
+        return history
+
+    @classmethod
+    def open(cls, path, writable=False):
+        """Open existing history file.
+
+        Returns
+        -------
+        _History
+            History object or None if the file does not exist or is invalid
+        """
+        try:
+            with open(path, "r+b" if writable else "rb") as file:
+                map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(map) < cls.header.size:
+            map.close()
+            return None
+        magic, slots, columns, _ = cls.header.unpack_from(map, 0)
+        if magic != cls.magic or len(map) != cls.header.size+8*slots*columns:
+            map.close()
+            return None
+        return cls(map, slots, columns)
+
+    def close(self):
+        self.values.release()
+        self.map.close()
+
+    @property
+    def count(self):
+        return self.header.unpack_from(self.map, 0)[3]
+
+    @count.setter
+    def count(self, value):
+        self.header.pack_into(self.map, 0, self.magic, self.slots, self.columns, value)
+
+    def __setitem__(self, key, value):
+        column, index = key
+        self.values[column*self.slots+index % self.slots] = value
+
+    def __getitem__(self, key):
+        column, index = key
+        return self.values[column*self.slots+index % self.slots]
+
+
+class DashboardSampler:
+    """Background sampler of system metrics.
+
+    CPU, memory, swap, load and disk metrics are collected every
+    `sampleInterval` seconds and stored in ring buffers holding the last
+    `historySize` samples. The latest sample is additionally kept in the
+    format returned by the dashboard endpoint.
+
+    Every process runs a sampler thread (started by `start`), but only the
+    process holding the lock file in `options.dashboard.directory` collects
+    samples, which are written to the directory and read by all processes.
+    The other threads wait to take over if the sampling process exits. If the
+    directory is not usable, each process samples on its own.
+    """
+    series = ("cpuUser", "cpuSystem", "cpuIo", "cpuInterrupt", "cpuSteal", "cpuIdle",
+              "memoryPercent", "memoryUsed", "memoryBuffer", "memoryCache", "memoryFree", "memoryAvailable",
+              "swapPercent", "swapUsed", "load1", "load5", "load15")
+    maxDisks = 32
+
+    _lock = threading.Lock()
+    _pid = None
+    _local = False
+    _history = None  # History written by this process, or None
+    _reader = None   # History read from the shared file
+    _readerInode = None
+    _latest = None
+    _disks = {}      # mount point -> series index
+
+    @staticmethod
+    def _conf():
+        return Config["options"].get("dashboard", {})
+
+    @classmethod
+    def _size(cls):
+        return max(1, cls._conf().get("historySize", 8640))
+
+    @classmethod
+    def _directory(cls):
+        return None if cls._local else cls._conf().get("directory")
+
+    @classmethod
+    def _path(cls, name):
+        return os.path.join(cls._directory(), name)
+
+    @classmethod
+    def start(cls):
+        """Start sampler thread of the current process.
+
+        Should be called once per worker process after forking. Further calls
+        have no effect.
+        """
+        with cls._lock:
+            if cls._pid == os.getpid():
+                return
+            cls._pid = os.getpid()
+            cls._history = cls._reader = cls._latest = None
+            lockfile = None
+            directory = cls._conf().get("directory")
+            if directory:
+                try:
+                    os.makedirs(directory, exist_ok=True)
+                    lockfile = open(os.path.join(directory, "sampler.lock"), "a")
+                except OSError as err:
+                    logger.warning("Cannot use dashboard directory, sampling per process: " +
+                                   " - ".join(str(arg) for arg in err.args))
+            cls._local = lockfile is None
+        threading.Thread(target=cls._run, args=(lockfile,), name="Dashboard sampler", daemon=True).start()
+
+    @classmethod
+    def _run(cls, lockfile):
+        while True:
+            if lockfile is not None:
+                try:
+                    fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    time.sleep(cls._conf().get("sampleInterval", 10))
+                    continue
+            cls._sampleLoop()
+
+    @classmethod
+    def _open(cls):
+        """Open history for writing, continuing the shared history if possible."""
+        columns = 1+len(cls.series)+cls.maxDisks
+        if cls._local:
+            return _History.create(None, cls._size(), columns), {}
+        disks = {}
+        history = _History.open(cls._path("history.db"), writable=True)
+        if history is not None and (history.slots != cls._size() or history.columns != columns):
+            history.close()
+            history = None
+        if history is not None:
+            try:
+                with open(cls._path("latest.json"), encoding="utf-8") as file:
+                    disks = json.load(file).get("columns", {})
+            except (OSError, ValueError):
+                history.close()
+                history = None
+        if history is None:
+            history = _History.create(cls._path("history.db"), cls._size(), columns)
+        return history, disks
+
+    @classmethod
+    def _sampleLoop(cls):
+        try:
+            history, disks = cls._open()
+        except OSError as err:
+            logger.error("Failed to create dashboard history: "+" - ".join(str(arg) for arg in err.args))
+            cls._local = True
+            history, disks = cls._open()
+        with cls._lock:
+            cls._history, cls._disks = history, disks
+        interval = cls._conf().get("sampleInterval", 10)
+        cpu = psutil.cpu_times_percent(0.1)  # Block briefly to get a meaningful CPU usage
+        due = time.monotonic()
+        while True:
+            try:
+                cls._store(*cls._collect(cpu))
+            except Exception as err:
+                logger.error("Failed to collect sample: {} ({})"
+                             .format(type(err).__name__, " - ".join(str(arg) for arg in err.args)))
+            cpu = None
+            due += interval
+            time.sleep(max(0, due-time.monotonic()))
+
+    @staticmethod
+    def _collect(cpu=None):
+        """Collect a sample.
+
+        Returns
+        -------
+        dict
+            Dashboard data
+        tuple
+            Values of the series
+        float
+            Time stamp of the sample
+        """
+        disks = []
+        for disk in psutil.disk_partitions():
+            try:
+                usage = psutil.disk_usage(disk.mountpoint)
+                stat = {"percent": usage.percent, "total": usage.total, "used": usage.used, "free": usage.free}
+                stat["device"] = disk.device
+                stat["mountpoint"] = disk.mountpoint
+                stat["filesystem"] = disk.fstype
+                disks.append(stat)
+            except Exception:
+                pass
+        cpu = cpu or psutil.cpu_times_percent()
+        cpuPercent = dict(user=cpu.user, system=cpu.system, io=cpu.iowait, interrupt=cpu.irq+cpu.softirq,
+                          steal=cpu.steal, idle=cpu.idle)
+        vm = psutil.virtual_memory()
+        memory = dict(percent=vm.percent, total=vm.total, used=vm.used, buffer=vm.buffers, cache=vm.cached,
+                      free=vm.free, available=vm.available)
+        sm = psutil.swap_memory()
+        swap = dict(percent=sm.percent, total=sm.total, used=sm.used, free=sm.free)
+        load = os.getloadavg()
+        now = time.time()
+        latest = dict(disks=disks,
+                      load=load,
+                      cpuPercent=cpuPercent,
+                      memory=memory,
+                      swap=swap,
+                      booted=datetime.fromtimestamp(psutil.boot_time()).strftime("%Y-%m-%d %H:%M:%S"),
+                      sampled=datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"))
+        values = (cpu.user, cpu.system, cpu.iowait, cpu.irq+cpu.softirq, cpu.steal, cpu.idle,
+                  vm.percent, vm.used, vm.buffers, vm.cached, vm.free, vm.available,
+                  sm.percent, sm.used, *load)
+        return latest, values, now
+
+    @classmethod
+    def _store(cls, latest, values, now):
+        """Write sample to the history."""
+        history = cls._history
+        index = history.count
+        for column, value in enumerate(values, 1):
+            history[column, index] = value
+        mounted = {}
+        for disk in latest["disks"]:
+            column = cls._disks.get(disk["mountpoint"])
+            if column is None and len(cls._disks) < cls.maxDisks:
+                column = cls._disks[disk["mountpoint"]] = 1+len(cls.series)+len(cls._disks)
+            if column is not None:
+                mounted[column] = disk["percent"]
+        for column in cls._disks.values():
+            history[column, index] = mounted.get(column, math.nan)
+        history[0, index] = now
+        history.count = index+1
+        if cls._local:
+            cls._latest = latest
+            return
+        tmp = cls._path("latest.json.{}".format(os.getpid()))
+        with open(tmp, "w", encoding="utf-8") as file:
+            json.dump(dict(latest=latest, columns=cls._disks), file, separators=(",", ":"))
+        os.replace(tmp, cls._path("latest.json"))
+
+    @classmethod
+    def _shared(cls):
+        """Load latest sample and disk columns written by the sampling process."""
+        for _ in range(20):  # The first sample might still be collected
+            try:
+                with open(cls._path("latest.json"), encoding="utf-8") as file:
+                    data = json.load(file)
+                return data["latest"], data["columns"]
+            except (OSError, ValueError, KeyError):
+                time.sleep(0.1)
+        return None, {}
+
+    @classmethod
+    def latest(cls):
+        """Get the latest sample.
+
+        Returns
+        -------
+        dict
+            Dashboard data
+        """
+        cls.start()
+        if cls._directory() is None:
+            for _ in range(20):
+                if cls._latest is not None:
+                    return cls._latest
+                time.sleep(0.1)
+            latest = None
+        else:
+            latest = cls._shared()[0]
+        return latest if latest is not None else cls._collect()[0]
+
+    @classmethod
+    def _readHistory(cls):
+        """Get history to read from. Must be called with lock held."""
+        if cls._directory() is None or cls._history is not None:
+            return cls._history
+        if cls._reader is not None:
+            try:
+                if os.stat(cls._path("history.db")).st_ino == cls._readerInode:
+                    return cls._reader
+            except OSError:
+                pass
+            cls._reader.close()
+            cls._reader = None
+        try:
+            inode = os.stat(cls._path("history.db")).st_ino
+        except OSError:
+            return None
+        cls._reader = _History.open(cls._path("history.db"))
+        cls._readerInode = inode
+        return cls._reader
+
+    @classmethod
+    def history(cls, window=3600, points=360):
+        """Get downsampled metrics history.
+
+        Samples are grouped into `points` buckets of equal duration and averaged.
+
+        Parameters
+        ----------
+        window : int, optional
+            Time span in seconds to return. The default is 3600.
+        points : int, optional
+            Maximum number of data points per series. The default is 360.
+
+        Returns
+        -------
+        dict
+            Bucket time stamps, metric series and disk usage series (percent) by mount point
+        """
+        cls.start()
+        diskColumns = cls._disks if cls._directory() is None else cls._shared()[1]
+        with cls._lock:
+            history = cls._readHistory()
+            now = time.time()
+            start = now-window
+            times, series, disks = [], {name: [] for name in cls.series}, {name: [] for name in diskColumns}
+            if history is not None:
+                last = history.count-1
+                first = max(0, last+1-history.slots)
+                while first <= last and not history[0, first] >= start:
+                    first += 1
+                indices = range(first, last+1)
+                times = [history[0, index] for index in indices]
+                series = {name: [history[column, index] for index in indices]
+                          for column, name in enumerate(cls.series, 1)}
+                disks = {name: [history[column, index] for index in indices] for name, column in diskColumns.items()}
+        points = max(1, points)
+        step = window/points
+        buckets = [[] for _ in range(points)]
+        for position, timestamp in enumerate(times):
+            buckets[min(points-1, int((timestamp-start)/step))].append(position)
+        buckets = [bucket for bucket in buckets if bucket]
+
+        def downsample(values):
+            result = []
+            for bucket in buckets:
+                valid = [values[position] for position in bucket if not math.isnan(values[position])]
+                result.append(round(sum(valid)/len(valid), 2) if valid else None)
+            return result
+
+        return dict(time=[datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+                          for timestamp in downsample(times)],
+                    interval=cls._conf().get("sampleInterval", 10),
+                    series={name: downsample(values) for name, values in series.items()},
+                    disks={name: downsample(values) for name, values in disks.items()})
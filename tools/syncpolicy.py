@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# SPDX-FileCopyrightText: 2026 grommunio GmbH
+
+"""Resolved sync policy cache.
+
+Policies are merged from the configured default, the domain policy and the
+user policy and stored pre-serialized in redis, so that all workers can
+answer policy requests without querying the database.
+Entries are stored as `<domain ID>:<policy JSON>`. Entries of users modified
+in a transaction are removed after the commit (see `orm.users.SyncPolicyCache`),
+entries of all users are removed when the configured default policy changes.
+"""
+
+import hashlib
+import json
+
+from services import Service
+from tools.config import Config
+
+CACHE_PREFIX = "grommunio-admin:syncpolicy-"
+SYNC_PREFIX = "grommunio-sync:policycache-"
+DEFAULT_KEY = "grommunio-admin:syncpolicy:default"
+QUERY_CHUNK = 1000
+
+_defaultChecked = False
+
+
+def cacheKey(username):
+    """Return redis key of a user's cached policy."""
+    return CACHE_PREFIX+username.lower()
+
+
+def _delete(redis, keys):
+    keys = list(keys)
+    for offset in range(0, len(keys), QUERY_CHUNK):
+        redis.delete(*keys[offset:offset+QUERY_CHUNK])
+
+
+def invalidate(usernames):
+    """Remove cached policies of users.
+
+    Removes the resolved policies as well as the policy cache of grommunio-sync.
+
+    Parameters
+    ----------
+    usernames : Iterable of str
+        Names of the users
+    """
+    keys = [key for username in usernames for key in (SYNC_PREFIX+username, cacheKey(username))]
+    if keys:
+        with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
+            _delete(redis, keys)
+
+
+def checkDefault():
+    """Remove cached policies of all users if the default policy changed.
+
+    A fingerprint of the configured default policy is kept in redis, so that only the
+    first process started with a changed configuration clears the cache.
+    """
+    global _defaultChecked
+    policy = json.dumps(Config["sync"]["defaultPolicy"], sort_keys=True, separators=(",", ":"))
+    fingerprint = hashlib.blake2b(policy.encode("utf-8"), digest_size=16).hexdigest()
+    with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
+        if redis.getset(DEFAULT_KEY, fingerprint) != fingerprint:
+            for prefix in (SYNC_PREFIX, CACHE_PREFIX):
+                _delete(redis, redis.scan_iter(match=prefix+"*", count=QUERY_CHUNK))
+        _defaultChecked = True
+
+
+def _merge(*policies):
+    policy = dict(Config["sync"]["defaultPolicy"])
+    for value in policies:
+        try:
+            value = json.loads(value) if value is not None else None
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            policy.update(value)
+    return json.dumps(policy, separators=(",", ":"))
+
+
+def resolve(usernames):
+    """Get merged sync policies of multiple users.
+
+    Cached policies are fetched from redis in a single round trip, the remaining
+    users are loaded from the database and added to the cache.
+
+    Parameters
+    ----------
+    usernames : Iterable of str
+        Names of the users
+
+    Returns
+    -------
+    dict
+        Mapping of username to (domain ID, serialized policy) tuples. Unknown users are omitted.
+    """
+    from orm.domains import Domains
+    from orm.users import Users
+    usernames = list(dict.fromkeys(usernames))
+    ttl = Config["sync"].get("policyCacheTime", 3600)
+    if ttl > 0 and not _defaultChecked:
+        checkDefault()
+    result = {}
+    if ttl > 0 and usernames:
+        with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
+            for username, cached in zip(usernames, redis.mget([cacheKey(username) for username in usernames])):
+                if cached:
+                    domainID, policy = cached.split(":", 1)
+                    result[username] = (int(domainID), policy)
+    missing = [username for username in usernames if username not in result]
+    resolved = {}
+    for offset in range(0, len(missing), QUERY_CHUNK):
+        chunk = missing[offset:offset+QUERY_CHUNK]
+        lookup = {username.lower(): username for username in chunk}
+        users = Users.query.outerjoin(Domains, Domains.ID == Users.domainID)\
+                           .filter(Users.username.in_(chunk))\
+                           .with_entities(Users.username, Users.domainID, Domains._syncPolicy, Users._syncPolicy)
+        for username, domainID, domainPolicy, userPolicy in users:
+            resolved[lookup.get(username.lower(), username)] = (domainID, _merge(domainPolicy, userPolicy))
+    result.update(resolved)
+    if ttl > 0 and resolved:
+        with Service("redis", errors=Service.SUPPRESS_INOP) as redis:
+            pipe = redis.pipeline(transaction=False)
+            for username, (domainID, policy) in resolved.items():
+                pipe.set(cacheKey(username), "{}:{}".format(domainID, policy), ex=ttl)
+            pipe.execute()
+    return result
@@ -7,6 +7,8 @@ import logging
 import threading
 import queue
 
+from .metrics import tasqDuration, tasqQueued
+
 
 logger = logging.getLogger("tasq")
 
@@ -72,6 +74,7 @@ class Worker:
 
     def dispatch(self, task):
         from time import time
+        dispatched = time()
         func = self.cmap.get(task.command)
         if func is None:
             task.state = Task.ERROR
@@ -90,11 +93,13 @@ class Worker:
                 task.message = type(err).__name__+": "+" - ".join(str(arg) for arg in err.args)[:160]
         task.state = max(task.state, Task.COMPLETED)
         task.message = task.message or "Completed ({:.1f}ms)".format(1000*duration)
+        tasqDuration.observe(time()-dispatched, command=task.command, state=task.statename)
         return task
 
     def run(self):
         while True:
             self.__current = task = self._queued.get()
+            tasqQueued.set(self._queued.qsize())
             self.dispatch(task)
             self._finished.put(task)
             self.__current = None
@@ -133,6 +138,17 @@ class Worker:
             host = task.params.get("homeserver") or exmdb.host
             client = exmdb.ExmdbQueries(host, exmdb.port, task.params["homedir"], task.params["private"])
             client.deleteFolder(task.params["homedir"], task.params["folderID"], task.params.get("clear", False))
+        if not task.params["private"]:
+            from tools import foldercache
+            foldercache.invalidate(task.params["homedir"])
+
+    def diskUsage(self, task):
+        from tools.diskusage import DiskUsage
+        import time
+        start = time.time()
+        summary = DiskUsage().scan(task.params.get("partitions"), task.params.get("full", False))
+        task.message = "Scanned {} partition{} ({:.1f}s)".format(len(summary), "" if len(summary) == 1 else "s",
+                                                                   time.time()-start)
 
     def _ldapSyncUser(self, user):
         from tools.ldap import downsyncObject
@@ -205,7 +221,7 @@ class Worker:
 
         from orm import DB
         from orm.domains import Domains, OrgParam, Orgs
-        from orm.users import Aliases, Users
+        from orm.users import Users
         from services import Service, ServiceUnavailableError
         import time
 
@@ -214,8 +230,6 @@ class Worker:
         orgID = task.params.get("orgID")
         domainID = task.params.get("domainID")
         updateInterval = task.params.get("updateInterval", 5)
-        Aliases.NTactive(False)
-        Users.NTactive(False)
 
         domainFilter = ()
         noLdapOrgs = ()  # IDs of orgs without LDAP config override
@@ -271,17 +285,13 @@ class Worker:
                 self._ldapSyncGroupMembers(orgID, ldap)
             except ServiceUnavailableError:
                 pass
-            
-
-        Aliases.NTactive(True)
-        Users.NTactive(True)
 
 
         updateMessage()
         task.message += " ({:.1f}s)".format(time.time()-start)
         task.params["result"] = syncStatus
 
-    cmap = {"control": control, "debug": debug, "delFolder": deleteFolder, "ldapSync": ldapSync}
+    cmap = {"control": control, "debug": debug, "delFolder": deleteFolder, "diskUsage": diskUsage, "ldapSync": ldapSync}
 
 
 class TasQServer:
@@ -305,6 +315,7 @@ class TasQServer:
         with cls._active_lock:
             cls._active[task.ID] = (task, threading.Condition(cls._active_lock))
         cls._queued.put(task)
+        tasqQueued.set(cls._queued.qsize())
         return task
 
     @classmethod
@@ -587,3 +598,7 @@ class TasQServer:
             return TasQServer.create("delFolder", dict(homedir=homedir, folderID=folderID, private=private, clear=clear,
                                                        homeserver=homeserver.hostname if homeserver else None),
                                      permission=permission)
+
+        @staticmethod
+        def diskUsage(partitions=None, full=False, permission=None):
+            return TasQServer.create("diskUsage", dict(partitions=partitions, full=full), permission=permission)